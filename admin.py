@@ -5,7 +5,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
-from .models import CustomUser, Role, UserProfile, UserSession
+from .models import CustomUser, Role, UserProfile, UserSession, UserSessionArchive
 
 
 @admin.register(Role)
@@ -178,6 +178,7 @@ class UserSessionAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'created_at', 'last_activity']
     search_fields = ['user__username', 'user__arabic_first_name', 'ip_address']
     readonly_fields = ['session_key', 'created_at', 'last_activity']
+    list_select_related = ['user']
     
     fieldsets = (
         (_('معلومات الجلسة'), {
@@ -196,6 +197,23 @@ class UserSessionAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(UserSessionArchive)
+class UserSessionArchiveAdmin(admin.ModelAdmin):
+    """
+    إعدادات عرض الجلسات المؤرشفة (للقراءة فقط)
+    """
+    list_display = ['user', 'ip_address', 'created_at', 'last_activity', 'archived_at']
+    list_filter = ['archived_at']
+    search_fields = ['user__username', 'ip_address']
+    list_select_related = ['user']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # تخصيص عنوان لوحة الإدارة
 admin.site.site_header = _('لوحة إدارة منصة أيديا')
 admin.site.site_title = _('إدارة أيديا')
@@ -90,6 +90,9 @@ export const authAPI = {
 // دوال المستخدمين
 export const usersAPI = {
   getUsers: (params) => api.get('/users/', { params }),
+  // ترقيم بالمؤشر للتمرير اللانهائي: مرر next_cursor من الصفحة السابقة
+  getUsersPage: (cursor, params) =>
+    api.get('/users/', { params: { ...params, pagination: 'cursor', cursor } }),
   getUser: (id) => api.get(`/users/${id}/`),
   createUser: (data) => api.post('/users/', data),
   updateUser: (id, data) => api.put(`/users/${id}/`, data),
@@ -101,6 +104,8 @@ export const usersAPI = {
 // دوال العملاء
 export const clientsAPI = {
   getClients: (params) => api.get('/crm/clients/', { params }),
+  getClientsPage: (cursor, params) =>
+    api.get('/crm/clients/', { params: { ...params, pagination: 'cursor', cursor } }),
   getClient: (id) => api.get(`/crm/clients/${id}/`),
   createClient: (data) => api.post('/crm/clients/', data),
   updateClient: (id, data) => api.put(`/crm/clients/${id}/`, data),
@@ -150,6 +155,8 @@ export const templatesAPI = {
 // دوال الفواتير
 export const invoicesAPI = {
   getInvoices: (params) => api.get('/crm/invoices/', { params }),
+  getInvoicesPage: (cursor, params) =>
+    api.get('/crm/invoices/', { params: { ...params, pagination: 'cursor', cursor } }),
   getInvoice: (id) => api.get(`/crm/invoices/${id}/`),
   createInvoice: (data) => api.post('/crm/invoices/', data),
   updateInvoice: (id, data) => api.put(`/crm/invoices/${id}/`, data),
@@ -0,0 +1,23 @@
+"""
+إعدادات تطبيق المستخدمين
+"""
+
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+from django.utils.translation import gettext_lazy as _
+
+
+class UsersConfig(AppConfig):
+    """
+    إعدادات تطبيق المستخدمين والأدوار
+    """
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'users'
+    verbose_name = _('المستخدمون والأدوار')
+
+    def ready(self):
+        """تسجيل الإشارات عند تحميل التطبيق"""
+        from . import signals  # noqa: F401
+        from .search import ensure_search_indexes
+        
+        post_migrate.connect(ensure_search_indexes, sender=self)
@@ -0,0 +1,139 @@
+"""
+مصادقة JWT السريعة (بدون قاعدة البيانات)
+
+يحمل رمز الوصول بيانات المستخدم اللازمة للمصادقة والصلاحيات: اسم
+المستخدم والدور وصفة الموظف والمشرف، إضافة إلى رقمي إصدار:
+
+- perm_version: إصدار صلاحيات الدور (انظر permission_cache)
+- user_version: إصدار بيانات المستخدم، يُرفع عند أي تعديل عليه (إشارة
+  post_save) مثل تغيير الدور أو إيقاف الحساب
+
+إذا طابق الإصداران القيم الحالية في الذاكرة المؤقتة يُبنى كائن المستخدم
+من الرمز مباشرة دون أي استعلام، وإلا يُحمّل من قاعدة البيانات كالمعتاد.
+يتطلب ذلك ذاكرة مشتركة بين العمليات (Redis)، وإلا لا يصل رفع الإصدار عند
+إيقاف المستخدم أو تغيير دوره إلى بقية العمليات، فيُحمّل المستخدم دائماً من
+قاعدة البيانات. قراءة أي حقل غير موجود في الرمز تحمّل صف المستخدم كاملاً
+مرة واحدة (انظر ClaimsUser).
+"""
+
+import uuid
+
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .caching import bump_cache_version, get_cache_version
+from .models import CustomUser, Role
+from .permission_cache import _shared_cache, get_role_permissions, get_role_version
+
+# الحقول المحمولة في الرمز (وكل ما عداها يُحمّل عند الحاجة)
+CLAIM_FIELDS = ('username', 'is_staff', 'is_superuser')
+
+
+def _user_namespace(user_id):
+    return f'user:{user_id}'
+
+
+def get_user_version(user_id):
+    """رقم الإصدار الحالي لبيانات المستخدم"""
+    return get_cache_version(_user_namespace(user_id), _shared_cache())
+
+
+def invalidate_user_claims(user_id):
+    """إبطال بيانات المستخدم في الرموز الصادرة (تُحمّل من قاعدة البيانات بعدها)"""
+    bump_cache_version(_user_namespace(user_id), _shared_cache())
+
+
+def user_claims(user):
+    """بيانات المستخدم التي تُضاف إلى الرمز"""
+    role = user.role if user.role_id else None
+    claims = {field: getattr(user, field) for field in CLAIM_FIELDS}
+    claims.update({
+        'role': role.name if role else None,
+        'role_id': str(role.pk) if role else None,
+        'perm_version': get_role_version(role.pk) if role else None,
+        'user_version': get_user_version(user.pk),
+    })
+    return claims
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    رمز تحديث يحمل بيانات المستخدم (تنتقل تلقائياً إلى رمز الوصول)
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
+
+def _claims_are_current(token):
+    # بدون ذاكرة مشتركة لا يصل رفع الإصدار إلى بقية العمليات، فلا يُوثق بالرمز
+    if _shared_cache() is None or 'user_version' not in token:
+        return False
+    if token['user_version'] != get_user_version(token[api_settings.USER_ID_CLAIM]):
+        return False
+    role_id = token.get('role_id')
+    return role_id is None or token.get('perm_version') == get_role_version(uuid.UUID(role_id))
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    مستخدم مبني من بيانات الرمز
+
+    يعيد الحقول المحمولة في الرمز (والدور بحقلي المعرف والاسم) دون استعلام،
+    وعند قراءة أي حقل آخر يُحمّل صف المستخدم كاملاً مرة واحدة ويُستخدم بعدها
+    لكل شيء.
+    """
+
+    def __init__(self, claims):
+        self.__dict__['_claims'] = claims
+        super().__init__(lambda: CustomUser.objects.get(pk=claims['pk']))
+
+    def __getattr__(self, name):
+        if self._wrapped is empty and name in self._claims:
+            return self._claims[name]
+        return super().__getattr__(name)
+
+    def get_role_permissions(self):
+        return get_role_permissions(self._claims['role_id'])
+
+    def has_role_permission(self, permission):
+        if self._wrapped is empty:
+            return CustomUser.has_role_permission(self, permission)
+        return self._wrapped.has_role_permission(permission)
+
+
+def build_claims_user(token):
+    """إنشاء المستخدم من بيانات الرمز دون استعلام"""
+    user_id = uuid.UUID(str(token[api_settings.USER_ID_CLAIM]))
+    role_id = uuid.UUID(token['role_id']) if token.get('role_id') else None
+    claims = {field: token.get(field) for field in CLAIM_FIELDS}
+    claims.update({
+        'pk': user_id,
+        'id': user_id,
+        'is_active': True,
+        'is_authenticated': True,
+        'is_anonymous': False,
+        'role_id': role_id,
+        'role': Role.from_db('default', ['id', 'name'], [role_id, token.get('role')]) if role_id else None,
+    })
+    return ClaimsUser(claims)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    مصادقة JWT تبني المستخدم من الرمز ما دامت بياناته حديثة
+
+    تتطلب ذاكرة مشتركة (PERMISSION_CACHE_ALIAS)، وبدونها يُحمّل المستخدم
+    من قاعدة البيانات في كل طلب.
+    """
+
+    def get_user(self, validated_token):
+        if _claims_are_current(validated_token):
+            return build_claims_user(validated_token)
+        return super().get_user(validated_token)
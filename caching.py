@@ -0,0 +1,115 @@
+"""
+أدوات التخزين المؤقت ذات الإصدارات لنظام المستخدمين
+
+تعتمد هذه الأدوات على عدّاد إصدار لكل نطاق (namespace)، بحيث يؤدي رفع
+الإصدار إلى إبطال جميع المفاتيح القديمة دفعة واحدة دون الحاجة لحذفها.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.http import parse_etags, parse_http_date_safe
+
+
+# نطاقات التخزين المؤقت المستخدمة في التطبيق
+USER_STATS_NAMESPACE = 'user_stats'
+CURRENT_USER_NAMESPACE = 'current_user'
+
+
+def current_user_namespace(user_id):
+    """نطاق بيانات "المستخدم الحالي" لمستخدم معين"""
+    return f'{CURRENT_USER_NAMESPACE}:{user_id}'
+
+
+def shared_cache():
+    """
+    ذاكرة التخزين المشتركة بين العمليات (SHARED_CACHE_ALIAS)
+
+    Returns:
+        ذاكرة التخزين، أو None إذا لم تكن مهيأة. الإصدارات المخزنة في الذاكرة
+        المحلية لا تُرفع إلا في العملية التي عدّلت البيانات، لذا لا تُخزن
+        البيانات القابلة للإبطال بدون ذاكرة مشتركة.
+    """
+    alias = getattr(settings, 'SHARED_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _version_key(namespace):
+    """مفتاح عدّاد الإصدار لنطاق معين"""
+    return f'idea:version:{namespace}'
+
+
+def _initial_version():
+    """
+    قيمة الإصدار الابتدائية
+
+    نبدأ من طابع زمني حتى لا يعود إصدار قديم للظهور بعد فقدان المفتاح
+    من ذاكرة التخزين المؤقت.
+    """
+    return int(time.time())
+
+
+def get_cache_version(namespace, backend=None):
+    """
+    الحصول على الإصدار الحالي لنطاق التخزين المؤقت
+
+    Args:
+        namespace: اسم النطاق
+        backend: ذاكرة التخزين المؤقت المستخدمة (الافتراضية إن لم تحدد)
+    """
+    backend = backend or cache
+    key = _version_key(namespace)
+    version = backend.get(key)
+    if version is None:
+        version = _initial_version()
+        if not backend.add(key, version, timeout=None):
+            version = backend.get(key, version)
+    return version
+
+
+def bump_cache_version(namespace, backend=None):
+    """رفع إصدار النطاق لإبطال جميع البيانات المخزنة تحته"""
+    backend = backend or cache
+    key = _version_key(namespace)
+    try:
+        return backend.incr(key)
+    except ValueError:
+        # المفتاح غير موجود (أول استخدام أو تم حذفه)
+        version = _initial_version()
+        backend.set(key, version, timeout=None)
+        return version
+
+
+def make_etag(*parts):
+    """إنشاء وسم ETag من أجزاء الإصدار"""
+    return '"%s"' % '-'.join(str(part) for part in parts)
+
+
+def content_digest(data):
+    """بصمة قصيرة لمحتوى قابل للتحويل إلى JSON (لوسم ETag بدون إصدار)"""
+    payload = json.dumps(data, sort_keys=True, default=str).encode()
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+def etag_matches(request, etag):
+    """التحقق مما إذا كان العميل يملك النسخة الحالية (If-None-Match)"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
+
+
+def not_modified_since(request, timestamp):
+    """
+    التحقق من If-Modified-Since
+
+    يُتجاهل إذا أرسل العميل If-None-Match (الأولوية للـ ETag).
+    """
+    if request.META.get('HTTP_IF_NONE_MATCH'):
+        return False
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(timestamp) <= since
@@ -0,0 +1,16 @@
+"""
+إعدادات تطبيق الفواتير
+"""
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+
+class BillingConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'idea_platform.billing'
+    label = 'billing'
+    verbose_name = _('الفواتير')
+
+    def ready(self):
+        """تسجيل الإشارات ونموذج عداد أرقام الفواتير عند تحميل التطبيق"""
+        from . import numbering, signals  # noqa: F401
@@ -0,0 +1,150 @@
+"""
+تصدير ملفات PDF لمجموعة فواتير في ملف ZIP يُبث على دفعات
+
+تُقرأ الفواتير المخزنة مسبقاً من ذاكرة ملفات PDF، وتُولد البقية بالتوازي
+عبر مجموعة عمليات التوليد (pdf_renderer) ثم تُخزن في الذاكرة نفسها. يُكتب
+كل ملف في الأرشيف فور انتهائه ويُرسل ما كُتب مباشرة، لذا لا يحتفظ التصدير
+في الذاكرة إلا بعدد محدود من الملفات مهما كان عدد الفواتير.
+
+تُكتب حالة التقدم في الذاكرة المشتركة (SHARED_CACHE_ALIAS) حتى يمكن
+متابعتها من أي عملية.
+"""
+import time
+import uuid
+import zipfile
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+
+from .pdf_cache import invoice_pdf_path, store_invoice_pdf
+
+EXPORT_PROGRESS_TIMEOUT = 3600
+
+
+def filter_invoices(queryset, client=None, status=None, date_from=None, date_to=None):
+    """تصفية الفواتير حسب العميل والحالة ونطاق تاريخ الإصدار"""
+    if client:
+        queryset = queryset.filter(client=client)
+    if status:
+        queryset = queryset.filter(status=status)
+    if date_from:
+        queryset = queryset.filter(issue_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(issue_date__lte=date_to)
+    return queryset
+
+
+class _ZipStream:
+    """
+    مخرج غير قابل للتنقل (seek) لـ ZipFile يجمع ما يُكتب حتى يُسحب
+
+    عدم دعم tell/seek يجعل ZipFile يكتب أحجام الملفات بعد محتواها (data
+    descriptor)، فيمكن إرسال كل جزء فور كتابته.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _progress_cache():
+    alias = getattr(settings, 'SHARED_CACHE_ALIAS', None)
+    return caches[alias] if alias else cache
+
+
+def export_progress_key(export_id):
+    return f'billing:export:{export_id}'
+
+
+def get_export_progress(export_id):
+    """حالة تقدم تصدير (أو None إذا لم يكن موجوداً)"""
+    return _progress_cache().get(export_progress_key(export_id))
+
+
+class InvoicePdfExport:
+    """
+    تصدير ملفات PDF لمجموعة فواتير كملف ZIP
+
+    Args:
+        queryset: الفواتير المطلوب تصديرها
+        template: قالب الفاتورة (اختياري)
+        progress: دالة تُستدعى بعد كل ملف بالشكل progress(done, total)
+        pool: مجموعة عمليات التوليد (الافتراضي: المجموعة المشتركة)
+    """
+
+    def __init__(self, queryset, template=None, progress=None, pool=None):
+        self.queryset = queryset.select_related('client', 'project').order_by('issue_date', 'pk')
+        self.template = template
+        self.progress = progress
+        self.pool = pool
+        self.export_id = uuid.uuid4().hex
+        self.total = 0
+        self.done = 0
+
+    def entry_name(self, invoice):
+        return f"invoice_{invoice.invoice_number}.pdf"
+
+    def _report(self):
+        _progress_cache().set(export_progress_key(self.export_id), {
+            'done': self.done,
+            'total': self.total,
+            'finished': self.done >= self.total,
+        }, EXPORT_PROGRESS_TIMEOUT)
+        if self.progress:
+            self.progress(self.done, self.total)
+
+    def _entries(self):
+        """
+        ملفات الأرشيف بالشكل (اسم الملف، المحتوى) حسب ترتيب الانتهاء
+        """
+        from .pdf_renderer import get_renderer_pool
+
+        missing = {}
+        for invoice in self.queryset.iterator(chunk_size=200):
+            path = invoice_pdf_path(invoice, self.template)
+            if default_storage.exists(path):
+                with default_storage.open(path, 'rb') as pdf_file:
+                    yield self.entry_name(invoice), pdf_file.read()
+            else:
+                missing[str(invoice.pk)] = (self.entry_name(invoice), path)
+
+        if not missing:
+            return
+
+        pool = self.pool or get_renderer_pool()
+        template_id = self.template.pk if self.template and self.template.html_template else None
+        window = getattr(settings, 'BILLING_PDF_EXPORT_WINDOW', None)
+        for invoice_id, content in pool.imap(list(missing), template_id, window=window):
+            name, path = missing.pop(invoice_id)
+            store_invoice_pdf(path, content)
+            yield name, content
+
+    def stream(self):
+        """
+        محتوى ملف ZIP على دفعات (دفعة لكل فاتورة)
+        """
+        self.total = self.queryset.count()
+        self.done = 0
+        self._report()
+
+        output = _ZipStream()
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for name, content in self._entries():
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                archive.writestr(info, content)
+                self.done += 1
+                self._report()
+                yield output.drain()
+        yield output.drain()
@@ -0,0 +1,165 @@
+"""
+إرسال الفواتير بالبريد الإلكتروني على دفعات
+
+تُرسل رسائل الدفعة الواحدة عبر اتصال SMTP واحد (get_connection) يبقى
+مفتوحاً حتى نهايتها، مع حد أقصى لعدد الرسائل في الثانية. الإرسال الفعلي
+يتم في مهام Celery (tasks.py) التي تعيد محاولة الرسائل الفاشلة فقط مع
+تأخير متزايد.
+
+للتجربة محلياً يكفي تشغيل خادم SMTP للتصحيح (مثل
+``python -m aiosmtpd -n -l localhost:1025``) وضبط EMAIL_HOST=localhost
+و EMAIL_PORT=1025 و EMAIL_USE_TLS=False.
+"""
+import logging
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# أخطاء مؤقتة تستحق إعادة المحاولة
+TRANSIENT_EMAIL_ERRORS = (smtplib.SMTPException, OSError)
+
+
+def build_invoice_email(invoice, recipients, subject=None, message=None, pdf_content=None, connection=None):
+    """
+    إنشاء رسالة الفاتورة مع ملف PDF مرفق
+
+    Returns:
+        EmailMessage: الرسالة جاهزة للإرسال
+    """
+    if not subject:
+        subject = f"فاتورة رقم {invoice.invoice_number} - {invoice.client.name}"
+
+    if not message:
+        message = render_to_string('billing/invoice_email.html', {
+            'invoice': invoice,
+            'client': invoice.client,
+        })
+
+    # إنشاء PDF (أو قراءته من ذاكرة ملفات PDF)
+    if pdf_content is None:
+        from .pdf_cache import read_invoice_pdf
+        pdf_content = read_invoice_pdf(invoice)
+
+    email = EmailMessage(
+        subject=subject,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=recipients,
+        connection=connection,
+    )
+    email.attach(
+        f"invoice_{invoice.invoice_number}.pdf",
+        pdf_content,
+        'application/pdf'
+    )
+    return email
+
+
+class RateLimiter:
+    """حد أقصى لعدد العمليات في الثانية (0 = بلا حد)"""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _reopen(connection):
+    """إعادة فتح الاتصال بعد خطأ (قد يكون الاتصال قد انقطع)"""
+    for action in (connection.close, connection.open):
+        try:
+            action()
+        except TRANSIENT_EMAIL_ERRORS:
+            # تفشل الرسائل التالية وتُعاد محاولتها لاحقاً
+            logger.warning('Could not reset the email connection', exc_info=True)
+
+
+def send_invoice_batch(invoices, connection=None, rate_limit=None):
+    """
+    إرسال فواتير متعددة لعملائها عبر اتصال SMTP واحد
+
+    Args:
+        invoices: الفواتير (يُرسل كل منها إلى بريد العميل)
+        connection: اتصال البريد (الافتراضي: اتصال جديد من get_connection)
+        rate_limit: عدد الرسائل في الثانية (الافتراضي: BILLING_EMAIL_RATE_LIMIT)
+
+    Returns:
+        tuple: (معرفات الفواتير المرسلة، معرفات الفواتير التي فشل إرسالها)
+    """
+    if rate_limit is None:
+        rate_limit = getattr(settings, 'BILLING_EMAIL_RATE_LIMIT', 0)
+    limiter = RateLimiter(rate_limit)
+    connection = connection or get_connection()
+
+    sent, failed = [], []
+    connection.open()
+    try:
+        for invoice in invoices:
+            if not invoice.client.email:
+                logger.warning('Invoice %s has no client email', invoice.invoice_number)
+                continue
+            try:
+                email = build_invoice_email(invoice, [invoice.client.email], connection=connection)
+                limiter.wait()
+                email.send()
+            except TRANSIENT_EMAIL_ERRORS:
+                logger.exception('Failed to send invoice %s', invoice.invoice_number)
+                failed.append(str(invoice.pk))
+                _reopen(connection)
+            else:
+                sent.append(str(invoice.pk))
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def overdue_invoices(today=None):
+    """الفواتير المرسلة التي تجاوزت تاريخ الاستحقاق"""
+    from .models import Invoice, InvoiceStatus
+
+    today = today or timezone.localdate()
+    return Invoice.objects.filter(
+        status=InvoiceStatus.SENT,
+        due_date__lt=today,
+    ).select_related('client', 'project').order_by('due_date', 'pk')
+
+
+def queue_overdue_invoice_emails(batch_size=None):
+    """
+    جدولة إرسال جميع الفواتير المتأخرة على دفعات (مهمة Celery لكل دفعة)
+
+    Returns:
+        int: عدد الفواتير المجدولة
+    """
+    from .tasks import send_invoice_batch_task
+
+    batch_size = batch_size or getattr(settings, 'BILLING_EMAIL_BATCH_SIZE', 50)
+    queued = 0
+    batch = []
+    for invoice_id in overdue_invoices().values_list('pk', flat=True).iterator():
+        batch.append(str(invoice_id))
+        if len(batch) >= batch_size:
+            send_invoice_batch_task.delay(batch)
+            queued += len(batch)
+            batch = []
+    if batch:
+        send_invoice_batch_task.delay(batch)
+        queued += len(batch)
+    return queued
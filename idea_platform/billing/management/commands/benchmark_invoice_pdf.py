@@ -0,0 +1,88 @@
+"""
+أمر قياس أداء توليد ملفات PDF للفواتير
+
+يقارن ثلاث طرق:
+- cold: مولد جديد لكل فاتورة (الطريقة السابقة: خطوط و CSS وقالب من جديد)
+- warm: المولد الدائم في العملية الحالية
+- pool: مجموعة العمليات الدائمة (زمن الفاتورة = الزمن الكلي / العدد)
+"""
+import math
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Invoice, InvoiceTemplate
+from ...pdf_renderer import InvoiceRenderer, InvoiceRendererPool, get_renderer
+
+
+def percentile(samples, percent):
+    """النسبة المئوية بطريقة أقرب رتبة"""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = 'قياس زمن توليد ملفات PDF للفواتير (p50/p99) بالطريقة الباردة والمولد الدائم'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=50, help='عدد عمليات التوليد لكل طريقة')
+        parser.add_argument('--template', help='معرف قالب الفاتورة (اختياري)')
+        parser.add_argument('--workers', type=int, default=None, help='عدد عمليات المجموعة')
+        parser.add_argument('--skip-pool', action='store_true', help='عدم قياس مجموعة العمليات')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        invoices = list(
+            Invoice.objects.select_related('client', 'project').order_by('-created_at')[:count]
+        )
+        if not invoices:
+            raise CommandError('لا توجد فواتير لقياس الأداء')
+        invoices = [invoices[i % len(invoices)] for i in range(count)]
+
+        template = None
+        if options['template']:
+            template = InvoiceTemplate.objects.filter(pk=options['template']).first()
+            if template is None:
+                raise CommandError('قالب الفاتورة غير موجود')
+
+        self.report('cold', self.measure(
+            invoices, lambda invoice: InvoiceRenderer().render(invoice, template)
+        ))
+
+        renderer = get_renderer().warm([template] if template else [])
+        self.report('warm', self.measure(
+            invoices, lambda invoice: renderer.render(invoice, template)
+        ))
+
+        if not options['skip_pool']:
+            self.measure_pool(invoices, template, options['workers'])
+
+    def measure(self, invoices, render):
+        samples = []
+        for invoice in invoices:
+            started = time.perf_counter()
+            render(invoice)
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    def measure_pool(self, invoices, template, workers):
+        template_id = template.pk if template else None
+        with InvoiceRendererPool(max_workers=workers) as pool:
+            # تشغيل العمليات وتحميلها قبل القياس
+            list(pool.imap([invoices[0].pk] * pool.max_workers, template_id))
+
+            started = time.perf_counter()
+            rendered = sum(1 for _ in pool.imap([invoice.pk for invoice in invoices], template_id))
+            elapsed = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(
+            f'pool  workers={pool.max_workers} total={elapsed:.1f}ms '
+            f'per_invoice={elapsed / rendered:.1f}ms'
+        )
+
+    def report(self, label, samples):
+        self.stdout.write(
+            f'{label:<5} n={len(samples)} p50={percentile(samples, 50):.1f}ms '
+            f'p99={percentile(samples, 99):.1f}ms max={max(samples):.1f}ms'
+        )
@@ -0,0 +1,47 @@
+"""
+أمر تصدير ملفات PDF لمجموعة فواتير في ملف ZIP
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from ...exports import InvoicePdfExport, filter_invoices
+from ...models import Invoice
+from ...serializers import InvoiceExportFilterSerializer
+
+
+class Command(BaseCommand):
+    help = 'تصدير ملفات PDF للفواتير (حسب العميل والحالة ونطاق التاريخ) في ملف ZIP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='مسار ملف ZIP الناتج')
+        parser.add_argument('--client', help='معرف العميل')
+        parser.add_argument('--status', help='حالة الفاتورة')
+        parser.add_argument('--date-from', help='تاريخ الإصدار من (YYYY-MM-DD)')
+        parser.add_argument('--date-to', help='تاريخ الإصدار إلى (YYYY-MM-DD)')
+        parser.add_argument('--template', help='معرف قالب الفاتورة')
+
+    def handle(self, *args, **options):
+        data = {
+            key: options[key]
+            for key in ('client', 'status', 'date_from', 'date_to', 'template')
+            if options[key]
+        }
+        serializer = InvoiceExportFilterSerializer(data=data)
+        if not serializer.is_valid():
+            raise CommandError(serializer.errors)
+        filters = dict(serializer.validated_data)
+        template = filters.pop('template', None)
+
+        export = InvoicePdfExport(
+            filter_invoices(Invoice.objects.all(), **filters),
+            template=template,
+            progress=self.report_progress,
+        )
+        with open(options['output'], 'wb') as output:
+            for chunk in export.stream():
+                output.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"{export.done} -> {options['output']}"))
+
+    def report_progress(self, done, total):
+        self.stdout.write(f'{done}/{total}', ending='\r')
+        self.stdout.flush()
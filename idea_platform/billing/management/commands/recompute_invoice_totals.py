@@ -0,0 +1,34 @@
+"""
+أمر إعادة حساب مجاميع الفواتير في قاعدة البيانات
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from ...exports import filter_invoices
+from ...models import Invoice
+from ...serializers import InvoiceFilterSerializer
+from ...utils import recompute_invoice_totals
+
+
+class Command(BaseCommand):
+    help = 'إعادة حساب مجاميع الفواتير (حسب العميل والحالة ونطاق التاريخ) على دفعات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', help='معرف العميل')
+        parser.add_argument('--status', help='حالة الفاتورة')
+        parser.add_argument('--date-from', help='تاريخ الإصدار من (YYYY-MM-DD)')
+        parser.add_argument('--date-to', help='تاريخ الإصدار إلى (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='عدد الفواتير في كل UPDATE')
+
+    def handle(self, *args, **options):
+        data = {
+            key: options[key]
+            for key in ('client', 'status', 'date_from', 'date_to')
+            if options[key]
+        }
+        serializer = InvoiceFilterSerializer(data=data)
+        if not serializer.is_valid():
+            raise CommandError(serializer.errors)
+
+        queryset = filter_invoices(Invoice.objects.all(), **serializer.validated_data)
+        updated = recompute_invoice_totals(queryset, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{updated}'))
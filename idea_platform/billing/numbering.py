@@ -0,0 +1,111 @@
+"""
+خدمة ترقيم الفواتير (بدون تكرار وبدون فجوات)
+
+يُحتفظ لكل (سنة، شهر) بسجل عداد يُقفل بـ SELECT ... FOR UPDATE عند
+الحجز، لذا لا يحصل طلبان متزامنان على الرقم نفسه. يُحجز الرقم داخل
+معاملة إنشاء الفاتورة: إذا أُلغيت المعاملة يُلغى الحجز معها فلا تنشأ
+فجوات (ولهذا لا يُستخدم PostgreSQL SEQUENCE الذي لا يتراجع عند الإلغاء).
+
+صيغة الرقم: INV-YYYY-MM-XXXX
+"""
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+INVOICE_NUMBER_PREFIX = 'INV'
+
+
+class InvoiceNumberCounter(models.Model):
+    """آخر رقم مستخدم للفواتير في شهر معين"""
+    year = models.PositiveSmallIntegerField(verbose_name=_('السنة'))
+    month = models.PositiveSmallIntegerField(verbose_name=_('الشهر'))
+    last_number = models.PositiveIntegerField(default=0, verbose_name=_('آخر رقم'))
+
+    class Meta:
+        app_label = 'billing'
+        verbose_name = _('عداد أرقام الفواتير')
+        verbose_name_plural = _('عدادات أرقام الفواتير')
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='billing_invoice_counter_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.year}-{self.month:02d}: {self.last_number}"
+
+
+def format_invoice_number(year, month, number):
+    return f"{INVOICE_NUMBER_PREFIX}-{year}-{month:02d}-{number:04d}"
+
+
+def _last_existing_number(year, month):
+    """
+    أعلى رقم مستخدم في فواتير الشهر (يُستخدم مرة واحدة عند إنشاء العداد
+    حتى يستمر الترقيم بعد الفواتير المرقمة بالطريقة السابقة)
+    """
+    from .models import Invoice
+
+    prefix = f"{INVOICE_NUMBER_PREFIX}-{year}-{month:02d}-"
+    last_number = 0
+    numbers = Invoice.objects.filter(invoice_number__startswith=prefix).values_list(
+        'invoice_number', flat=True
+    )
+    for invoice_number in numbers.iterator():
+        try:
+            last_number = max(last_number, int(invoice_number[len(prefix):]))
+        except ValueError:
+            continue
+    return last_number
+
+
+def _locked_counter(year, month):
+    """سجل العداد مقفلاً حتى نهاية المعاملة الحالية (يُنشأ عند الحاجة)"""
+    counters = InvoiceNumberCounter.objects.select_for_update()
+    try:
+        return counters.get(year=year, month=month)
+    except InvoiceNumberCounter.DoesNotExist:
+        pass
+
+    try:
+        with transaction.atomic():
+            InvoiceNumberCounter.objects.create(
+                year=year, month=month, last_number=_last_existing_number(year, month)
+            )
+    except IntegrityError:
+        # أنشأه طلب آخر في الوقت نفسه
+        pass
+    return counters.get(year=year, month=month)
+
+
+def reserve_invoice_numbers(count=1, date=None):
+    """
+    حجز عدد من أرقام الفواتير المتتالية
+
+    يجب استدعاؤها داخل معاملة إنشاء الفواتير نفسها، فيبقى العداد مقفلاً
+    حتى تأكيدها ويتراجع الحجز إذا أُلغيت.
+
+    Args:
+        count: عدد الأرقام المطلوبة (للاستيراد الجماعي)
+        date: تاريخ الفاتورة الذي يحدد الشهر (الافتراضي: اليوم)
+
+    Returns:
+        list: أرقام الفواتير المحجوزة بالترتيب
+    """
+    if count < 1:
+        raise ValueError('count must be a positive integer')
+
+    date = date or timezone.localdate()
+    with transaction.atomic():
+        counter = _locked_counter(date.year, date.month)
+        first = counter.last_number + 1
+        counter.last_number += count
+        counter.save(update_fields=['last_number'])
+
+    return [
+        format_invoice_number(date.year, date.month, number)
+        for number in range(first, first + count)
+    ]
+
+
+def next_invoice_number(date=None):
+    """حجز رقم فاتورة واحد"""
+    return reserve_invoice_numbers(1, date)[0]
@@ -0,0 +1,246 @@
+"""
+ذاكرة ملفات PDF للفواتير (معنونة حسب المحتوى)
+
+يُخزن كل ملف PDF تحت بصمة (hash) تجمع محتوى الفاتورة وبنودها وبيانات
+العميل والمشروع ومحتوى القالب و CSS، لذا فإن أي تعديل ينتج بصمة جديدة
+تلقائياً. تُرتب الملفات في التخزين على الشكل:
+
+    <BILLING_PDF_CACHE_ROOT>/<قالب>/<معرف الفاتورة>/<البصمة>.pdf
+
+مما يسمح بحذف ملفات فاتورة واحدة أو قالب واحد فقط عند تعديلهما. لا
+يلزم حذف الملفات عند تعديل الفاتورة لأن البصمة الجديدة لا تطابقها، ويحذف
+store_invoice_pdf النسخ الأقدم للفاتورة عند تخزين الملف الجديد.
+"""
+import hashlib
+import json
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+
+DEFAULT_TEMPLATE_KEY = 'default'
+
+
+def _cache_root():
+    return getattr(settings, 'BILLING_PDF_CACHE_ROOT', 'billing/pdf')
+
+
+def _digest(*parts):
+    """بصمة SHA-256 لمجموعة من الأجزاء النصية"""
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode('utf-8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+def _uses_custom_template(template):
+    return bool(template and template.html_template)
+
+
+def template_key(template):
+    """مجلد القالب داخل الذاكرة"""
+    if _uses_custom_template(template):
+        return str(template.pk)
+    return DEFAULT_TEMPLATE_KEY
+
+
+def template_fingerprint(template):
+    """بصمة محتوى القالب و CSS"""
+    if _uses_custom_template(template):
+        return _digest(template.html_template, template.css_styles or '')
+
+    from .utils import get_default_invoice_css, get_default_invoice_template
+    return _digest(get_default_invoice_template(), get_default_invoice_css())
+
+
+def _instance_data(instance):
+    """جميع الحقول المخزنة للسجل"""
+    if instance is None:
+        return None
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def invoice_fingerprint(invoice, template=None):
+    """
+    بصمة محتوى الفاتورة كما سيظهر في ملف PDF
+
+    تشمل حقول الفاتورة والبنود والعميل والمشروع إضافة إلى القالب.
+    """
+    payload = {
+        'invoice': _instance_data(invoice),
+        'items': list(invoice.items.order_by('order', 'pk').values()),
+        'client': _instance_data(invoice.client),
+        'project': _instance_data(invoice.project) if invoice.project_id else None,
+        'template': template_fingerprint(template),
+    }
+    return _digest(json.dumps(payload, sort_keys=True, default=str))
+
+
+def invoice_pdf_path(invoice, template=None, fingerprint=None):
+    """مسار ملف PDF في التخزين"""
+    fingerprint = fingerprint or invoice_fingerprint(invoice, template)
+    return posixpath.join(
+        _cache_root(), template_key(template), str(invoice.pk), f'{fingerprint}.pdf'
+    )
+
+
+def _delete_directory(path):
+    """حذف جميع الملفات داخل مجلد في التخزين (مع المجلدات الفرعية)"""
+    try:
+        directories, files = default_storage.listdir(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return 0
+
+    deleted = 0
+    for name in files:
+        default_storage.delete(posixpath.join(path, name))
+        deleted += 1
+    for name in directories:
+        deleted += _delete_directory(posixpath.join(path, name))
+    return deleted
+
+
+def _template_directories():
+    try:
+        directories, _files = default_storage.listdir(_cache_root())
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    return directories
+
+
+def ensure_invoice_pdf(invoice, template=None):
+    """
+    الحصول على مسار ملف PDF الحالي للفاتورة، مع توليده إن لم يكن مخزناً
+
+    Returns:
+        str: مسار الملف في التخزين
+    """
+    path, _content = _ensure_invoice_pdf(invoice, template)
+    return path
+
+
+def _ensure_invoice_pdf(invoice, template=None):
+    """
+    Returns:
+        tuple: (مسار الملف، المحتوى إذا وُلّد الآن وإلا None)
+    """
+    path = invoice_pdf_path(invoice, template)
+    if default_storage.exists(path):
+        return path, None
+
+    from .utils import render_invoice_pdf
+    content = render_invoice_pdf(invoice, template)
+    return store_invoice_pdf(path, content), content
+
+
+def store_invoice_pdf(path, content):
+    """تخزين ملف PDF وحذف النسخ الأقدم للفاتورة نفسها"""
+    directory = posixpath.dirname(path)
+    try:
+        _directories, files = default_storage.listdir(directory)
+    except (FileNotFoundError, NotADirectoryError):
+        files = []
+    for name in files:
+        if posixpath.join(directory, name) != path:
+            default_storage.delete(posixpath.join(directory, name))
+
+    if default_storage.exists(path):
+        return path
+    return default_storage.save(path, ContentFile(content))
+
+
+def read_invoice_pdf(invoice, template=None):
+    """
+    محتوى ملف PDF للفاتورة (مع توليده عند الحاجة)
+
+    إذا وُلّد الملف الآن يُعاد المحتوى نفسه دون قراءته مرة أخرى من التخزين.
+    """
+    path, content = _ensure_invoice_pdf(invoice, template)
+    if content is not None:
+        return content
+    with default_storage.open(path, 'rb') as pdf_file:
+        return pdf_file.read()
+
+
+def pdf_file_response(path, filename):
+    """
+    تقديم ملف PDF مخزن
+
+    إذا ضُبط BILLING_PDF_X_ACCEL_REDIRECT_PREFIX يُترك إرسال الملف لخادم
+    nginx عبر X-Accel-Redirect، وإلا يُبث الملف مباشرة بـ FileResponse.
+    """
+    prefix = getattr(settings, 'BILLING_PDF_X_ACCEL_REDIRECT_PREFIX', '')
+    if prefix:
+        response = HttpResponse(content_type='application/pdf')
+        response['X-Accel-Redirect'] = posixpath.join(prefix, path)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    return FileResponse(
+        default_storage.open(path, 'rb'),
+        as_attachment=True,
+        filename=filename,
+        content_type='application/pdf'
+    )
+
+
+def invalidate_invoice_pdfs(invoice_id):
+    """حذف ملفات PDF المخزنة لفاتورة واحدة (لجميع القوالب)"""
+    deleted = 0
+    for directory in _template_directories():
+        deleted += _delete_directory(posixpath.join(_cache_root(), directory, str(invoice_id)))
+    return deleted
+
+
+def invalidate_template_pdfs(template_id):
+    """حذف ملفات PDF المخزنة لقالب واحد فقط"""
+    return _delete_directory(posixpath.join(_cache_root(), str(template_id)))
+
+
+def queue_invoice_pdf(invoice, template=None):
+    """جدولة توليد ملف PDF في الخلفية بعد تأكيد المعاملة الحالية"""
+    template_id = str(template.pk) if _uses_custom_template(template) else None
+    queue_invoice_pdf_render(invoice.pk, template_id)
+
+
+class _PendingRenders:
+    """ملفات PDF المطلوب توليدها عند تأكيد المعاملة (كل فاتورة مرة واحدة)"""
+
+    def __init__(self):
+        self.renders = {}
+
+    def add(self, invoice_id, template_id):
+        self.renders[(invoice_id, template_id)] = None
+
+    def __call__(self):
+        from .tasks import render_invoice_pdf_task
+
+        for invoice_id, template_id in self.renders:
+            render_invoice_pdf_task.delay(invoice_id, template_id)
+
+
+def queue_invoice_pdf_render(invoice_id, template_id=None):
+    """
+    جدولة توليد ملف PDF بمعرف الفاتورة (عند عدم توفر الفاتورة نفسها)
+
+    داخل المعاملة تُجمع الطلبات في دالة on_commit واحدة، فلا تُرسل أكثر من
+    مهمة واحدة للفاتورة مهما تعددت عمليات الحفظ (الفاتورة والبنود والمجاميع).
+    """
+    connection = transaction.get_connection()
+    pending = None
+    if connection.in_atomic_block:
+        pending = next(
+            (entry[1] for entry in connection.run_on_commit if isinstance(entry[1], _PendingRenders)),
+            None
+        )
+    if pending is not None:
+        pending.add(str(invoice_id), template_id)
+        return
+
+    pending = _PendingRenders()
+    pending.add(str(invoice_id), template_id)
+    transaction.on_commit(pending)
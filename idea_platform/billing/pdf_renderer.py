@@ -0,0 +1,221 @@
+"""
+مولد ملفات PDF الدائم للفواتير
+
+إنشاء FontConfiguration وتحليل CSS وترجمة قالب Django هي تكلفة ثابتة
+تتكرر مع كل فاتورة. يحتفظ InvoiceRenderer بهذه الكائنات طوال عمر العملية،
+وتُخزن القوالب المترجمة و CSS حسب بصمة محتوى القالب (فأي تعديل على
+InvoiceTemplate ينتج مدخلاً جديداً تلقائياً).
+
+لتوليد عدد كبير من الفواتير يوزع InvoiceRendererPool العمل على عمليات
+منفصلة (عملية لكل نواة)، تحمل كل منها مولدها الدائم الخاص.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.template import Context, Template
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+from .pdf_cache import template_fingerprint, template_key
+
+DEFAULT_MAX_TEMPLATES = 32
+
+
+class InvoiceRenderer:
+    """
+    مولد PDF يحتفظ بإعداد الخطوط و CSS المحلل والقوالب المترجمة
+
+    الكائن غير آمن للاستخدام من عدة threads في الوقت نفسه، لذا يُحصل عليه
+    عبر get_renderer() التي تعيد نسخة لكل thread.
+    """
+
+    def __init__(self, max_templates=DEFAULT_MAX_TEMPLATES):
+        self.font_config = FontConfiguration()
+        self.max_templates = max_templates
+        self._compiled = OrderedDict()
+
+    def compile(self, template=None):
+        """
+        القالب المترجم و CSS المحلل للقالب المحدد (أو الافتراضي)
+
+        Returns:
+            tuple: (Template, CSS)
+        """
+        key = (template_key(template), template_fingerprint(template))
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            self._compiled.move_to_end(key)
+            return compiled
+
+        if template and template.html_template:
+            html_content = template.html_template
+            css_content = template.css_styles or ""
+        else:
+            from .utils import get_default_invoice_css, get_default_invoice_template
+            html_content = get_default_invoice_template()
+            css_content = get_default_invoice_css()
+
+        compiled = (
+            Template(html_content),
+            CSS(string=css_content, font_config=self.font_config),
+        )
+        self._compiled[key] = compiled
+        while len(self._compiled) > self.max_templates:
+            self._compiled.popitem(last=False)
+        return compiled
+
+    def warm(self, templates=()):
+        """تحميل القالب الافتراضي والقوالب المحددة مسبقاً"""
+        self.compile(None)
+        for template in templates:
+            self.compile(template)
+        return self
+
+    def render(self, invoice, template=None, context_data=None, target=None):
+        """
+        توليد ملف PDF للفاتورة
+
+        Args:
+            invoice: كائن الفاتورة
+            template: قالب الفاتورة (اختياري)
+            context_data: بيانات إضافية للقالب (اختياري)
+            target: ملف أو مسار يُكتب فيه الناتج (اختياري)
+
+        Returns:
+            bytes: محتوى ملف PDF، أو None إذا حُدد target
+        """
+        from .utils import get_invoice_context
+
+        template_obj, css_doc = self.compile(template)
+        rendered_html = template_obj.render(Context(get_invoice_context(invoice, context_data)))
+        html_doc = HTML(string=rendered_html, base_url=settings.STATIC_URL)
+        return html_doc.write_pdf(target, stylesheets=[css_doc], font_config=self.font_config)
+
+
+_local = threading.local()
+
+
+def get_renderer():
+    """المولد الدائم للـ thread الحالي"""
+    renderer = getattr(_local, 'renderer', None)
+    if renderer is None:
+        renderer = _local.renderer = InvoiceRenderer()
+    return renderer
+
+
+def _init_worker():
+    """تهيئة عملية التوليد: إعداد Django وتحميل المولد مسبقاً"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    get_renderer().warm()
+
+
+def _render_in_worker(invoice_id, template_id=None):
+    """توليد فاتورة داخل عملية التوليد"""
+    from .models import Invoice, InvoiceTemplate
+
+    invoice = Invoice.objects.select_related('client', 'project').get(pk=invoice_id)
+    template = None
+    if template_id:
+        template = InvoiceTemplate.objects.filter(pk=template_id).first()
+    return invoice_id, get_renderer().render(invoice, template)
+
+
+class InvoiceRendererPool:
+    """
+    مجموعة عمليات دائمة لتوليد ملفات PDF بالتوازي
+
+    تُنشأ العمليات بطريقة spawn (لا تُورث اتصالات قاعدة البيانات أو حالة
+    fontconfig من العملية الأم)، وتبقى العمليات وكائناتها المحملة طوال
+    عمر المجموعة.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or getattr(
+            settings, 'BILLING_PDF_RENDER_WORKERS', None
+        ) or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def imap(self, invoice_ids, template_id=None, window=None):
+        """
+        توليد الفواتير بالتوازي وإرجاعها حسب ترتيب الانتهاء
+
+        لا يتجاوز عدد الفواتير قيد التوليد (أو المنتظرة للاستهلاك) قيمة
+        window، لذا يبقى استهلاك الذاكرة محدوداً مهما كان عدد الفواتير.
+
+        Yields:
+            tuple: (معرف الفاتورة، محتوى PDF)
+        """
+        window = window or self.max_workers * 2
+        template_id = str(template_id) if template_id else None
+        pending = set()
+        for invoice_id in invoice_ids:
+            pending.add(self.executor.submit(_render_in_worker, str(invoice_id), template_id))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+    def render_many(self, invoice_ids, template_id=None):
+        """
+        توليد عدة فواتير بالتوازي
+
+        Returns:
+            dict: {معرف الفاتورة: محتوى PDF}
+        """
+        return dict(self.imap(invoice_ids, template_id))
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_renderer_pool():
+    """مجموعة التوليد المشتركة للعملية الحالية (تُغلق عند الخروج)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = InvoiceRendererPool()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def render_invoices(invoice_ids, template_id=None):
+    """توليد عدة فواتير بالتوازي باستخدام المجموعة المشتركة"""
+    return get_renderer_pool().render_many(invoice_ids, template_id)
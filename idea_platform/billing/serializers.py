@@ -1,6 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Invoice, InvoiceItem, InvoiceTemplate, Payment
+from .models import Invoice, InvoiceItem, InvoiceStatus, InvoiceTemplate, Payment
 from idea_platform.crm.models import Client as ClientModel
+from .utils import calculate_invoice_totals, write_invoice_items
 
 
 class ClientSerializer(serializers.ModelSerializer):
@@ -12,6 +14,8 @@ class ClientSerializer(serializers.ModelSerializer):
 
 
 class InvoiceItemSerializer(serializers.ModelSerializer):
+    # يُقبل id عند الكتابة لمطابقة البنود الحالية (تحديث بدل حذف وإعادة إنشاء)
+    id = serializers.ModelField(model_field=InvoiceItem._meta.pk, required=False)
     total_amount = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
@@ -33,28 +37,47 @@ class InvoiceSerializer(serializers.ModelSerializer):
 
 
 
+    def validate_items(self, items):
+        """التحقق من أن معرفات البنود تخص الفاتورة الحالية"""
+        item_ids = [str(item['id']) for item in items if item.get('id') is not None]
+        if not item_ids:
+            return items
+
+        if len(set(item_ids)) != len(item_ids):
+            raise serializers.ValidationError('معرف البند مكرر')
+
+        known_ids = set()
+        if self.instance is not None:
+            known_ids = {str(pk) for pk in self.instance.items.values_list('pk', flat=True)}
+        unknown_ids = set(item_ids) - known_ids
+        if unknown_ids:
+            raise serializers.ValidationError(
+                f"البنود التالية لا تخص هذه الفاتورة: {', '.join(sorted(unknown_ids))}"
+            )
+        return items
+
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
         invoice = Invoice.objects.create(**validated_data)
-        for item_data in items_data:
-            InvoiceItem.objects.create(invoice=invoice, **item_data)
+        if items_data:
+            write_invoice_items(invoice, items_data)
+            calculate_invoice_totals(invoice)
         return invoice
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        items_data = validated_data.pop('items', [])
+        items_data = validated_data.pop('items', None)
 
         # Update invoice fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
 
-        # Handle invoice items
-        # For simplicity, we'll clear existing items and recreate them.
-        # In a real application, you might want more granular update logic.
-        instance.items.all().delete()
-        for item_data in items_data:
-            InvoiceItem.objects.create(invoice=instance, **item_data)
-
+        # مطابقة البنود حسب id ثم حساب المجاميع مرة واحدة
+        if items_data is not None:
+            write_invoice_items(instance, items_data)
+            calculate_invoice_totals(instance)
         return instance
 
 
@@ -69,3 +92,23 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
 
+
+
+class InvoiceFilterSerializer(serializers.Serializer):
+    """معايير اختيار مجموعة فواتير (العميل والحالة ونطاق تاريخ الإصدار)"""
+    client = serializers.PrimaryKeyRelatedField(queryset=ClientModel.objects.all(), required=False)
+    status = serializers.ChoiceField(choices=InvoiceStatus.choices, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        date_from = attrs.get('date_from')
+        date_to = attrs.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError({'date_to': 'تاريخ النهاية يجب أن يكون بعد تاريخ البداية'})
+        return attrs
+
+
+class InvoiceExportFilterSerializer(InvoiceFilterSerializer):
+    """معايير تصدير ملفات PDF للفواتير"""
+    template = serializers.PrimaryKeyRelatedField(queryset=InvoiceTemplate.objects.all(), required=False)
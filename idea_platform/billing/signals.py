@@ -0,0 +1,61 @@
+"""
+إشارات نظام الفواتير الخاصة بالذاكرة المؤقتة والمهام الخلفية
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import Invoice, InvoiceItem, InvoiceTemplate, Payment
+from .pdf_cache import (
+    invalidate_invoice_pdfs, invalidate_template_pdfs, queue_invoice_pdf, queue_invoice_pdf_render,
+)
+
+# تُرسل بعد تحديث مجاميع فواتير باستعلام UPDATE (لا يرسل post_save)
+# المعاملات: invoice_ids، و prerender (False في إعادة الحساب الجماعية)
+invoice_totals_changed = Signal()
+
+
+@receiver(post_delete, sender=Invoice)
+def invoice_deleted(sender, instance, **kwargs):
+    """حذف ملفات PDF للفاتورة المحذوفة"""
+    invoice_id = instance.pk
+    transaction.on_commit(lambda: invalidate_invoice_pdfs(invoice_id))
+
+
+def _prerender_enabled():
+    return getattr(settings, 'BILLING_PDF_PRERENDER', True)
+
+
+# لا تُحذف الملفات عند التعديل: مسار الملف يتبع بصمة المحتوى، ويحذف
+# store_invoice_pdf النسخ الأقدم عند تخزين الملف الجديد. ويُجمع التوليد
+# المسبق في مهمة واحدة لكل فاتورة في المعاملة (انظر queue_invoice_pdf_render).
+
+@receiver(post_save, sender=Invoice)
+def prerender_invoice_pdf(sender, instance, **kwargs):
+    """توليد ملف PDF مسبقاً في الخلفية (مفعل افتراضياً)"""
+    if _prerender_enabled():
+        queue_invoice_pdf(instance)
+
+
+@receiver(invoice_totals_changed)
+def invoice_totals_recomputed(sender, invoice_ids, prerender=True, **kwargs):
+    """إعادة توليد ملفات PDF للفواتير التي تغيرت مجاميعها"""
+    if prerender and _prerender_enabled():
+        for invoice_id in invoice_ids:
+            queue_invoice_pdf_render(invoice_id)
+
+
+@receiver([post_save, post_delete], sender=InvoiceItem)
+@receiver([post_save, post_delete], sender=Payment)
+def invoice_content_changed(sender, instance, **kwargs):
+    """تعديل البنود أو المدفوعات يغير محتوى ملف PDF"""
+    if _prerender_enabled():
+        queue_invoice_pdf_render(instance.invoice_id)
+
+
+@receiver([post_save, post_delete], sender=InvoiceTemplate)
+def invoice_template_changed(sender, instance, **kwargs):
+    """حذف ملفات PDF المولدة بهذا القالب فقط"""
+    template_id = instance.pk
+    transaction.on_commit(lambda: invalidate_template_pdfs(template_id))
@@ -0,0 +1,92 @@
+"""
+المهام الخلفية (Celery) لنظام الفواتير
+"""
+import smtplib
+
+from celery import shared_task
+from django.conf import settings
+
+# حد إرسال رسائل الفواتير لكل عامل Celery (صيغة Celery مثل 60/m)
+RATE_LIMIT = getattr(settings, 'BILLING_EMAIL_TASK_RATE_LIMIT', None)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def render_invoice_pdf_task(self, invoice_id, template_id=None):
+    """
+    توليد ملف PDF للفاتورة وتخزينه في ذاكرة ملفات PDF
+
+    Returns:
+        str: مسار الملف في التخزين
+    """
+    from .models import Invoice, InvoiceTemplate
+    from .pdf_cache import ensure_invoice_pdf
+
+    try:
+        invoice = Invoice.objects.select_related('client', 'project').get(pk=invoice_id)
+    except Invoice.DoesNotExist:
+        return None
+
+    template = None
+    if template_id:
+        template = InvoiceTemplate.objects.filter(pk=template_id).first()
+
+    try:
+        return ensure_invoice_pdf(invoice, template)
+    except OSError as exc:
+        raise self.retry(exc=exc)
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(smtplib.SMTPException, OSError),
+    retry_backoff=30,
+    retry_backoff_max=3600,
+    retry_jitter=True,
+    max_retries=5,
+    rate_limit=RATE_LIMIT,
+)
+def send_invoice_email_task(self, invoice_id, recipients, subject=None, message=None):
+    """إرسال فاتورة واحدة بالبريد الإلكتروني في الخلفية"""
+    from .models import Invoice
+    from .utils import send_invoice_email
+
+    try:
+        invoice = Invoice.objects.select_related('client', 'project').get(pk=invoice_id)
+    except Invoice.DoesNotExist:
+        return False
+    return send_invoice_email(invoice, recipients, subject, message)
+
+
+@shared_task(bind=True, max_retries=5)
+def send_invoice_batch_task(self, invoice_ids):
+    """
+    إرسال دفعة فواتير لعملائها عبر اتصال SMTP واحد
+
+    تُعاد محاولة الفواتير التي فشل إرسالها فقط، مع تأخير يتضاعف في كل
+    محاولة.
+
+    Returns:
+        dict: أعداد الرسائل المرسلة والفاشلة
+    """
+    from .mailing import send_invoice_batch
+    from .models import Invoice
+
+    invoices = Invoice.objects.filter(pk__in=invoice_ids).select_related('client', 'project')
+    try:
+        sent, failed = send_invoice_batch(invoices)
+    except (smtplib.SMTPException, OSError) as exc:
+        # تعذر فتح الاتصال: تُعاد محاولة الدفعة كاملة
+        raise self.retry(exc=exc, countdown=min(30 * 2 ** self.request.retries, 3600))
+
+    if failed and self.request.retries < self.max_retries:
+        countdown = min(30 * 2 ** self.request.retries, 3600)
+        raise self.retry(args=(failed,), countdown=countdown)
+    return {'sent': len(sent), 'failed': len(failed)}
+
+
+@shared_task
+def send_overdue_invoice_emails_task():
+    """جدولة إرسال جميع الفواتير المتأخرة (تُستدعى يدوياً، غير مجدولة)"""
+    from .mailing import queue_overdue_invoice_emails
+
+    return queue_overdue_invoice_emails()
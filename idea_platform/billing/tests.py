@@ -1,11 +1,36 @@
 
-from django.test import TestCase
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.files.storage import default_storage
 from decimal import Decimal
 from datetime import date, timedelta
+from unittest.mock import patch
+import io
+import os
+import smtplib
+import tempfile
+import threading
+import unittest
+import zipfile
+from rest_framework.test import APIRequestFactory, force_authenticate
 from idea_platform.crm.models import Client
 from idea_platform.projects.models import Project
-from .models import Invoice, InvoiceItem, Payment, InvoiceStatus
+from .models import Invoice, InvoiceItem, InvoiceTemplate, Payment, InvoiceStatus
+from .exports import InvoicePdfExport, filter_invoices
+from .mailing import overdue_invoices, send_invoice_batch
+from .numbering import InvoiceNumberCounter, reserve_invoice_numbers
+from .pdf_cache import ensure_invoice_pdf, invalidate_template_pdfs, invoice_pdf_path
+from .pdf_renderer import InvoiceRenderer
+from .serializers import InvoiceSerializer
+from .signals import invoice_totals_changed
+from .views import InvoiceBulkExportView
+from .utils import (
+    calculate_invoice_totals, generate_invoice_number, generate_invoice_pdf, get_invoice_context,
+    recompute_invoice_totals, render_invoice_pdf_buffer, send_invoice_email
+)
 
 User = get_user_model()
 
@@ -259,3 +284,593 @@ class BillingIntegrationTestCase(TestCase):
         self.assertTrue(self.invoice.is_fully_paid)
         self.assertIsNotNone(self.invoice.paid_date)
 
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), BILLING_PDF_X_ACCEL_REDIRECT_PREFIX='')
+class InvoicePdfCacheTestCase(TestCase):
+    """مجموعة اختبارات ذاكرة ملفات PDF للفواتير"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client_obj = Client.objects.create(name='PDF Client', email='pdf@example.com', created_by=self.user)
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-PDF-001',
+            client=self.client_obj,
+            created_by=self.user,
+            title='PDF Invoice',
+            issue_date=date.today(),
+            due_date=date.today() + timedelta(days=30),
+            tax_rate=Decimal('15.00')
+        )
+        InvoiceItem.objects.create(
+            invoice=self.invoice,
+            description='Service',
+            quantity=Decimal('1'),
+            unit_price=Decimal('100.00')
+        )
+        self.invoice.refresh_from_db()
+
+    @patch('idea_platform.billing.utils.render_invoice_pdf', return_value=b'%PDF-1.7 cached')
+    def test_repeat_downloads_served_from_storage(self, mock_render):
+        first = generate_invoice_pdf(self.invoice)
+        second = generate_invoice_pdf(self.invoice)
+
+        self.assertEqual(mock_render.call_count, 1)
+        self.assertEqual(b''.join(second.streaming_content), b'%PDF-1.7 cached')
+        self.assertEqual(first['Content-Type'], 'application/pdf')
+        self.assertIn(f'invoice_{self.invoice.invoice_number}.pdf', second['Content-Disposition'])
+
+    @patch('idea_platform.billing.utils.render_invoice_pdf', return_value=b'%PDF-1.7')
+    def test_edit_changes_fingerprint(self, mock_render):
+        path = ensure_invoice_pdf(self.invoice)
+        self.invoice.title = 'Edited Invoice'
+        self.invoice.save()
+
+        self.assertNotEqual(invoice_pdf_path(self.invoice), path)
+        ensure_invoice_pdf(self.invoice)
+        self.assertEqual(mock_render.call_count, 2)
+
+    @patch('idea_platform.billing.utils.render_invoice_pdf', return_value=b'%PDF-1.7')
+    def test_template_invalidation_is_scoped(self, mock_render):
+        template = InvoiceTemplate.objects.create(
+            name='Custom',
+            html_template='<h1>{{ invoice.invoice_number }}</h1>',
+            css_styles='h1 { color: red; }'
+        )
+        default_path = ensure_invoice_pdf(self.invoice)
+        custom_path = ensure_invoice_pdf(self.invoice, template)
+
+        self.assertEqual(invalidate_template_pdfs(template.pk), 1)
+        self.assertTrue(default_storage.exists(default_path))
+        self.assertFalse(default_storage.exists(custom_path))
+
+    @patch('idea_platform.billing.tasks.render_invoice_pdf_task.delay')
+    def test_changes_queue_background_render(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice.title = 'Edited Invoice'
+            self.invoice.save()
+        mock_delay.assert_called_with(str(self.invoice.pk), None)
+
+        mock_delay.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice.items.first().save()
+        mock_delay.assert_called_with(str(self.invoice.pk), None)
+
+    @patch('idea_platform.billing.tasks.render_invoice_pdf_task.delay')
+    def test_one_render_per_invoice_per_transaction(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = self.invoice.items.first()
+            item.unit_price = Decimal('150.00')
+            item.save()
+            calculate_invoice_totals(self.invoice)
+            Payment.objects.create(invoice=self.invoice, amount=Decimal('10.00'), created_by=self.user)
+            self.invoice.save()
+
+        mock_delay.assert_called_once_with(str(self.invoice.pk), None)
+
+    @patch('idea_platform.billing.utils.render_invoice_pdf', return_value=b'%PDF-1.7')
+    def test_edit_keeps_old_file_until_new_render(self, mock_render):
+        path = ensure_invoice_pdf(self.invoice)
+        with patch('idea_platform.billing.tasks.render_invoice_pdf_task.delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.invoice.title = 'Edited Invoice'
+                self.invoice.save()
+        self.assertTrue(default_storage.exists(path))
+
+        ensure_invoice_pdf(self.invoice)
+        self.assertFalse(default_storage.exists(path))
+
+    def test_context_time_is_stable(self):
+        first = get_invoice_context(self.invoice)['generated_at']
+        second = get_invoice_context(self.invoice)['generated_at']
+
+        self.assertEqual(first, second)
+
+
+class InvoiceRendererTestCase(TestCase):
+    """مجموعة اختبارات المولد الدائم لملفات PDF"""
+
+    def setUp(self):
+        self.renderer = InvoiceRenderer(max_templates=2)
+        self.template = InvoiceTemplate.objects.create(
+            name='Warm',
+            html_template='<p>{{ invoice.invoice_number }}</p>',
+            css_styles='p { color: blue; }'
+        )
+
+    def test_compiled_template_is_reused(self):
+        first = self.renderer.compile(self.template)
+        second = self.renderer.compile(self.template)
+
+        self.assertIs(first[0], second[0])
+        self.assertIs(first[1], second[1])
+
+    def test_template_edit_recompiles(self):
+        first = self.renderer.compile(self.template)
+        self.template.css_styles = 'p { color: red; }'
+        self.template.save()
+
+        self.assertIsNot(self.renderer.compile(self.template)[1], first[1])
+
+    def test_compiled_templates_are_bounded(self):
+        self.renderer.warm([self.template])
+        other = InvoiceTemplate.objects.create(name='Other', html_template='<p>x</p>')
+        self.renderer.compile(other)
+
+        self.assertEqual(len(self.renderer._compiled), 2)
+
+
+def _write_fake_pdf(invoice, template=None, context_data=None, target=None):
+    content = b'%PDF-1.7 ' + invoice.invoice_number.encode()
+    if target is None:
+        return content
+    target.write(content)
+    return None
+
+
+@patch('idea_platform.billing.pdf_renderer.InvoiceRenderer.render', side_effect=_write_fake_pdf)
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+)
+class InvoicePdfStreamingTestCase(TestCase):
+    """مجموعة اختبارات توليد ملفات PDF في الذاكرة وبثها"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client_obj = Client.objects.create(name='Stream Client', email='stream@example.com', created_by=self.user)
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-STREAM-001',
+            client=self.client_obj,
+            created_by=self.user,
+            title='Stream Invoice',
+            issue_date=date.today(),
+            due_date=date.today() + timedelta(days=30)
+        )
+
+    def test_context_data_response_is_streamed(self, mock_render):
+        response = generate_invoice_pdf(self.invoice, context_data={'note': 'x'})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7 INV-STREAM-001')
+        self.assertIsNotNone(mock_render.call_args.kwargs['target'])
+
+    def test_buffer_is_memoryview(self, mock_render):
+        buffer = render_invoice_pdf_buffer(self.invoice)
+
+        self.assertIsInstance(buffer, memoryview)
+        self.assertEqual(bytes(buffer), b'%PDF-1.7 INV-STREAM-001')
+
+    def test_email_reuses_given_bytes(self, mock_render):
+        send_invoice_email(
+            self.invoice, ['client@example.com'], message='body', pdf_content=b'%PDF-1.7 given'
+        )
+
+        mock_render.assert_not_called()
+        self.assertEqual(mail.outbox[0].attachments[0][1], b'%PDF-1.7 given')
+
+    def test_email_renders_once_without_storage_read(self, mock_render):
+        with patch('idea_platform.billing.pdf_cache.default_storage.open') as mock_open:
+            send_invoice_email(self.invoice, ['client@example.com'], message='body')
+
+        mock_open.assert_not_called()
+        self.assertEqual(mock_render.call_count, 1)
+        self.assertEqual(mail.outbox[0].attachments[0][1], b'%PDF-1.7 INV-STREAM-001')
+
+
+class FakeRendererPool:
+    """مجموعة توليد داخل العملية نفسها للاختبارات"""
+
+    def __init__(self):
+        self.rendered = []
+
+    def imap(self, invoice_ids, template_id=None, window=None):
+        for invoice_id in invoice_ids:
+            self.rendered.append(invoice_id)
+            yield invoice_id, b'%PDF-1.7 ' + invoice_id.encode()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class InvoicePdfExportTestCase(TestCase):
+    """مجموعة اختبارات تصدير ملفات PDF كملف ZIP"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client_obj = Client.objects.create(name='Export Client', email='export@example.com', created_by=self.user)
+        self.invoices = [
+            Invoice.objects.create(
+                invoice_number=f'INV-EXP-{index:03d}',
+                client=self.client_obj,
+                created_by=self.user,
+                title='Export Invoice',
+                issue_date=date.today() - timedelta(days=index),
+                due_date=date.today() + timedelta(days=30),
+                status=InvoiceStatus.SENT if index % 2 else InvoiceStatus.DRAFT
+            )
+            for index in range(4)
+        ]
+
+    def test_zip_contains_filtered_invoices(self):
+        progress = []
+        pool = FakeRendererPool()
+        export = InvoicePdfExport(
+            filter_invoices(Invoice.objects.all(), status=InvoiceStatus.SENT),
+            progress=lambda done, total: progress.append((done, total)),
+            pool=pool
+        )
+        chunks = list(export.stream())
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(
+            sorted(archive.namelist()),
+            ['invoice_INV-EXP-001.pdf', 'invoice_INV-EXP-003.pdf']
+        )
+        self.assertEqual(progress[-1], (2, 2))
+        self.assertEqual(len(pool.rendered), 2)
+
+    def test_rendered_pdfs_are_cached_for_next_export(self):
+        queryset = filter_invoices(Invoice.objects.all(), date_from=date.today() - timedelta(days=1))
+        list(InvoicePdfExport(queryset, pool=FakeRendererPool()).stream())
+
+        pool = FakeRendererPool()
+        chunks = list(InvoicePdfExport(queryset, pool=pool).stream())
+
+        self.assertEqual(pool.rendered, [])
+        self.assertEqual(len(zipfile.ZipFile(io.BytesIO(b''.join(chunks))).namelist()), 2)
+
+    def test_export_requires_invoice_permission(self):
+        factory = APIRequestFactory()
+        view = InvoiceBulkExportView.as_view()
+
+        request = factory.get('/billing/invoices/export/')
+        force_authenticate(request, user=self.user)
+        self.assertEqual(view(request).status_code, 403)
+
+        staff = User.objects.create_user(username='exportstaff', password='password', is_staff=True)
+        request = factory.get('/billing/invoices/export/')
+        force_authenticate(request, user=staff)
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Export-Id', response)
+
+
+class InvoiceNumberingTestCase(TestCase):
+    """مجموعة اختبارات خدمة ترقيم الفواتير"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client_obj = Client.objects.create(name='Numbering Client', email='numbers@example.com', created_by=self.user)
+
+    def test_batch_reservation_is_contiguous(self):
+        numbers = reserve_invoice_numbers(3, date(2025, 1, 15))
+        self.assertEqual(numbers, ['INV-2025-01-0001', 'INV-2025-01-0002', 'INV-2025-01-0003'])
+        self.assertEqual(reserve_invoice_numbers(1, date(2025, 1, 20)), ['INV-2025-01-0004'])
+        self.assertEqual(reserve_invoice_numbers(1, date(2025, 2, 1)), ['INV-2025-02-0001'])
+
+    def test_counter_continues_after_existing_invoices(self):
+        Invoice.objects.create(
+            invoice_number='INV-2025-03-0041',
+            client=self.client_obj,
+            created_by=self.user,
+            title='Legacy Invoice',
+            issue_date=date(2025, 3, 1),
+            due_date=date(2025, 3, 31)
+        )
+        self.assertEqual(reserve_invoice_numbers(1, date(2025, 3, 2)), ['INV-2025-03-0042'])
+
+    def test_rolled_back_reservation_leaves_no_gap(self):
+        try:
+            with transaction.atomic():
+                reserve_invoice_numbers(5, date(2025, 4, 1))
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(reserve_invoice_numbers(1, date(2025, 4, 1)), ['INV-2025-04-0001'])
+
+
+@unittest.skipUnless(connection.features.has_select_for_update, 'يتطلب SELECT ... FOR UPDATE')
+@override_settings(BILLING_PDF_PRERENDER=False)
+class InvoiceNumberingConcurrencyTestCase(TransactionTestCase):
+    """اختبار إنشاء الفواتير من عدة threads في الوقت نفسه"""
+
+    threads = 8
+    invoices_per_thread = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client_obj = Client.objects.create(name='Concurrent Client', email='concurrent@example.com', created_by=self.user)
+
+    def create_invoices(self, barrier, errors):
+        try:
+            barrier.wait()
+            for _ in range(self.invoices_per_thread):
+                with transaction.atomic():
+                    Invoice.objects.create(
+                        invoice_number=generate_invoice_number(),
+                        client=self.client_obj,
+                        created_by=self.user,
+                        title='Concurrent Invoice',
+                        issue_date=date.today(),
+                        due_date=date.today() + timedelta(days=30)
+                    )
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    def test_concurrent_numbers_are_unique_and_gap_free(self):
+        barrier = threading.Barrier(self.threads)
+        errors = []
+        workers = [
+            threading.Thread(target=self.create_invoices, args=(barrier, errors))
+            for _ in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        total = self.threads * self.invoices_per_thread
+        numbers = sorted(
+            int(number.rsplit('-', 1)[-1])
+            for number in Invoice.objects.values_list('invoice_number', flat=True)
+        )
+        self.assertEqual(numbers, list(range(1, total + 1)))
+        self.assertEqual(InvoiceNumberCounter.objects.get().last_number, total)
+
+
+class InvoiceSerializerItemsTestCase(TestCase):
+    """مجموعة اختبارات كتابة بنود الفاتورة دفعة واحدة"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client_obj = Client.objects.create(name='Bulk Client', email='bulk@example.com', created_by=self.user)
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-BULK-001',
+            client=self.client_obj,
+            created_by=self.user,
+            title='Bulk Invoice',
+            issue_date=date.today(),
+            due_date=date.today() + timedelta(days=30),
+            tax_rate=Decimal('10.00')
+        )
+
+    def item_data(self, count, price='10.00'):
+        return [
+            {'description': f'Item {index}', 'quantity': '1', 'unit_price': price}
+            for index in range(count)
+        ]
+
+    def save(self, items, instance=None):
+        serializer = InvoiceSerializer(instance or self.invoice, data={'items': items}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_update_diffs_items_by_id(self):
+        self.save(self.item_data(3))
+        kept, changed, removed = self.invoice.items.order_by('description')
+
+        self.save([
+            {'id': str(kept.pk), 'description': kept.description, 'quantity': '1', 'unit_price': '10.00'},
+            {'id': str(changed.pk), 'description': 'Changed', 'quantity': '2', 'unit_price': '10.00'},
+            {'description': 'New', 'quantity': '1', 'unit_price': '5.00'},
+        ])
+
+        self.invoice.refresh_from_db()
+        self.assertTrue(InvoiceItem.objects.filter(pk=kept.pk).exists())
+        self.assertEqual(InvoiceItem.objects.get(pk=changed.pk).description, 'Changed')
+        self.assertFalse(InvoiceItem.objects.filter(pk=removed.pk).exists())
+        self.assertEqual(self.invoice.items.count(), 3)
+        self.assertEqual(self.invoice.subtotal, Decimal('35.00'))
+        self.assertEqual(self.invoice.total_amount, Decimal('38.50'))
+
+    def test_foreign_item_id_is_rejected(self):
+        other = Invoice.objects.create(
+            invoice_number='INV-BULK-002',
+            client=self.client_obj,
+            created_by=self.user,
+            title='Other Invoice',
+            issue_date=date.today(),
+            due_date=date.today() + timedelta(days=30)
+        )
+        self.save(self.item_data(1), instance=other)
+        foreign = other.items.get()
+
+        serializer = InvoiceSerializer(self.invoice, data={'items': [
+            {'id': str(foreign.pk), 'description': 'x', 'quantity': '1', 'unit_price': '1.00'}
+        ]}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('items', serializer.errors)
+
+    def test_partial_update_without_items_keeps_them(self):
+        self.save(self.item_data(2))
+        serializer = InvoiceSerializer(self.invoice, data={'title': 'Renamed'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.assertEqual(self.invoice.items.count(), 2)
+
+    def test_query_count_does_not_grow_with_items(self):
+        counts = []
+        for size in (5, 50):
+            self.save([])
+            with CaptureQueriesContext(connection) as context:
+                self.save(self.item_data(size))
+            counts.append(len(context.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+
+class InvoiceTotalsTestCase(TestCase):
+    """مجموعة اختبارات حساب مجاميع الفواتير في قاعدة البيانات"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client_obj = Client.objects.create(name='Totals Client', email='totals@example.com', created_by=self.user)
+
+    def create_invoice(self, number, items):
+        invoice = Invoice.objects.create(
+            invoice_number=number,
+            client=self.client_obj,
+            created_by=self.user,
+            title='Totals Invoice',
+            issue_date=date.today(),
+            due_date=date.today() + timedelta(days=30),
+            tax_rate=Decimal('10.00')
+        )
+        for quantity, unit_price in items:
+            InvoiceItem.objects.create(
+                invoice=invoice,
+                description='Item',
+                quantity=Decimal(quantity),
+                unit_price=Decimal(unit_price)
+            )
+        return invoice
+
+    def test_calculate_totals_in_single_update(self):
+        invoice = self.create_invoice('INV-TOT-001', [('2', '25.00'), ('1', '50.00')])
+        Payment.objects.create(invoice=invoice, amount=Decimal('30.00'), created_by=self.user)
+
+        with CaptureQueriesContext(connection) as context:
+            totals = calculate_invoice_totals(invoice)
+
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(totals['subtotal'], Decimal('100.00'))
+        self.assertEqual(totals['tax_amount'], Decimal('10.00'))
+        self.assertEqual(totals['total_amount'], Decimal('110.00'))
+        self.assertEqual(totals['remaining_amount'], Decimal('80.00'))
+
+    def test_recompute_matching_invoices_in_batches(self):
+        invoices = [
+            self.create_invoice(f'INV-TOT-1{index:02d}', [('1', '10.00')])
+            for index in range(5)
+        ]
+        # تعديل مباشر يتجاوز حساب المجاميع
+        InvoiceItem.objects.filter(invoice__in=invoices).update(unit_price=Decimal('20.00'))
+
+        with CaptureQueriesContext(connection) as context:
+            updated = recompute_invoice_totals(Invoice.objects.filter(pk__in=[i.pk for i in invoices]), batch_size=2)
+
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(updated, 5)
+        self.assertEqual(len(updates), 3)
+        for invoice in invoices:
+            invoice.refresh_from_db()
+            self.assertEqual(invoice.subtotal, Decimal('20.00'))
+            self.assertEqual(invoice.total_amount, Decimal('22.00'))
+
+    @patch('idea_platform.billing.tasks.render_invoice_pdf_task.delay')
+    def test_recompute_skips_unchanged_invoices(self, mock_delay):
+        invoices = [
+            self.create_invoice(f'INV-TOT-2{index:02d}', [('1', '10.00')])
+            for index in range(3)
+        ]
+        queryset = Invoice.objects.filter(pk__in=[i.pk for i in invoices])
+        recompute_invoice_totals(queryset)
+        InvoiceItem.objects.filter(invoice=invoices[0]).update(unit_price=Decimal('20.00'))
+
+        received = []
+        def receiver(sender, invoice_ids, **kwargs):
+            received.append(list(invoice_ids))
+        invoice_totals_changed.connect(receiver)
+        self.addCleanup(invoice_totals_changed.disconnect, receiver)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(recompute_invoice_totals(queryset), 1)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(recompute_invoice_totals(queryset), 0)
+
+        self.assertEqual(received, [[invoices[0].pk]])
+        self.assertFalse([q for q in context.captured_queries if q['sql'].startswith('UPDATE')])
+        mock_delay.assert_not_called()
+
+
+@patch('idea_platform.billing.pdf_renderer.InvoiceRenderer.render', side_effect=_write_fake_pdf)
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    BILLING_EMAIL_RATE_LIMIT=0
+)
+class InvoiceEmailBatchTestCase(TestCase):
+    """مجموعة اختبارات إرسال الفواتير على دفعات"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client_obj = Client.objects.create(name='Mail Client', email='mail@example.com', created_by=self.user)
+        self.invoices = [
+            Invoice.objects.create(
+                invoice_number=f'INV-MAIL-{index:03d}',
+                client=self.client_obj,
+                created_by=self.user,
+                title='Mail Invoice',
+                issue_date=date.today() - timedelta(days=40),
+                due_date=date.today() - timedelta(days=10 - index) if index < 2 else date.today() + timedelta(days=10),
+                status=InvoiceStatus.SENT
+            )
+            for index in range(3)
+        ]
+
+    def test_overdue_invoices(self, mock_render):
+        self.assertEqual(
+            sorted(invoice.invoice_number for invoice in overdue_invoices()),
+            ['INV-MAIL-000', 'INV-MAIL-001']
+        )
+
+    def test_batch_reuses_one_connection(self, mock_render):
+        with patch('idea_platform.billing.mailing.get_connection', wraps=mail.get_connection) as mock_connection:
+            sent, failed = send_invoice_batch(overdue_invoices())
+
+        self.assertEqual(mock_connection.call_count, 1)
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(failed, [])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['mail@example.com'])
+
+    def test_failed_messages_are_reported(self, mock_render):
+        connection = mail.get_connection()
+        with patch.object(connection, 'send_messages', side_effect=[smtplib.SMTPServerDisconnected(), 1]):
+            sent, failed = send_invoice_batch(overdue_invoices(), connection=connection)
+
+        self.assertEqual(failed, [str(self.invoices[0].pk)])
+        self.assertEqual(sent, [str(self.invoices[1].pk)])
+
+    @unittest.skipUnless(os.environ.get('BILLING_TEST_SMTP_PORT'), 'يتطلب خادم SMTP محلي للتصحيح')
+    def test_debugging_smtp_server(self, mock_render):
+        """
+        يُشغل مع خادم تصحيح محلي، مثلاً:
+        python -m aiosmtpd -n -l localhost:1025 & BILLING_TEST_SMTP_PORT=1025 ./manage.py test
+        """
+        with self.settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='localhost',
+            EMAIL_PORT=int(os.environ['BILLING_TEST_SMTP_PORT']),
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD=''
+        ):
+            sent, failed = send_invoice_batch(overdue_invoices())
+
+        self.assertEqual((len(sent), failed), (2, []))
@@ -0,0 +1,75 @@
+"""
+واجهات تصدير ملفات PDF للفواتير
+"""
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import permissions, status
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .exports import InvoicePdfExport, filter_invoices, get_export_progress
+from .models import Invoice
+from .serializers import InvoiceExportFilterSerializer
+
+
+def can_view_all_invoices(user):
+    """الموظفون وأصحاب صلاحية عرض الفواتير (مباشرة أو عبر الدور)"""
+    if user.is_staff or user.has_perm('billing.view_invoice'):
+        return True
+    return hasattr(user, 'has_role_permission') and user.has_role_permission('billing.view_invoice')
+
+
+class CanExportInvoices(BasePermission):
+    """
+    صلاحية تصدير الفواتير: لجميع الفواتير لمن يملك صلاحية عرضها، ولفواتير
+    العميل نفسه فقط لحسابات بوابة العملاء
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return can_view_all_invoices(user) or hasattr(user, 'client_profile')
+
+
+class InvoiceBulkExportView(APIView):
+    """
+    تصدير ملفات PDF لمجموعة فواتير كملف ZIP يُبث أثناء التوليد
+
+    المعايير (اختيارية): client, status, date_from, date_to, template.
+    يُعاد معرف التصدير في الترويسة X-Export-Id لمتابعة التقدم عبر
+    InvoiceExportProgressView.
+    """
+    permission_classes = [CanExportInvoices]
+
+    def get_queryset(self):
+        queryset = Invoice.objects.all()
+        if can_view_all_invoices(self.request.user):
+            return queryset
+        return queryset.filter(client__user=self.request.user)
+
+    def get(self, request):
+        serializer = InvoiceExportFilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = dict(serializer.validated_data)
+        template = filters.pop('template', None)
+
+        export = InvoicePdfExport(filter_invoices(self.get_queryset(), **filters), template=template)
+        response = StreamingHttpResponse(export.stream(), content_type='application/zip')
+        filename = f"invoices_{timezone.now():%Y%m%d_%H%M%S}.zip"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Export-Id'] = export.export_id
+        response['Access-Control-Expose-Headers'] = 'X-Export-Id'
+        return response
+
+
+class InvoiceExportProgressView(APIView):
+    """حالة تقدم تصدير ملفات PDF"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, export_id):
+        progress = get_export_progress(export_id)
+        if progress is None:
+            return Response({'error': 'التصدير غير موجود'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(progress)
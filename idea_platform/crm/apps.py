@@ -0,0 +1,16 @@
+"""
+إعدادات تطبيق إدارة العملاء
+"""
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+
+class CrmConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'idea_platform.crm'
+    label = 'crm'
+    verbose_name = _('إدارة العملاء')
+
+    def ready(self):
+        """تسجيل نموذج ملخصات العملاء وإشاراته عند تحميل التطبيق"""
+        from . import rollups, signals  # noqa: F401
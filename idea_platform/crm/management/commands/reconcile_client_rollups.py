@@ -0,0 +1,33 @@
+"""
+أمر إعادة بناء ملخصات العملاء والتقرير عن الفروقات
+"""
+from django.core.management.base import BaseCommand
+
+from ...rollups import reconcile_client_rollups
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء ملخصات العملاء المالية على دفعات مع تقرير عن الفروقات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='عدد العملاء في كل دفعة')
+        parser.add_argument('--dry-run', action='store_true', help='التقرير فقط دون حفظ')
+        parser.add_argument('--show', type=int, default=20, help='عدد المعرفات المعروضة لكل نوع فرق')
+
+    def handle(self, *args, **options):
+        report = reconcile_client_rollups(
+            batch_size=options['batch_size'], dry_run=options['dry_run']
+        )
+
+        self.stdout.write(f"checked: {report['checked']}")
+        for kind in ('missing', 'drifted'):
+            ids = report[kind]
+            self.stdout.write(f'{kind}: {len(ids)}')
+            for client_id in ids[:options['show']]:
+                self.stdout.write(f'  {client_id}')
+
+        if report['missing'] or report['drifted']:
+            message = 'drift found' if options['dry_run'] else 'drift fixed'
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('no drift'))
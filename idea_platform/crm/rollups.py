@@ -0,0 +1,196 @@
+"""
+ملخصات العملاء المالية (Rollups)
+
+يُحتفظ لكل عميل بسجل ClientRollup يجمع إجمالي الفواتير والمدفوع
+والمتبقي وعدد المشاريع حسب الحالة وآخر نشاط، فتُعرض قوائم العملاء بهذه
+الأرقام دون استعلام تجميعي لكل عميل.
+
+يُحدث سجل العميل بعد تأكيد أي تعديل على فواتيره أو مدفوعاته أو مشاريعه
+(انظر signals.py)، ويعيد أمر reconcile_client_rollups بناء الجدول
+كاملاً على دفعات مع تقرير عن الفروقات.
+"""
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Count, Max, Sum
+from django.utils.translation import gettext_lazy as _
+
+from .models import Client
+
+ROLLUP_FIELDS = (
+    'invoiced_amount',
+    'paid_amount',
+    'outstanding_amount',
+    'projects_total',
+    'projects_by_status',
+    'last_activity_at',
+)
+
+
+class ClientRollup(models.Model):
+    """الملخص المالي ونشاط العميل"""
+    client = models.OneToOneField(
+        Client,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rollup',
+        verbose_name=_('العميل')
+    )
+    invoiced_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal('0.00'),
+        verbose_name=_('إجمالي الفواتير')
+    )
+    paid_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal('0.00'),
+        verbose_name=_('إجمالي المدفوع')
+    )
+    outstanding_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal('0.00'),
+        verbose_name=_('إجمالي المتبقي')
+    )
+    projects_total = models.PositiveIntegerField(default=0, verbose_name=_('عدد المشاريع'))
+    projects_by_status = models.JSONField(default=dict, verbose_name=_('المشاريع حسب الحالة'))
+    last_activity_at = models.DateTimeField(null=True, blank=True, verbose_name=_('آخر نشاط'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('تاريخ التحديث'))
+
+    class Meta:
+        app_label = 'crm'
+        verbose_name = _('ملخص عميل')
+        verbose_name_plural = _('ملخصات العملاء')
+
+    def __str__(self):
+        return f"{self.client_id}: {self.invoiced_amount}"
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def compute_client_rollups(client_ids):
+    """
+    حساب الملخصات من الجداول الأصلية لمجموعة عملاء (عدد ثابت من الاستعلامات)
+
+    Returns:
+        dict: {معرف العميل: {الحقل: القيمة}}
+    """
+    from idea_platform.billing.models import Invoice, Payment
+    from idea_platform.projects.models import Project
+
+    client_ids = list(client_ids)
+    rollups = {
+        client_id: {
+            'invoiced_amount': Decimal('0.00'),
+            'paid_amount': Decimal('0.00'),
+            'outstanding_amount': Decimal('0.00'),
+            'projects_total': 0,
+            'projects_by_status': {},
+            'last_activity_at': None,
+        }
+        for client_id in client_ids
+    }
+
+    invoices = Invoice.objects.filter(client__in=client_ids).order_by().values('client').annotate(
+        invoiced=Sum('total_amount'),
+        paid=Sum('paid_amount'),
+        last_activity=Max('created_at'),
+    )
+    for row in invoices:
+        rollup = rollups[row['client']]
+        rollup['invoiced_amount'] = row['invoiced'] or Decimal('0.00')
+        rollup['paid_amount'] = row['paid'] or Decimal('0.00')
+        rollup['outstanding_amount'] = rollup['invoiced_amount'] - rollup['paid_amount']
+        rollup['last_activity_at'] = row['last_activity']
+
+    payments = Payment.objects.filter(invoice__client__in=client_ids).order_by().values(
+        'invoice__client'
+    ).annotate(last_activity=Max('created_at'))
+    for row in payments:
+        rollup = rollups[row['invoice__client']]
+        rollup['last_activity_at'] = _latest(rollup['last_activity_at'], row['last_activity'])
+
+    projects = Project.objects.filter(client__in=client_ids).order_by().values(
+        'client', 'status'
+    ).annotate(count=Count('pk'), last_activity=Max('created_at'))
+    for row in projects:
+        rollup = rollups[row['client']]
+        rollup['projects_by_status'][row['status']] = row['count']
+        rollup['projects_total'] += row['count']
+        rollup['last_activity_at'] = _latest(rollup['last_activity_at'], row['last_activity'])
+
+    return rollups
+
+
+def refresh_client_rollups(client_ids):
+    """إعادة حساب ملخصات عملاء محددين وحفظها (upsert واحد)"""
+    rollups = compute_client_rollups(
+        Client.objects.filter(pk__in=list(client_ids)).values_list('pk', flat=True)
+    )
+    if not rollups:
+        return 0
+    ClientRollup.objects.bulk_create(
+        [ClientRollup(client_id=client_id, **values) for client_id, values in rollups.items()],
+        update_conflicts=True,
+        unique_fields=['client'],
+        update_fields=list(ROLLUP_FIELDS) + ['updated_at'],
+    )
+    return len(rollups)
+
+
+def _rollup_differs(stored, values):
+    return any(getattr(stored, field) != values[field] for field in ROLLUP_FIELDS)
+
+
+def reconcile_client_rollups(batch_size=500, dry_run=False):
+    """
+    إعادة بناء جميع الملخصات على دفعات ومقارنتها بالمخزن
+
+    Returns:
+        dict: {'checked': عدد العملاء، 'missing': [معرفات]، 'drifted': [معرفات]}
+    """
+    report = {'checked': 0, 'missing': [], 'drifted': []}
+    client_ids = Client.objects.order_by('pk').values_list('pk', flat=True)
+
+    batch = []
+    for client_id in client_ids.iterator(chunk_size=batch_size):
+        batch.append(client_id)
+        if len(batch) >= batch_size:
+            _reconcile_batch(batch, report, dry_run)
+            batch = []
+    if batch:
+        _reconcile_batch(batch, report, dry_run)
+
+    return report
+
+
+def _reconcile_batch(client_ids, report, dry_run):
+    fresh = compute_client_rollups(client_ids)
+    stored = ClientRollup.objects.in_bulk(client_ids)
+
+    changed = []
+    for client_id, values in fresh.items():
+        rollup = stored.get(client_id)
+        if rollup is None:
+            report['missing'].append(str(client_id))
+            changed.append(ClientRollup(client_id=client_id, **values))
+        elif _rollup_differs(rollup, values):
+            report['drifted'].append(str(client_id))
+            for field, value in values.items():
+                setattr(rollup, field, value)
+            changed.append(rollup)
+    report['checked'] += len(client_ids)
+
+    if changed and not dry_run:
+        with transaction.atomic():
+            ClientRollup.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=['client'],
+                update_fields=list(ROLLUP_FIELDS) + ['updated_at'],
+            )
+
+
+def schedule_client_rollup(client_id):
+    """تحديث ملخص العميل بعد تأكيد المعاملة الحالية"""
+    if client_id is not None:
+        transaction.on_commit(lambda: refresh_client_rollups([client_id]))
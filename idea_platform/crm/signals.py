@@ -0,0 +1,36 @@
+"""
+إشارات تحديث ملخصات العملاء
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from idea_platform.billing.models import Invoice, Payment
+from idea_platform.billing.signals import invoice_totals_changed
+from idea_platform.projects.models import Project
+
+from .rollups import refresh_client_rollups, schedule_client_rollup
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=Project)
+def client_activity_changed(sender, instance, **kwargs):
+    """تحديث ملخص العميل عند تعديل فواتيره أو مشاريعه"""
+    schedule_client_rollup(instance.client_id)
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def client_payment_changed(sender, instance, **kwargs):
+    """تحديث ملخص العميل عند تعديل مدفوعات فواتيره"""
+    client_id = Invoice.objects.filter(pk=instance.invoice_id).values_list('client', flat=True).first()
+    schedule_client_rollup(client_id)
+
+
+@receiver(invoice_totals_changed)
+def client_invoice_totals_changed(sender, invoice_ids, **kwargs):
+    """تحديث ملخصات العملاء بعد إعادة حساب مجاميع فواتيرهم"""
+    client_ids = set(
+        Invoice.objects.filter(pk__in=list(invoice_ids)).values_list('client', flat=True)
+    )
+    if client_ids:
+        transaction.on_commit(lambda: refresh_client_rollups(client_ids))
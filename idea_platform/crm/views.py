@@ -1,15 +1,50 @@
-from rest_framework import generics
+from rest_framework import generics, serializers
 from rest_framework.permissions import IsAuthenticated, DjangoModelPermissions
 from idea_platform.crm.models import Client
 from idea_platform.crm.serializers import ClientSerializer
 
+# حقول Client التجميعية وما يقابلها في ClientRollup
+ROLLUP_FIELDS = {
+    'total_invoiced_amount': serializers.DecimalField(max_digits=14, decimal_places=2, source='invoiced_amount'),
+    'total_projects': serializers.IntegerField(source='projects_total'),
+}
+
+
+class ClientRollupSerializer(ClientSerializer):
+    """
+    ClientSerializer مع قراءة الإجماليات من ClientRollup
+
+    خصائص Client.total_invoiced_amount و total_projects تنفذ استعلاماً
+    تجميعياً لكل عميل، لذا تُستبدل بقيم الملخص المحمل مع العميل
+    (select_related('rollup')). العميل الذي لم يُنشأ ملخصه بعد يُحسب كالسابق.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        self._rollup_fields = [name for name in ROLLUP_FIELDS if fields.pop(name, None) is not None]
+        return fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # RelatedObjectDoesNotExist مشتقة من AttributeError
+        rollup = getattr(instance, 'rollup', None)
+        for name in self._rollup_fields:
+            field = ROLLUP_FIELDS[name]
+            if rollup is not None:
+                data[name] = field.to_representation(getattr(rollup, field.source))
+            else:
+                data[name] = field.to_representation(getattr(instance, name))
+        return data
+
+
 class ClientListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Client.objects.all()
-    serializer_class = ClientSerializer
+    # الملخص المالي من جدول ClientRollup بدل تجميع لكل عميل
+    queryset = Client.objects.select_related('rollup')
+    serializer_class = ClientRollupSerializer
     permission_classes = [IsAuthenticated, DjangoModelPermissions]
+    cursor_ordering = '-created_at'
 
 class ClientRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Client.objects.all()
-    serializer_class = ClientSerializer
+    queryset = Client.objects.select_related('rollup')
+    serializer_class = ClientRollupSerializer
     permission_classes = [IsAuthenticated, DjangoModelPermissions]
-
@@ -0,0 +1,16 @@
+"""
+إعدادات تطبيق التقارير
+"""
+from django.apps import AppConfig
+from django.utils.translation import gettext_lazy as _
+
+
+class ReportsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'idea_platform.reports'
+    label = 'reports'
+    verbose_name = _('التقارير')
+
+    def ready(self):
+        """تسجيل نماذج مخزن المؤشرات وتشغيلات التقارير والإشارات عند تحميل التطبيق"""
+        from . import metrics, scheduler, signals  # noqa: F401
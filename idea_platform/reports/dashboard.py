@@ -0,0 +1,68 @@
+"""
+واجهة لوحة التحليلات المبنية على المؤشرات المحسوبة مسبقاً
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .ga_cache import get_analytics_cache, parse_daily_rows
+from .metrics import dashboard_metrics
+from .result_cache import result_cache_stats
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsDashboardView(APIView):
+    """
+    لوحة التحليلات: overview و monthly_performance و daily_performance
+
+    تُقرأ الأرقام من AnalyticsBucket (تحدثها refresh_analytics_task)، لذا
+    لا يتجاوز الطلب استعلامين على جدول صغير مفهرس. بيانات Google Analytics
+    (google_analytics) تُقرأ من ذاكرة ga_cache ولا يُنتظر الـ API إلا عند
+    أول طلب لنطاق التاريخ.
+
+    المعاملات (اختيارية): months (الافتراضي 12، حتى 36)، days (الافتراضي 30، حتى 90)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        months = self._bounded(request.query_params.get('months'), 12, 36)
+        days = self._bounded(request.query_params.get('days'), 30, 90)
+        data = dashboard_metrics(months=months, days=days)
+        data['google_analytics'] = self.google_analytics(days)
+        return Response(data)
+
+    def google_analytics(self, days):
+        """بيانات Google Analytics اليومية (فارغة إذا لم تُضبط أو تعذر جلبها)"""
+        view_id = getattr(settings, 'GA_VIEW_ID', '')
+        if not view_id:
+            return {}
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=days - 1)
+        try:
+            response = get_analytics_cache().get(view_id, start_date, end_date)
+        except Exception:
+            logger.warning('Google Analytics data unavailable', exc_info=True)
+            return {}
+        return parse_daily_rows(response)
+
+    @staticmethod
+    def _bounded(value, default, maximum):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return default
+        return min(max(value, 1), maximum)
+
+
+class ReportResultCacheStatsView(APIView):
+    """عدادات ذاكرة نتائج التقارير (hits و misses و hit_ratio) للمشرفين"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(result_cache_stats())
@@ -0,0 +1,191 @@
+"""
+ذاكرة مؤقتة لردود Google Analytics
+
+تُخزن الردود بمفتاح يجمع (معرف العرض، نطاق التاريخ، المقاييس، الأبعاد):
+
+- خلال GA_CACHE_TTL يُعاد الرد المخزن مباشرة.
+- بعدها وحتى GA_CACHE_STALE_TTL يُعاد الرد القديم فوراً ويُحدث في الخلفية
+  (stale-while-revalidate)، وإذا فشل التحديث يبقى الرد القديم.
+- الطلبات المتزامنة للمفتاح نفسه تنتظر جلباً واحداً (request coalescing):
+  داخل العملية عبر Future مشترك، وبين العمليات عبر قفل في الذاكرة المؤقتة.
+
+تُستخدم الذاكرة المشتركة (GA_CACHE_ALIAS، وافتراضياً SHARED_CACHE_ALIAS).
+بدون Redis تُستخدم ذاكرة العملية المحلية، فتكون الردود والقفل خاصة بكل
+عملية وتجلب كل عملية البيانات من Google Analytics بنفسها.
+
+مصدر البيانات قابل للاستبدال عبر GA_ANALYTICS_BACKEND (انظر testing.py
+للمصدر الوهمي المستخدم في الاختبارات).
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS = ('ga:users', 'ga:sessions', 'ga:pageviews')
+DEFAULT_DIMENSIONS = ('ga:date',)
+
+
+class ReportingApiBackend:
+    """جلب البيانات من Google Analytics Reporting API v4"""
+
+    def fetch(self, view_id, start_date, end_date, metrics, dimensions):
+        from .views import initialize_analytics_reporting
+
+        analytics = initialize_analytics_reporting()
+        return analytics.reports().batchGet(body={
+            'reportRequests': [{
+                'viewId': view_id,
+                'dateRanges': [{'startDate': str(start_date), 'endDate': str(end_date)}],
+                'metrics': [{'expression': metric} for metric in metrics],
+                'dimensions': [{'name': dimension} for dimension in dimensions],
+            }]
+        }).execute()
+
+
+class AnalyticsCache:
+    """
+    ذاكرة ردود Google Analytics مع التحديث في الخلفية ودمج الطلبات المتزامنة
+    """
+
+    def __init__(self, backend=None, cache_alias=None, ttl=None, stale_ttl=None, lock_timeout=30):
+        self.backend = backend or import_string(
+            getattr(settings, 'GA_ANALYTICS_BACKEND', 'idea_platform.reports.ga_cache.ReportingApiBackend')
+        )()
+        self.cache = caches[
+            cache_alias
+            or getattr(settings, 'GA_CACHE_ALIAS', None)
+            or getattr(settings, 'SHARED_CACHE_ALIAS', None)
+            or 'default'
+        ]
+        self.ttl = ttl if ttl is not None else getattr(settings, 'GA_CACHE_TTL', 900)
+        self.stale_ttl = stale_ttl if stale_ttl is not None else getattr(settings, 'GA_CACHE_STALE_TTL', 86400)
+        self.lock_timeout = lock_timeout
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ga-refresh')
+
+    def make_key(self, view_id, start_date, end_date, metrics, dimensions):
+        payload = json.dumps(
+            [str(view_id), str(start_date), str(end_date), sorted(metrics), list(dimensions)]
+        )
+        return 'ga:response:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, view_id, start_date, end_date, metrics=DEFAULT_METRICS, dimensions=DEFAULT_DIMENSIONS):
+        """
+        رد Google Analytics من الذاكرة أو من المصدر
+
+        Returns:
+            dict: الرد كما يعيده المصدر
+        """
+        args = (view_id, start_date, end_date, tuple(metrics), tuple(dimensions))
+        key = self.make_key(*args)
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            if time.time() - entry['fetched_at'] >= self.ttl:
+                # رد قديم: يُعاد فوراً ويُحدث في الخلفية
+                self._refresh(key, args, background=True)
+            return entry['data']
+
+        return self._refresh(key, args).result()
+
+    def _refresh(self, key, args, background=False):
+        """بدء جلب واحد للمفتاح (أو الانضمام لجلب جارٍ)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._inflight[key] = Future()
+
+        if background:
+            self._executor.submit(self._run, key, args, future)
+        else:
+            self._run(key, args, future)
+        return future
+
+    def _run(self, key, args, future):
+        try:
+            future.set_result(self._fetch(key, args))
+        except Exception as exc:
+            logger.warning('Google Analytics fetch failed for %s', key, exc_info=True)
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _fetch(self, key, args):
+        """جلب من المصدر مع قفل بين العمليات"""
+        lock_key = f'{key}:lock'
+        acquired = self.cache.add(lock_key, 1, self.lock_timeout)
+        if not acquired:
+            # عملية أخرى تجلب المفتاح نفسه: ننتظر ردها
+            entry = self._wait_for(key)
+            if entry is not None:
+                return entry['data']
+            # انتهت مهلة الانتظار دون رد: نجلب بأنفسنا، ونأخذ القفل إن أصبح متاحاً
+            acquired = self.cache.add(lock_key, 1, self.lock_timeout)
+        try:
+            data = self.backend.fetch(*args)
+            self.cache.set(
+                key, {'data': data, 'fetched_at': time.time()}, self.ttl + self.stale_ttl
+            )
+            return data
+        finally:
+            # لا نحذف قفلاً تملكه عملية أخرى
+            if acquired:
+                self.cache.delete(lock_key)
+
+    def _wait_for(self, key):
+        deadline = time.monotonic() + self.lock_timeout
+        previous = self.cache.get(key)
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            entry = self.cache.get(key)
+            if entry is not None and (
+                previous is None or entry['fetched_at'] != previous['fetched_at']
+            ):
+                return entry
+        return None
+
+
+def parse_daily_rows(response, metrics=DEFAULT_METRICS):
+    """
+    تحويل رد Google Analytics إلى {التاريخ: {المقياس: القيمة}}
+
+    أسماء المقاييس بدون البادئة ga: (مثل users و sessions).
+    """
+    names = [metric.split(':', 1)[-1] for metric in metrics]
+    result = {}
+    for report in response.get('reports', []):
+        for row in report.get('data', {}).get('rows', []):
+            values = row['metrics'][0]['values']
+            result[row['dimensions'][0]] = dict(zip(names, values))
+    return result
+
+
+_analytics_cache = None
+_analytics_cache_lock = threading.Lock()
+
+
+def get_analytics_cache():
+    """ذاكرة Google Analytics المشتركة للعملية الحالية"""
+    global _analytics_cache
+    with _analytics_cache_lock:
+        if _analytics_cache is None:
+            _analytics_cache = AnalyticsCache()
+        return _analytics_cache
+
+
+def reset_analytics_cache():
+    """إعادة إنشاء الذاكرة (بعد تغيير الإعدادات في الاختبارات)"""
+    global _analytics_cache
+    with _analytics_cache_lock:
+        _analytics_cache = None
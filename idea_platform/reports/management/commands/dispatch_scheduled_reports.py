@@ -0,0 +1,18 @@
+"""
+أمر حجز التقارير المجدولة المستحقة وتوزيع تشغيلاتها
+"""
+from django.core.management.base import BaseCommand
+
+from ...scheduler import claim_due_schedules, dispatch_pending_runs
+
+
+class Command(BaseCommand):
+    help = 'تنفيذ التقارير المجدولة المستحقة (بما فيها المواعيد الفائتة)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='أقصى عدد من الجداول في كل دفعة')
+
+    def handle(self, *args, **options):
+        queued = claim_due_schedules(limit=options['limit'])
+        dispatched = dispatch_pending_runs(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'queued: {queued}, dispatched: {len(dispatched)}'))
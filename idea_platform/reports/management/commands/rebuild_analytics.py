@@ -0,0 +1,26 @@
+"""
+أمر إعادة بناء مخزن مؤشرات لوحة التحليلات
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from ...metrics import rebuild_all, refresh_dirty_periods
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء مؤشرات لوحة التحليلات (كاملة أو للأيام المتأثرة فقط)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dirty', action='store_true', help='معالجة الأيام المتأثرة فقط')
+        parser.add_argument('--start', type=date.fromisoformat, help='بداية النطاق (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='نهاية النطاق (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        if options['dirty']:
+            days = refresh_dirty_periods()
+            self.stdout.write(self.style.SUCCESS(f'days: {days}'))
+            return
+
+        months = rebuild_all(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(f'months: {months}'))
@@ -0,0 +1,275 @@
+"""
+مخزن مؤشرات لوحة التحليلات (Materialized Metrics)
+
+تُحفظ المؤشرات مجمعة مسبقاً في جدول AnalyticsBucket بفترتين: يومية
+وشهرية. عند تعديل فاتورة أو دفعة أو مشروع أو عميل يُسجل اليوم المتأثر
+في AnalyticsDirtyDay، ثم تعيد المهمة المجدولة refresh_analytics_task حساب
+الأيام المسجلة وأشهرها فقط، فتقرأ لوحة التحليلات صفوفاً جاهزة دون أي
+تجميع وقت الطلب.
+
+المؤشرات لكل فترة:
+- revenue: مجموع المدفوعات (حسب تاريخ تسجيل الدفعة)
+- invoiced_amount / invoices_count: الفواتير الصادرة (حسب تاريخ الإصدار)
+- projects_count: المشاريع الجديدة
+- clients_count: العملاء الجدد
+"""
+import calendar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class BucketGranularity(models.TextChoices):
+    DAY = 'day', _('يومي')
+    MONTH = 'month', _('شهري')
+
+
+class AnalyticsBucket(models.Model):
+    """مؤشرات فترة واحدة (يوم أو شهر)"""
+    granularity = models.CharField(max_length=5, choices=BucketGranularity.choices, verbose_name=_('الفترة'))
+    period_start = models.DateField(verbose_name=_('بداية الفترة'))
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'), verbose_name=_('الإيرادات'))
+    invoiced_amount = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'), verbose_name=_('قيمة الفواتير'))
+    invoices_count = models.PositiveIntegerField(default=0, verbose_name=_('عدد الفواتير'))
+    projects_count = models.PositiveIntegerField(default=0, verbose_name=_('المشاريع الجديدة'))
+    clients_count = models.PositiveIntegerField(default=0, verbose_name=_('العملاء الجدد'))
+    refreshed_at = models.DateTimeField(auto_now=True, verbose_name=_('تاريخ التحديث'))
+
+    class Meta:
+        app_label = 'reports'
+        verbose_name = _('مؤشرات فترة')
+        verbose_name_plural = _('مؤشرات الفترات')
+        ordering = ['granularity', 'period_start']
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'period_start'], name='reports_bucket_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.granularity} {self.period_start}"
+
+
+class AnalyticsDirtyDay(models.Model):
+    """يوم تغيرت بياناته وينتظر إعادة الحساب"""
+    day = models.DateField(primary_key=True, verbose_name=_('اليوم'))
+    marked_at = models.DateTimeField(auto_now=True, verbose_name=_('تاريخ التسجيل'))
+
+    class Meta:
+        app_label = 'reports'
+        verbose_name = _('يوم بانتظار التحديث')
+        verbose_name_plural = _('أيام بانتظار التحديث')
+
+
+METRIC_FIELDS = ('revenue', 'invoiced_amount', 'invoices_count', 'projects_count', 'clients_count')
+
+
+def _as_date(value):
+    if value is None:
+        return None
+    if hasattr(value, 'date') and callable(value.date):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value
+
+
+def _insert_dirty_days(days):
+    # تجاهل التعارض لا يحجز صف اليوم الموجود، والترتيب يمنع التعارض المتبادل
+    AnalyticsDirtyDay.objects.bulk_create(
+        [AnalyticsDirtyDay(day=day) for day in sorted(days)],
+        ignore_conflicts=True,
+    )
+
+
+def mark_dirty(*days):
+    """
+    تسجيل أيام لإعادة حسابها في التحديث التالي
+
+    يُسجل اليوم بعد تأكيد المعاملة الحالية، فلا تحجز المعاملات المتزامنة
+    صف اليوم نفسه حتى انتهائها. وبما أن التسجيل يأتي بعد حفظ البيانات فإن
+    التحديث الذي حجز اليوم قبله (وحذف صفه) يقرأ البيانات الجديدة، وإلا يجد
+    صفاً جديداً في التحديث التالي.
+    """
+    days = {_as_date(day) for day in days if day is not None}
+    if days:
+        transaction.on_commit(lambda: _insert_dirty_days(days))
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def _daily_sources(start, end):
+    """
+    استعلامات تجميعية لكل مؤشر على نطاق أيام
+
+    Returns:
+        dict: {اليوم: {المؤشر: القيمة}}
+    """
+    from idea_platform.billing.models import Invoice, Payment
+    from idea_platform.crm.models import Client
+    from idea_platform.projects.models import Project
+
+    days = {}
+
+    def add(rows, field):
+        for row in rows:
+            days.setdefault(row['day'], {})[field] = row['value']
+
+    add(
+        Payment.objects.filter(created_at__date__range=(start, end)).annotate(
+            day=TruncDate('created_at')
+        ).order_by().values('day').annotate(value=Sum('amount')),
+        'revenue'
+    )
+    invoices = Invoice.objects.filter(issue_date__range=(start, end)).order_by().values(
+        'issue_date'
+    ).annotate(amount=Sum('total_amount'), count=Count('pk'))
+    for row in invoices:
+        bucket = days.setdefault(row['issue_date'], {})
+        bucket['invoiced_amount'] = row['amount']
+        bucket['invoices_count'] = row['count']
+    add(
+        Project.objects.filter(created_at__date__range=(start, end)).annotate(
+            day=TruncDate('created_at')
+        ).order_by().values('day').annotate(value=Count('pk')),
+        'projects_count'
+    )
+    add(
+        Client.objects.filter(created_at__date__range=(start, end)).annotate(
+            day=TruncDate('created_at')
+        ).order_by().values('day').annotate(value=Count('pk')),
+        'clients_count'
+    )
+    return days
+
+
+def _bucket(granularity, period_start, values):
+    return AnalyticsBucket(
+        granularity=granularity,
+        period_start=period_start,
+        **{field: values.get(field) or 0 for field in METRIC_FIELDS}
+    )
+
+
+def _save_buckets(buckets):
+    AnalyticsBucket.objects.bulk_create(
+        buckets,
+        update_conflicts=True,
+        unique_fields=['granularity', 'period_start'],
+        update_fields=list(METRIC_FIELDS) + ['refreshed_at'],
+    )
+
+
+def refresh_months(months):
+    """
+    إعادة حساب الأشهر المحددة (بأيامها) من الجداول الأصلية
+
+    كل شهر يكلف استعلاماً تجميعياً واحداً لكل مؤشر، وتُحفظ صفوف الأيام
+    والشهر بـ upsert واحد.
+    """
+    for month in sorted(set(months)):
+        start, end = _month_start(month), _month_end(month)
+        daily = _daily_sources(start, end)
+
+        buckets = []
+        totals = dict.fromkeys(METRIC_FIELDS, 0)
+        day = start
+        while day <= end:
+            values = daily.get(day, {})
+            buckets.append(_bucket(BucketGranularity.DAY, day, values))
+            for field in METRIC_FIELDS:
+                totals[field] += values.get(field) or 0
+            day += timedelta(days=1)
+        buckets.append(_bucket(BucketGranularity.MONTH, start, totals))
+        _save_buckets(buckets)
+
+
+def refresh_dirty_periods(limit=1000):
+    """
+    إعادة حساب الفترات المتأثرة بالتعديلات منذ آخر تحديث
+
+    تُحجز الأيام بـ SELECT ... FOR UPDATE SKIP LOCKED وتُحذف في معاملة
+    قصيرة قبل الحساب، فلا يعالج عاملان اليوم نفسه ولا يبقى صف اليوم محجوزاً
+    أثناء الحساب. أي تعديل يُسجل بعد الحجز ينشئ صفاً جديداً للتحديث التالي،
+    وإذا فشل الحساب تُعاد الأيام المحجوزة.
+
+    Returns:
+        int: عدد الأيام المعالجة
+    """
+    with transaction.atomic():
+        days = list(
+            AnalyticsDirtyDay.objects.select_for_update(skip_locked=True)
+            .order_by('day').values_list('day', flat=True)[:limit]
+        )
+        AnalyticsDirtyDay.objects.filter(day__in=days).delete()
+    if not days:
+        return 0
+
+    try:
+        refresh_months({_month_start(day) for day in days})
+    except Exception:
+        _insert_dirty_days(days)
+        raise
+    return len(days)
+
+
+def rebuild_all(start=None, end=None):
+    """إعادة بناء جميع الفترات بين تاريخين (الافتراضي: آخر 24 شهراً)"""
+    end = end or timezone.localdate()
+    start = start or _month_start(end - timedelta(days=730))
+    months = []
+    month = _month_start(start)
+    while month <= end:
+        months.append(month)
+        month = _month_end(month) + timedelta(days=1)
+    refresh_months(months)
+    return len(months)
+
+
+def dashboard_metrics(months=12, days=30, today=None):
+    """
+    بيانات لوحة التحليلات من الصفوف المحسوبة مسبقاً (استعلامان بسيطان)
+
+    Returns:
+        dict: overview و monthly_performance و daily_performance
+    """
+    today = today or timezone.localdate()
+    first_month = _month_start(today)
+    for _month in range(months - 1):
+        first_month = _month_start(first_month - timedelta(days=1))
+
+    monthly = list(
+        AnalyticsBucket.objects.filter(
+            granularity=BucketGranularity.MONTH, period_start__gte=first_month
+        ).order_by('period_start').values('period_start', *METRIC_FIELDS)
+    )
+    daily = list(
+        AnalyticsBucket.objects.filter(
+            granularity=BucketGranularity.DAY,
+            period_start__gt=today - timedelta(days=days),
+            period_start__lte=today,
+        ).order_by('period_start').values('period_start', *METRIC_FIELDS)
+    )
+
+    overview = {field: sum(row[field] for row in monthly) for field in METRIC_FIELDS}
+    current = monthly[-1] if monthly and monthly[-1]['period_start'] == _month_start(today) else None
+    overview['current_month'] = {field: current[field] if current else 0 for field in METRIC_FIELDS}
+
+    return {
+        'overview': overview,
+        'monthly_performance': [
+            {'month': row['period_start'].strftime('%Y-%m'), **{f: row[f] for f in METRIC_FIELDS}}
+            for row in monthly
+        ],
+        'daily_performance': [
+            {'date': row['period_start'].isoformat(), **{f: row[f] for f in METRIC_FIELDS}}
+            for row in daily
+        ],
+    }
@@ -0,0 +1,181 @@
+"""
+ذاكرة نتائج التقارير
+
+عند طلب تقرير لقالب ونطاق تاريخ سبق توليدهما يُعاد استخدام raw_data و
+summary_stats وملف PDF من التقرير المكتمل السابق بدل إعادة الحساب.
+
+مفتاح النتيجة يجمع (القالب، نطاق التاريخ، نسخ البيانات). لكل جدول مصدر
+علامة نسخة (watermark) في الذاكرة المؤقتة تزداد بعد تأكيد أي تعديل عليه
+(انظر signals.py)، فيتغير المفتاح تلقائياً ولا تُعاد نتيجة قديمة. تُقرأ
+العلامات قبل التوليد، فالتعديل أثناء التوليد يجعل النتيجة غير قابلة
+لإعادة الاستخدام بدل أن يخفيه.
+
+عدادات الإصابة والإخفاق متاحة عبر result_cache_stats().
+
+تُحفظ العلامات والمفاتيح في الذاكرة المشتركة (REPORTS_RESULT_CACHE_ALIAS أو
+SHARED_CACHE_ALIAS) لأن التعديلات تحدث في عمليات الويب بينما تُولد التقارير
+المجدولة في عمليات Celery. بدون ذاكرة مشتركة لا يُعاد استخدام أي نتيجة.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+# الجداول التي تُبنى منها التقارير
+DATA_SOURCES = ('projects', 'invoices', 'payments', 'clients')
+
+HITS_KEY = 'reports:result_cache:hits'
+MISSES_KEY = 'reports:result_cache:misses'
+
+
+def _cache():
+    alias = getattr(settings, 'REPORTS_RESULT_CACHE_ALIAS', None) or getattr(settings, 'SHARED_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _watermark_key(source):
+    return f'reports:watermark:{source}'
+
+
+def template_source(template_id):
+    """علامة خاصة بالقالب (تتغير عند تعديل القالب نفسه)"""
+    return f'template:{template_id}'
+
+
+def bump_watermarks(*sources):
+    """زيادة نسخ الجداول المحددة"""
+    cache = _cache()
+    if cache is None:
+        return
+    for source in sources:
+        key = _watermark_key(source)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # العلامة غير موجودة (أو حُذفت من الذاكرة): قيمة جديدة لم تُستخدم قبلاً
+            cache.set(key, time.time_ns(), None)
+
+
+def schedule_watermark_bump(*sources):
+    """زيادة النسخ بعد تأكيد المعاملة الحالية"""
+    transaction.on_commit(lambda: bump_watermarks(*sources))
+
+
+def get_watermarks(sources):
+    """
+    نسخ الجداول الحالية
+
+    Returns:
+        dict: {المصدر: النسخة}
+    """
+    cache = _cache()
+    keys = {_watermark_key(source): source for source in sources}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, time.time_ns(), None)
+        found[key] = cache.get(key)
+    return {source: found[key] for key, source in keys.items()}
+
+
+def report_sources(template):
+    """الجداول التي يعتمد عليها القالب (جميعها إذا لم تُحدد)"""
+    sources = {source for source in (template.data_sources or []) if source in DATA_SOURCES}
+    return sorted(sources or DATA_SOURCES) + [template_source(template.pk)]
+
+
+def result_key(template, start_date, end_date):
+    """مفتاح نتيجة التقرير للبيانات بنسختها الحالية"""
+    payload = json.dumps([
+        str(template.pk), str(start_date), str(end_date), get_watermarks(report_sources(template))
+    ], sort_keys=True)
+    return 'reports:result:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _count(key):
+    cache = _cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def lookup_report(template, start_date, end_date):
+    """
+    البحث عن تقرير مكتمل بالمدخلات ونسخ البيانات نفسها
+
+    Returns:
+        tuple: (مفتاح النتيجة، التقرير أو None)
+    """
+    from .models import Report, ReportStatus
+
+    key = result_key(template, start_date, end_date)
+    report_id = _cache().get(key)
+    report = None
+    if report_id is not None:
+        report = Report.objects.filter(pk=report_id, status=ReportStatus.COMPLETED).first()
+    _count(HITS_KEY if report is not None else MISSES_KEY)
+    return key, report
+
+
+def store_report(key, report):
+    """ربط مفتاح النتيجة بالتقرير المكتمل"""
+    _cache().set(key, report.pk, getattr(settings, 'REPORTS_RESULT_CACHE_TTL', 7 * 86400))
+
+
+def generate_with_cache(report, generator):
+    """
+    توليد التقرير أو نسخ نتيجة تقرير مطابق
+
+    Args:
+        report: التقرير المطلوب توليده
+        generator: دالة التوليد الفعلي (تستقبل التقرير)
+
+    Returns:
+        dict: ملخص التقرير
+    """
+    from .models import ReportStatus
+
+    if _cache() is None:
+        return generator(report)
+
+    key, cached = lookup_report(report.template, report.start_date, report.end_date)
+    if cached is not None and cached.pk != report.pk:
+        now = timezone.now()
+        report.raw_data = cached.raw_data
+        report.summary_stats = cached.summary_stats
+        report.pdf_file = cached.pdf_file
+        report.status = ReportStatus.COMPLETED
+        report.generation_started_at = report.generation_completed_at = now
+        report.save(update_fields=[
+            'raw_data', 'summary_stats', 'pdf_file', 'status',
+            'generation_started_at', 'generation_completed_at',
+        ])
+        return report.summary_stats
+
+    summary = generator(report)
+    store_report(key, report)
+    return summary
+
+
+def result_cache_stats():
+    """عدادات الإصابة والإخفاق ونسبة الإصابة"""
+    cache = _cache()
+    counters = cache.get_many([HITS_KEY, MISSES_KEY]) if cache is not None else {}
+    hits, misses = counters.get(HITS_KEY, 0), counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def reset_result_cache_stats():
+    cache = _cache()
+    if cache is not None:
+        cache.delete_many([HITS_KEY, MISSES_KEY])
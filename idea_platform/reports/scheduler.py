@@ -0,0 +1,403 @@
+"""
+تنفيذ التقارير المجدولة
+
+تعمل المهمة الدورية dispatch_scheduled_reports_task على مرحلتين:
+
+1. حجز التقارير المجدولة المستحقة بـ SELECT ... FOR UPDATE SKIP LOCKED
+   (فلا يحجز عاملان الجدول نفسه)، وإنشاء تشغيل ReportRun لكل موعد فائت
+   منذ آخر تشغيل (حتى REPORTS_SCHEDULE_MAX_CATCHUP موعداً)، ثم تقديم
+   next_run_at إلى أول موعد قادم.
+2. توزيع التشغيلات المعلقة على عمال Celery مع حد أقصى للتشغيلات الجارية
+   لكل قالب (REPORTS_MAX_CONCURRENT_PER_TEMPLATE).
+
+التشغيلات المتطابقة (القالب ونطاق التاريخ نفسه) تُدمج في تشغيل واحد عبر
+قيد فريد على ReportRun، وتسجل التقارير الناتجة generation_started_at و
+generation_completed_at.
+"""
+import calendar
+import functools
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import Report, ReportFrequency, ReportTemplate, ReportType, ScheduledReport
+
+logger = logging.getLogger(__name__)
+
+
+class ReportRunState(models.TextChoices):
+    PENDING = 'pending', _('بانتظار التنفيذ')
+    RUNNING = 'running', _('قيد التنفيذ')
+    COMPLETED = 'completed', _('مكتمل')
+    FAILED = 'failed', _('فشل')
+
+
+class ReportRun(models.Model):
+    """تشغيل واحد لقالب على نطاق تاريخ (مشترك بين الجداول المتطابقة)"""
+    template = models.ForeignKey(
+        ReportTemplate,
+        on_delete=models.CASCADE,
+        related_name='runs',
+        verbose_name=_('القالب')
+    )
+    start_date = models.DateField(verbose_name=_('تاريخ البداية'))
+    end_date = models.DateField(verbose_name=_('تاريخ النهاية'))
+    report = models.OneToOneField(
+        Report,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='run',
+        verbose_name=_('التقرير')
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name=_('طلب بواسطة')
+    )
+    state = models.CharField(
+        max_length=10,
+        choices=ReportRunState.choices,
+        default=ReportRunState.PENDING,
+        verbose_name=_('الحالة')
+    )
+    scheduled_for = models.DateTimeField(verbose_name=_('الموعد المجدول'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('عدد المحاولات'))
+    error = models.TextField(blank=True, verbose_name=_('الخطأ'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('تاريخ الإنشاء'))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_('بدء التنفيذ'))
+    # آخر إشارة من العامل المنفذ، ويُعتبر التشغيل عالقاً إذا تأخرت أكثر من REPORTS_RUN_TIMEOUT
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name=_('آخر نبضة'))
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name=_('انتهاء التنفيذ'))
+
+    class Meta:
+        app_label = 'reports'
+        verbose_name = _('تشغيل تقرير')
+        verbose_name_plural = _('تشغيلات التقارير')
+        ordering = ['scheduled_for']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['template', 'start_date', 'end_date'], name='reports_run_template_period'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['state', 'template']),
+        ]
+
+    def __str__(self):
+        return f"{self.template_id}: {self.start_date} - {self.end_date}"
+
+
+# ------------------------------------------------------------------
+# المواعيد
+# ------------------------------------------------------------------
+
+def _add_months(value, months):
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def advance(schedule_type, when, steps=1):
+    """الموعد التالي (أو السابق عند steps سالبة) حسب نوع الجدولة"""
+    if schedule_type == ReportFrequency.DAILY:
+        return when + timedelta(days=steps)
+    if schedule_type == ReportFrequency.WEEKLY:
+        return when + timedelta(weeks=steps)
+    if schedule_type == ReportFrequency.MONTHLY:
+        return _add_months(when, steps)
+    if schedule_type == ReportFrequency.QUARTERLY:
+        return _add_months(when, 3 * steps)
+    raise ValueError(f'Unsupported schedule type: {schedule_type}')
+
+
+def period_for(schedule_type, run_at):
+    """
+    نطاق التقرير لموعد تشغيل: الفترة الكاملة المنتهية في اليوم السابق للموعد
+
+    Returns:
+        tuple: (تاريخ البداية، تاريخ النهاية)
+    """
+    end = timezone.localtime(run_at).date() - timedelta(days=1)
+    start = timezone.localtime(advance(schedule_type, run_at, -1)).date()
+    return start, max(start, end)
+
+
+def due_occurrences(schedule_type, next_run_at, now, max_catchup):
+    """
+    المواعيد المستحقة منذ next_run_at حتى الآن وأول موعد قادم
+
+    عند تجاوز عدد المواعيد الفائتة max_catchup تُنفذ أحدثها فقط.
+
+    Returns:
+        tuple: (قائمة المواعيد المستحقة، الموعد القادم، عدد المواعيد المتجاوزة)
+    """
+    due = []
+    when = next_run_at
+    while when <= now:
+        due.append(when)
+        when = advance(schedule_type, when)
+    skipped = max(0, len(due) - max_catchup)
+    return due[skipped:], when, skipped
+
+
+# ------------------------------------------------------------------
+# الحجز والتوزيع
+# ------------------------------------------------------------------
+
+def enqueue_runs(runs):
+    """
+    إضافة تشغيلات مع دمج المتطابقة منها
+
+    التشغيل الموجود مسبقاً للقالب ونطاق التاريخ نفسه لا يتكرر، إلا إذا كان
+    قد فشل فيُعاد إلى الانتظار.
+
+    Returns:
+        int: عدد التشغيلات الجديدة أو المعادة
+    """
+    unique = {}
+    for run in runs:
+        unique.setdefault((run.template_id, run.start_date, run.end_date), run)
+    if not unique:
+        return 0
+
+    keys = Q()
+    for template_id, start_date, end_date in unique:
+        keys |= Q(template_id=template_id, start_date=start_date, end_date=end_date)
+
+    existing = ReportRun.objects.filter(keys)
+    before = existing.count()
+    ReportRun.objects.bulk_create(unique.values(), ignore_conflicts=True)
+    retried = existing.filter(state=ReportRunState.FAILED).update(
+        state=ReportRunState.PENDING, error=''
+    )
+    return existing.count() - before + retried
+
+
+def claim_due_schedules(now=None, limit=100):
+    """
+    حجز التقارير المجدولة المستحقة وإنشاء تشغيلاتها
+
+    Returns:
+        int: عدد التشغيلات المضافة
+    """
+    now = now or timezone.now()
+    max_catchup = getattr(settings, 'REPORTS_SCHEDULE_MAX_CATCHUP', 12)
+
+    with transaction.atomic():
+        schedules = list(
+            ScheduledReport.objects.select_for_update(skip_locked=True).filter(
+                Q(next_run_at__lte=now) | Q(next_run_at__isnull=True),
+                is_active=True,
+            ).order_by('next_run_at')[:limit]
+        )
+
+        runs = []
+        for schedule in schedules:
+            if schedule.next_run_at is None:
+                # جدول جديد: يبدأ من موعده القادم
+                schedule.calculate_next_run()
+                continue
+            due, schedule.next_run_at, skipped = due_occurrences(
+                schedule.schedule_type, schedule.next_run_at, now, max_catchup
+            )
+            if skipped:
+                logger.warning('Scheduled report %s skipped %d missed runs', schedule.pk, skipped)
+            for run_at in due:
+                start_date, end_date = period_for(schedule.schedule_type, run_at)
+                runs.append(ReportRun(
+                    template_id=schedule.template_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    requested_by_id=schedule.created_by_id,
+                    scheduled_for=run_at,
+                ))
+
+        ScheduledReport.objects.bulk_update(schedules, ['next_run_at'])
+        return enqueue_runs(runs)
+
+
+def dispatch_pending_runs(now=None, limit=100):
+    """
+    إرسال التشغيلات المعلقة إلى Celery دون تجاوز حد التشغيلات الجارية لكل قالب
+
+    التشغيلات العالقة (لم يرسل عاملها نبضة منذ REPORTS_RUN_TIMEOUT ثانية)
+    تُعاد إلى الانتظار، إلا إذا بلغت REPORTS_RUN_MAX_ATTEMPTS محاولة فتُعتبر
+    فاشلة.
+
+    Returns:
+        list: معرفات التشغيلات المرسلة
+    """
+    from .tasks import execute_report_run_task
+
+    now = now or timezone.now()
+    per_template = getattr(settings, 'REPORTS_MAX_CONCURRENT_PER_TEMPLATE', 2)
+    timeout = timedelta(seconds=getattr(settings, 'REPORTS_RUN_TIMEOUT', 3600))
+    max_attempts = getattr(settings, 'REPORTS_RUN_MAX_ATTEMPTS', 3)
+
+    with transaction.atomic():
+        stuck = ReportRun.objects.filter(
+            Q(heartbeat_at__lt=now - timeout) | Q(heartbeat_at__isnull=True, started_at__lt=now - timeout),
+            state=ReportRunState.RUNNING,
+        )
+        stuck.filter(attempts__gte=max_attempts).update(
+            state=ReportRunState.FAILED,
+            error=f'Timed out after {max_attempts} attempts',
+            completed_at=now,
+        )
+        stuck.filter(attempts__lt=max_attempts).update(state=ReportRunState.PENDING)
+
+        pending = list(
+            ReportRun.objects.select_for_update(skip_locked=True).filter(
+                state=ReportRunState.PENDING
+            ).order_by('scheduled_for', 'pk')[:limit]
+        )
+        if not pending:
+            return []
+
+        # قفل صفوف القوالب يمنع موزعين متزامنين من تجاوز الحد معاً
+        template_ids = sorted({run.template_id for run in pending})
+        list(ReportTemplate.objects.select_for_update().filter(pk__in=template_ids).order_by('pk').values('pk'))
+
+        running = Counter(dict(
+            ReportRun.objects.filter(
+                state=ReportRunState.RUNNING, template__in=template_ids
+            ).order_by().values_list('template').annotate(count=Count('pk'))
+        ))
+
+        chosen = []
+        for run in pending:
+            if running[run.template_id] < per_template:
+                running[run.template_id] += 1
+                chosen.append(run.pk)
+
+        ReportRun.objects.filter(pk__in=chosen).update(
+            state=ReportRunState.RUNNING, started_at=now, heartbeat_at=now,
+            attempts=models.F('attempts') + 1
+        )
+        transaction.on_commit(lambda: [execute_report_run_task.delay(run_id) for run_id in chosen])
+    return chosen
+
+
+# ------------------------------------------------------------------
+# التنفيذ
+# ------------------------------------------------------------------
+
+class RunSuperseded(Exception):
+    """أُعيد التشغيل إلى الانتظار (أو أُرسل لعامل آخر) أثناء تنفيذه"""
+
+
+class RunHeartbeat:
+    """
+    نبضة العامل المنفذ لتشغيل واحد
+
+    تحدّث heartbeat_at (مرة كل REPORTS_RUN_HEARTBEAT ثانية على الأكثر) ما
+    دامت المحاولة الحالية مالكة التشغيل، وإلا ترفع RunSuperseded فيتوقف
+    العامل قبل كتابة نتيجته. تُستدعى مع force=True قبل حفظ النتيجة.
+    """
+
+    def __init__(self, run):
+        self.run_id = run.pk
+        self.attempt = run.attempts
+        self.interval = getattr(settings, 'REPORTS_RUN_HEARTBEAT', 60)
+        self.last = time.monotonic()
+
+    def __call__(self, force=False):
+        if not force and time.monotonic() - self.last < self.interval:
+            return
+        updated = ReportRun.objects.filter(
+            pk=self.run_id, state=ReportRunState.RUNNING, attempts=self.attempt
+        ).update(heartbeat_at=timezone.now())
+        if not updated:
+            raise RunSuperseded(f'Report run {self.run_id} attempt {self.attempt} was superseded')
+        self.last = time.monotonic()
+
+
+def _generate_project_performance(report, heartbeat=None):
+    from .streaming import generate_project_performance_report
+
+    return generate_project_performance_report(report, heartbeat=heartbeat)
+
+
+# مولد بيانات كل نوع تقرير
+REPORT_GENERATORS = {
+    ReportType.PROJECT_PERFORMANCE: _generate_project_performance,
+}
+
+
+def generate_report(report, heartbeat=None):
+    """
+    توليد بيانات التقرير حسب نوع قالبه
+
+    يُعاد استخدام نتيجة تقرير مكتمل للقالب ونطاق التاريخ نفسه إذا لم
+    تتغير البيانات منذ توليده (انظر result_cache.py).
+    """
+    from .result_cache import generate_with_cache
+
+    generator = REPORT_GENERATORS.get(report.template.report_type)
+    if generator is None:
+        raise ValueError(f'No generator for report type: {report.template.report_type}')
+    return generate_with_cache(report, functools.partial(generator, heartbeat=heartbeat))
+
+
+def execute_report_run(run_id):
+    """
+    تنفيذ تشغيل واحد: إنشاء التقرير (مرة واحدة) ثم توليد بياناته
+
+    Returns:
+        str: حالة التشغيل بعد التنفيذ
+    """
+    run = ReportRun.objects.select_related('template', 'report').get(pk=run_id)
+    if run.state != ReportRunState.RUNNING:
+        return run.state
+
+    if run.report is None:
+        run.report = Report.objects.create(
+            title=f"{run.template.name} ({run.start_date} - {run.end_date})",
+            template=run.template,
+            start_date=run.start_date,
+            end_date=run.end_date,
+            generated_by=run.requested_by,
+        )
+        run.save(update_fields=['report'])
+
+    try:
+        generate_report(run.report, heartbeat=RunHeartbeat(run))
+    except RunSuperseded:
+        # عامل آخر يملك التشغيل الآن، فلا يُكتب شيء من هذه المحاولة
+        logger.warning('Report run %s attempt %s was superseded', run.pk, run.attempts)
+        return ReportRun.objects.values_list('state', flat=True).get(pk=run.pk)
+    except Exception as exc:
+        logger.exception('Report run %s failed', run.pk)
+        run.state = ReportRunState.FAILED
+        run.error = str(exc)
+        _mark_report_failed(run.report, run.error)
+    else:
+        run.state = ReportRunState.COMPLETED
+        run.error = ''
+    run.completed_at = timezone.now()
+    ReportRun.objects.filter(pk=run.pk, attempts=run.attempts).update(
+        state=run.state, error=run.error, completed_at=run.completed_at
+    )
+    return run.state
+
+
+def _mark_report_failed(report, error):
+    """إنهاء التقرير بحالة الفشل حتى لا يبقى معلقاً في الواجهة"""
+    from .models import ReportStatus
+
+    report.status = ReportStatus.FAILED
+    report.summary_stats = {'error': error}
+    report.generation_completed_at = timezone.now()
+    report.save(update_fields=['status', 'summary_stats', 'generation_completed_at'])
@@ -0,0 +1,75 @@
+"""
+إشارات تسجيل الأيام المتأثرة في مخزن مؤشرات لوحة التحليلات وتحديث
+علامات نسخ البيانات لذاكرة نتائج التقارير
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from idea_platform.billing.models import Invoice, InvoiceItem, Payment
+from idea_platform.billing.signals import invoice_totals_changed
+from idea_platform.crm.models import Client
+from idea_platform.projects.models import Project
+
+from .metrics import mark_dirty
+from .models import ReportTemplate
+from .result_cache import schedule_watermark_bump, template_source
+
+
+@receiver(pre_save, sender=Invoice)
+def remember_invoice_issue_date(sender, instance, **kwargs):
+    """حفظ تاريخ الإصدار السابق، فتعديله ينقل مبالغ الفاتورة من يوم إلى آخر"""
+    if not instance._state.adding:
+        instance._previous_issue_date = Invoice.objects.filter(pk=instance.pk).values_list(
+            'issue_date', flat=True
+        ).first()
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+def invoice_metrics_changed(sender, instance, **kwargs):
+    """الفواتير تُجمع حسب تاريخ الإصدار (الحالي والسابق عند تعديله)"""
+    mark_dirty(instance.issue_date, getattr(instance, '_previous_issue_date', None))
+
+
+@receiver([post_save, post_delete], sender=InvoiceItem)
+def invoice_item_metrics_changed(sender, instance, **kwargs):
+    """البنود تغير مبلغ الفاتورة في يوم إصدارها"""
+    mark_dirty(Invoice.objects.filter(pk=instance.invoice_id).values_list('issue_date', flat=True).first())
+
+
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=Project)
+@receiver([post_save, post_delete], sender=Client)
+def created_metrics_changed(sender, instance, **kwargs):
+    """المدفوعات والمشاريع والعملاء تُجمع حسب تاريخ الإنشاء"""
+    mark_dirty(instance.created_at)
+
+
+WATERMARK_SOURCES = {
+    Invoice: 'invoices',
+    InvoiceItem: 'invoices',
+    Payment: 'payments',
+    Project: 'projects',
+    Client: 'clients',
+}
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=InvoiceItem)
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=Project)
+@receiver([post_save, post_delete], sender=Client)
+def report_source_changed(sender, instance, **kwargs):
+    """تعديل جدول مصدر يبطل نتائج التقارير المبنية عليه"""
+    schedule_watermark_bump(WATERMARK_SOURCES[sender])
+
+
+@receiver(invoice_totals_changed)
+def invoice_totals_metrics_changed(sender, invoice_ids, **kwargs):
+    """مجاميع الفواتير المحدثة بـ UPDATE تغير المؤشرات ونتائج التقارير"""
+    mark_dirty(*Invoice.objects.filter(pk__in=list(invoice_ids)).values_list('issue_date', flat=True).distinct())
+    schedule_watermark_bump(WATERMARK_SOURCES[Invoice])
+
+
+@receiver([post_save, post_delete], sender=ReportTemplate)
+def report_template_changed(sender, instance, **kwargs):
+    schedule_watermark_bump(template_source(instance.pk))
@@ -0,0 +1,400 @@
+"""
+محرك التقارير المتدفق (Streaming)
+
+بدل بناء raw_data و summary_stats كاملين في الذاكرة، تمر بيانات التقرير
+في سلسلة مولدات (generators) على شكل دفعات من الصفوف:
+
+    المصدر (queryset) ← مراحل تحويل ← الإحصاءات التراكمية + ملف التخزين
+
+- الإحصاءات تُحسب تراكمياً لكل دفعة: العدد والمجموع والحد الأدنى والأعلى
+  والمتوسط والتباين (Welford) والمئينات بخوارزمية P² بذاكرة ثابتة.
+- الصفوف الخام تُكتب في ملف عمودي مضغوط (gzip) بدل حقل JSON واحد؛ كل
+  دفعة مجموعة صفوف (row group) مخزنة عموداً عموداً، ويمكن قراءتها لاحقاً
+  دفعة دفعة أو لأعمدة محددة فقط.
+
+لا يحتفظ المحرك في الذاكرة إلا بدفعة واحدة مهما كان حجم التقرير.
+"""
+import gzip
+import json
+import math
+import posixpath
+import tempfile
+from decimal import Decimal
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+SPILL_FORMAT = 'idea-columnar-v1'
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+# ------------------------------------------------------------------
+# المصادر ومراحل التحويل
+# ------------------------------------------------------------------
+
+def queryset_source(queryset, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    مصدر بيانات من queryset على شكل دفعات من القواميس
+
+    يُستخدم iterator() فلا تُحمل النتائج كاملة في الذاكرة.
+    """
+    chunk = []
+    for row in queryset.values(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def map_rows(chunks, func):
+    """مرحلة تحويل: تطبيق دالة على كل صف"""
+    for chunk in chunks:
+        yield [func(row) for row in chunk]
+
+
+def filter_rows(chunks, predicate):
+    """مرحلة تصفية: إبقاء الصفوف التي تحقق الشرط"""
+    for chunk in chunks:
+        kept = [row for row in chunk if predicate(row)]
+        if kept:
+            yield kept
+
+
+# ------------------------------------------------------------------
+# الإحصاءات التراكمية
+# ------------------------------------------------------------------
+
+class P2Quantile:
+    """
+    تقدير مئين بخوارزمية P² (Jain & Chlamtac) بخمس علامات فقط
+
+    الدقة تقريبية لكنها كافية لملخصات التقارير، والذاكرة ثابتة مهما كان
+    عدد القيم.
+    """
+
+    def __init__(self, quantile):
+        self.quantile = quantile
+        self._initial = []
+        self._heights = None
+        self._positions = None
+        self._desired = None
+        self._increments = (0, quantile / 2, quantile, (1 + quantile) / 2, 1)
+
+    def add(self, value):
+        if self._heights is None:
+            self._initial.append(value)
+            if len(self._initial) == 5:
+                self._initial.sort()
+                self._heights = self._initial
+                self._positions = [1, 2, 3, 4, 5]
+                q = self.quantile
+                self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+            return
+
+        heights, positions = self._heights, self._positions
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = max(heights[4], value)
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in range(1, 4):
+            delta = self._desired[i] - positions[i]
+            if (delta >= 1 and positions[i + 1] - positions[i] > 1) or (
+                delta <= -1 and positions[i - 1] - positions[i] < -1
+            ):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        h, n = self._heights, self._positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i, step):
+        h, n = self._heights, self._positions
+        return h[i] + step * (h[i + step] - h[i]) / (n[i + step] - n[i])
+
+    def value(self):
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return None
+        # أقل من خمس قيم: المئين الدقيق
+        values = sorted(self._initial)
+        return values[min(len(values) - 1, max(0, math.ceil(self.quantile * len(values)) - 1))]
+
+
+def _json_number(value):
+    """قيم Decimal تُحفظ نصوصاً (كما يكتبها DjangoJSONEncoder) حتى لا تفقد دقتها"""
+    return str(value) if isinstance(value, Decimal) else value
+
+
+class RunningStats:
+    """
+    إحصاءات عمود رقمي تُحدث قيمة بقيمة
+
+    إذا كانت القيم Decimal (المبالغ المالية) يبقى المجموع Decimal فيكون
+    المجموع والمتوسط دقيقين، ويُستخدم float للتباين والمئينات فقط.
+    """
+
+    def __init__(self, quantiles=DEFAULT_QUANTILES):
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._quantiles = [P2Quantile(q) for q in quantiles]
+
+    def add(self, value):
+        if value is None:
+            return
+        if isinstance(value, Decimal) and not isinstance(self.total, float):
+            self.total += value
+        else:
+            self.total = float(self.total) + float(value)
+        self.count += 1
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+        value = float(value)
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+        for estimator in self._quantiles:
+            estimator.add(value)
+
+    def as_dict(self):
+        variance = self._m2 / (self.count - 1) if self.count > 1 else 0.0
+        if isinstance(self.total, Decimal):
+            total = self.total
+            mean = (self.total / self.count).quantize(Decimal('0.0001')) if self.count else None
+        else:
+            total = round(self.total, 2)
+            mean = round(self._mean, 4) if self.count else None
+        return {
+            'count': self.count,
+            'sum': _json_number(total),
+            'min': _json_number(self.minimum),
+            'max': _json_number(self.maximum),
+            'mean': _json_number(mean),
+            'stddev': round(math.sqrt(variance), 4),
+            'quantiles': {
+                f'p{round(estimator.quantile * 100):g}': estimator.value()
+                for estimator in self._quantiles
+            },
+        }
+
+
+class SummaryAccumulator:
+    """
+    ملخص التقرير: إحصاءات للأعمدة الرقمية وتكرارات للأعمدة التصنيفية
+    """
+
+    def __init__(self, numeric_fields=(), category_fields=(), quantiles=DEFAULT_QUANTILES):
+        self.rows = 0
+        self.numeric = {field: RunningStats(quantiles) for field in numeric_fields}
+        self.categories = {field: {} for field in category_fields}
+
+    def add_chunk(self, chunk):
+        self.rows += len(chunk)
+        for row in chunk:
+            for field, stats in self.numeric.items():
+                stats.add(row.get(field))
+            for field, counts in self.categories.items():
+                key = str(row.get(field))
+                counts[key] = counts.get(key, 0) + 1
+
+    def as_dict(self):
+        return {
+            'row_count': self.rows,
+            'numeric': {field: stats.as_dict() for field, stats in self.numeric.items()},
+            'categories': self.categories,
+        }
+
+
+# ------------------------------------------------------------------
+# ملف التخزين العمودي المضغوط
+# ------------------------------------------------------------------
+
+class ColumnarSpillWriter:
+    """
+    كتابة الدفعات في ملف gzip عمودي: سطر ترويسة ثم سطر JSON لكل مجموعة
+    صفوف بالشكل {"n": عدد الصفوف، "c": {العمود: [القيم]}}
+    """
+
+    def __init__(self, fileobj, columns, compresslevel=6):
+        self.columns = list(columns)
+        self.rows = 0
+        self._gzip = gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=compresslevel)
+        self._write({'format': SPILL_FORMAT, 'columns': self.columns})
+
+    def _write(self, payload):
+        self._gzip.write(json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8'))
+        self._gzip.write(b'\n')
+
+    def write_chunk(self, chunk):
+        self._write({
+            'n': len(chunk),
+            'c': {column: [row.get(column) for row in chunk] for column in self.columns},
+        })
+        self.rows += len(chunk)
+
+    def close(self):
+        self._gzip.close()
+
+
+def read_spill(fileobj, columns=None):
+    """
+    قراءة ملف عمودي دفعة دفعة
+
+    Args:
+        columns: الأعمدة المطلوبة فقط (الافتراضي: جميع الأعمدة)
+
+    Yields:
+        list: دفعة من الصفوف (قواميس)
+    """
+    with gzip.GzipFile(fileobj=fileobj, mode='rb') as source:
+        header = json.loads(source.readline())
+        if header.get('format') != SPILL_FORMAT:
+            raise ValueError('Unsupported report spill format')
+        wanted = columns or header['columns']
+        for line in source:
+            group = json.loads(line)
+            data = [group['c'][column] for column in wanted]
+            yield [dict(zip(wanted, values)) for values in zip(*data)] if data else [{}] * group['n']
+
+
+# ------------------------------------------------------------------
+# تشغيل التقرير
+# ------------------------------------------------------------------
+
+def report_spill_path(report):
+    return posixpath.join('reports', 'raw', f'{report.pk}.jsonl.gz')
+
+
+def build_streaming_report(report, chunks, columns, numeric_fields=(), category_fields=(),
+                           quantiles=DEFAULT_QUANTILES, storage=None, heartbeat=None):
+    """
+    تشغيل سلسلة الدفعات وحفظ الناتج في التقرير
+
+    - summary_stats: الملخص التراكمي
+    - raw_data: مرجع لملف الصفوف الخام بدل الصفوف نفسها
+
+    يُكتب الملف أولاً في ملف مؤقت (يبقى في الذاكرة حتى 8MB ثم ينتقل للقرص)
+    ثم يُنقل إلى التخزين.
+
+    Args:
+        heartbeat: دالة تُستدعى بعد كل دفعة، ثم مع force=True قبل نقل الملف
+            إلى التخزين (انظر scheduler.RunHeartbeat)
+
+    Returns:
+        dict: الملخص
+    """
+    storage = storage or default_storage
+    summary = SummaryAccumulator(numeric_fields, category_fields, quantiles)
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        writer = ColumnarSpillWriter(spool, columns)
+        for chunk in chunks:
+            summary.add_chunk(chunk)
+            writer.write_chunk(chunk)
+            if heartbeat is not None:
+                heartbeat()
+        writer.close()
+
+        if heartbeat is not None:
+            heartbeat(force=True)
+        spool.seek(0)
+        path = report_spill_path(report)
+        if storage.exists(path):
+            storage.delete(path)
+        path = storage.save(path, File(spool))
+
+    report.summary_stats = summary.as_dict()
+    report.raw_data = {
+        'storage': 'columnar',
+        'format': SPILL_FORMAT,
+        'path': path,
+        'columns': list(columns),
+        'row_count': summary.rows,
+    }
+    report.save(update_fields=['summary_stats', 'raw_data'])
+    return report.summary_stats
+
+
+def iter_report_rows(report, columns=None, storage=None):
+    """قراءة الصفوف الخام لتقرير (من الملف أو من raw_data القديم)"""
+    raw = report.raw_data or {}
+    if not isinstance(raw, dict) or raw.get('storage') != 'columnar':
+        # تقارير قديمة مخزنة كـ JSON كامل
+        rows = raw.get('rows', []) if isinstance(raw, dict) else raw
+        yield list(rows)
+        return
+
+    storage = storage or default_storage
+    with storage.open(raw['path'], 'rb') as fileobj:
+        yield from read_spill(fileobj, columns)
+
+
+PROJECT_PERFORMANCE_COLUMNS = (
+    'id', 'name', 'status', 'project_type', 'budget', 'start_date', 'end_date', 'client__name',
+)
+
+
+def project_performance_chunks(start_date, end_date, chunk_size=DEFAULT_CHUNK_SIZE):
+    """مصدر تقرير أداء المشاريع: المشاريع المنشأة في نطاق التاريخ"""
+    from idea_platform.projects.models import Project
+
+    queryset = Project.objects.filter(
+        created_at__date__range=(start_date, end_date)
+    ).order_by('pk')
+    return queryset_source(queryset, PROJECT_PERFORMANCE_COLUMNS, chunk_size)
+
+
+def generate_project_performance_report(report, chunk_size=DEFAULT_CHUNK_SIZE, heartbeat=None):
+    """
+    توليد تقرير أداء المشاريع بالتدفق مع تسجيل وقت البدء والانتهاء
+
+    Returns:
+        dict: الملخص
+    """
+    from django.utils import timezone
+
+    from .models import ReportStatus
+
+    report.generation_started_at = timezone.now()
+    report.save(update_fields=['generation_started_at'])
+
+    summary = build_streaming_report(
+        report,
+        project_performance_chunks(report.start_date, report.end_date, chunk_size),
+        PROJECT_PERFORMANCE_COLUMNS,
+        numeric_fields=('budget',),
+        category_fields=('status', 'project_type'),
+        heartbeat=heartbeat,
+    )
+
+    report.status = ReportStatus.COMPLETED
+    report.generation_completed_at = timezone.now()
+    report.save(update_fields=['status', 'generation_completed_at'])
+    return summary
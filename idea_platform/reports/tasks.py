@@ -0,0 +1,62 @@
+"""
+المهام الخلفية (Celery) لنظام التقارير
+"""
+from celery import shared_task
+
+
+@shared_task
+def refresh_analytics_task(limit=1000):
+    """
+    تحديث مؤشرات لوحة التحليلات للأيام المتأثرة فقط (مهمة مجدولة)
+
+    Returns:
+        int: عدد الأيام المعالجة
+    """
+    from .metrics import refresh_dirty_periods
+
+    return refresh_dirty_periods(limit=limit)
+
+
+@shared_task
+def generate_streaming_report_task(report_id, chunk_size=None):
+    """
+    توليد تقرير أداء المشاريع بالتدفق (دفعة دفعة) دون تحميل بياناته في الذاكرة
+
+    Returns:
+        dict: ملخص التقرير
+    """
+    from .models import Report
+    from .streaming import DEFAULT_CHUNK_SIZE, generate_project_performance_report
+
+    report = Report.objects.get(pk=report_id)
+    return generate_project_performance_report(report, chunk_size or DEFAULT_CHUNK_SIZE)
+
+
+@shared_task
+def dispatch_scheduled_reports_task():
+    """
+    حجز التقارير المجدولة المستحقة (مع المواعيد الفائتة) وتوزيع تشغيلاتها
+
+    Returns:
+        dict: عدد التشغيلات المضافة والمرسلة
+    """
+    from .scheduler import claim_due_schedules, dispatch_pending_runs
+
+    queued = claim_due_schedules()
+    return {'queued': queued, 'dispatched': len(dispatch_pending_runs())}
+
+
+@shared_task
+def execute_report_run_task(run_id):
+    """
+    تنفيذ تشغيل تقرير ثم إرسال التشغيل التالي المعلق للقالب نفسه
+
+    Returns:
+        str: حالة التشغيل
+    """
+    from .scheduler import dispatch_pending_runs, execute_report_run
+
+    try:
+        return execute_report_run(run_id)
+    finally:
+        dispatch_pending_runs()
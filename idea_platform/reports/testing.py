@@ -0,0 +1,46 @@
+"""
+أدوات مساعدة لاختبارات التقارير
+"""
+import threading
+
+
+class FakeAnalyticsBackend:
+    """
+    مصدر Google Analytics وهمي للاختبارات
+
+    يعيد صفاً واحداً لكل يوم بقيم ثابتة، ويحسب عدد مرات الجلب. يمكن ضبط
+    delay لمحاكاة بطء الـ API و error لمحاكاة فشله.
+    """
+    rows = {'20251001': ('100', '200', '300')}
+
+    def __init__(self, delay=0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._release = threading.Event()
+        self._release.set()
+
+    def hold(self):
+        """إيقاف الجلب حتى release() لاختبار الطلبات المتزامنة"""
+        self._release.clear()
+
+    def release(self):
+        self._release.set()
+
+    def fetch(self, view_id, start_date, end_date, metrics, dimensions):
+        with self._lock:
+            self.calls += 1
+        self._release.wait(timeout=5)
+        if self.error is not None:
+            raise self.error
+        return {
+            'reports': [{
+                'data': {
+                    'rows': [
+                        {'dimensions': [day], 'metrics': [{'values': list(values)}]}
+                        for day, values in self.rows.items()
+                    ]
+                }
+            }]
+        }
@@ -1,11 +1,10 @@
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from datetime import date, timedelta
 from django.utils import timezone
-import uuid
 
-from .models import Report, ReportTemplate, ScheduledReport, ReportType, ReportStatus, ReportFrequency, DataSource
+from .models import Report, ReportTemplate, ScheduledReport, ReportType, ReportStatus, ReportFrequency
 
 User = get_user_model()
 
@@ -14,26 +13,26 @@ class ReportModelsTestCase(TestCase):
 
     def setUp(self):
         """إعداد بيانات الاختبار"""
-        self.user = User.objects.create_user(username=\'testuser\', password=\'password\')
+        self.user = User.objects.create_user(username='testuser', password='password')
         self.template = ReportTemplate.objects.create(
-            name=\'Project Performance Template\',
+            name='Project Performance Template',
             report_type=ReportType.PROJECT_PERFORMANCE,
-            html_template=\'<h1>Project Report</h1>\',
+            html_template='<h1>Project Report</h1>',
             created_by=self.user
         )
 
     def test_create_report(self):
         """اختبار إنشاء تقرير جديد"""
         report = Report.objects.create(
-            title=\'Monthly Project Summary\',
+            title='Monthly Project Summary',
             template=self.template,
             start_date=date.today() - timedelta(days=30),
             end_date=date.today(),
             generated_by=self.user,
-            raw_data={\'projects_count\': 10, \'completed_projects\': 8},
-            summary_stats={\'avg_completion_rate\': 0.8}
+            raw_data={'projects_count': 10, 'completed_projects': 8},
+            summary_stats={'avg_completion_rate': 0.8}
         )
-        self.assertEqual(report.title, \'Monthly Project Summary\')
+        self.assertEqual(report.title, 'Monthly Project Summary')
         self.assertEqual(report.status, ReportStatus.PENDING)
         self.assertTrue(report.raw_data)
         self.assertTrue(report.summary_stats)
@@ -41,7 +40,7 @@ class ReportModelsTestCase(TestCase):
     def test_report_properties(self):
         """اختبار خصائص التقرير"""
         report = Report.objects.create(
-            title=\'Test Report\',
+            title='Test Report',
             template=self.template,
             start_date=date.today() - timedelta(days=7),
             end_date=date.today(),
@@ -54,26 +53,26 @@ class ReportModelsTestCase(TestCase):
         self.assertIsNotNone(report.generation_duration)
         self.assertFalse(report.has_files) # No files uploaded yet
 
-        report.pdf_file = \'reports/pdf/test_report.pdf\'
+        report.pdf_file = 'reports/pdf/test_report.pdf'
         report.save()
         self.assertTrue(report.has_files)
 
     def test_create_scheduled_report(self):
         """اختبار إنشاء تقرير مجدول"""
         scheduled_report = ScheduledReport.objects.create(
-            name=\'Weekly Client Report\',
+            name='Weekly Client Report',
             template=self.template,
             schedule_type=ReportFrequency.WEEKLY,
             created_by=self.user
         )
-        self.assertEqual(scheduled_report.name, \'Weekly Client Report\')
+        self.assertEqual(scheduled_report.name, 'Weekly Client Report')
         self.assertEqual(scheduled_report.schedule_type, ReportFrequency.WEEKLY)
         self.assertTrue(scheduled_report.is_active)
 
     def test_scheduled_report_next_run_calculation(self):
         """اختبار حساب وقت التشغيل التالي للتقرير المجدول"""
         scheduled_report = ScheduledReport.objects.create(
-            name=\'Daily Report\',
+            name='Daily Report',
             template=self.template,
             schedule_type=ReportFrequency.DAILY,
             created_by=self.user
@@ -83,7 +82,7 @@ class ReportModelsTestCase(TestCase):
 
         scheduled_report.calculate_next_run()
         self.assertIsNotNone(scheduled_report.next_run_at)
-        # Check if it\'s approximately one day from now (allowing for slight time differences)
+        # Check if it's approximately one day from now (allowing for slight time differences)
         self.assertLessEqual(scheduled_report.next_run_at - timezone.now(), timedelta(days=1, seconds=1))
         self.assertGreaterEqual(scheduled_report.next_run_at - timezone.now(), timedelta(days=1, seconds=-1))
 
@@ -96,28 +95,28 @@ class ReportModelsTestCase(TestCase):
 
     def test_report_template_str(self):
         """اختبار دالة __str__ لقالب التقرير"""
-        self.assertEqual(str(self.template), \'Project Performance Template\')
+        self.assertEqual(str(self.template), 'Project Performance Template')
 
     def test_report_str(self):
         """اختبار دالة __str__ للتقرير"""
         report = Report.objects.create(
-            title=\'Daily Summary\',
+            title='Daily Summary',
             template=self.template,
             start_date=date(2025, 10, 1),
             end_date=date(2025, 10, 1),
             generated_by=self.user
         )
-        self.assertEqual(str(report), \'Daily Summary - 2025-10-01 إلى 2025-10-01\')
+        self.assertEqual(str(report), 'Daily Summary - 2025-10-01 إلى 2025-10-01')
 
     def test_scheduled_report_str(self):
         """اختبار دالة __str__ للتقرير المجدول"""
         scheduled_report = ScheduledReport.objects.create(
-            name=\'Quarterly Review\',
+            name='Quarterly Review',
             template=self.template,
             schedule_type=ReportFrequency.QUARTERLY,
             created_by=self.user
         )
-        self.assertEqual(str(scheduled_report), \'Quarterly Review\')
+        self.assertEqual(str(scheduled_report), 'Quarterly Review')
 
 
 
@@ -131,17 +130,17 @@ class ReportAPITestCase(APITestCase):
     """مجموعة اختبارات لواجهات برمجة تطبيقات التقارير"""
 
     def setUp(self):
-        self.user = User.objects.create_user(username=\'testuser\', password=\'password\')
+        self.user = User.objects.create_user(username='testuser', password='password')
         self.client.force_authenticate(user=self.user)
 
         self.template = ReportTemplate.objects.create(
-            name=\'API Test Template\',
+            name='API Test Template',
             report_type=ReportType.CUSTOM,
-            html_template=\'<div>Report Content</div>\',
+            html_template='<div>Report Content</div>',
             created_by=self.user
         )
         self.report = Report.objects.create(
-            title=\'API Test Report\',
+            title='API Test Report',
             template=self.template,
             start_date=date.today() - timedelta(days=7),
             end_date=date.today(),
@@ -149,113 +148,113 @@ class ReportAPITestCase(APITestCase):
             status=ReportStatus.COMPLETED
         )
         self.scheduled_report = ScheduledReport.objects.create(
-            name=\'API Scheduled Report\',
+            name='API Scheduled Report',
             template=self.template,
             schedule_type=ReportFrequency.MONTHLY,
             created_by=self.user
         )
 
     def test_report_template_list_create_api_view(self):
-        url = reverse(\'reporttemplate-list\')
+        url = reverse('reporttemplate-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
         new_template_data = {
-            \"name\": \"New Template\",
-            \"report_type\": \"financial\",
-            \"html_template\": \"<h1>Financial Report</h1>\",
-            \"created_by\": self.user.id
+            "name": "New Template",
+            "report_type": "financial",
+            "html_template": "<h1>Financial Report</h1>",
+            "created_by": self.user.id
         }
-        response = self.client.post(url, new_template_data, format=\'json\')
+        response = self.client.post(url, new_template_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(ReportTemplate.objects.count(), 2)
 
     def test_report_list_create_api_view(self):
-        url = reverse(\'report-list\')
+        url = reverse('report-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
         new_report_data = {
-            \"title\": \"New Report\",
-            \"template\": self.template.id,
-            \"start_date\": date.today().isoformat(),
-            \"end_date\": date.today().isoformat(),
-            \"generated_by\": self.user.id
+            "title": "New Report",
+            "template": self.template.id,
+            "start_date": date.today().isoformat(),
+            "end_date": date.today().isoformat(),
+            "generated_by": self.user.id
         }
-        response = self.client.post(url, new_report_data, format=\'json\')
+        response = self.client.post(url, new_report_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Report.objects.count(), 2)
 
-    @patch(\'idea_platform.reports.views.initialize_analytics_reporting\')
-    @patch(\'idea_platform.reports.views.get_analytics_data\')
+    @patch('idea_platform.reports.views.initialize_analytics_reporting')
+    @patch('idea_platform.reports.views.get_analytics_data')
     def test_analytics_dashboard_api_view(self, mock_get_analytics_data, mock_initialize_analytics_reporting):
         mock_initialize_analytics_reporting.return_value = True
         mock_get_analytics_data.return_value = {
-            \'reports\': [{
-                \'data\': {
-                    \'rows\': [{
-                        \'dimensions\': [\'20251001\'],
-                        \'metrics\': [{\'values\': [\'100\', \'200\', \'300\]}]}
+            'reports': [{
+                'data': {
+                    'rows': [{
+                        'dimensions': ['20251001'],
+                        'metrics': [{'values': ['100', '200', '300']}]
                     }]
                 }
             }]
         }
         
-        url = reverse(\'analytics-dashboard\')
+        url = reverse('analytics-dashboard')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIn(\'overview\', response.data)
-        self.assertIn(\'monthly_performance\', response.data)
-        self.assertIn(\'google_analytics\', response.data)
-        self.assertEqual(response.data[\"google_analytics\"][\'20251001\"][\'users\'], \"100\")
+        self.assertIn('overview', response.data)
+        self.assertIn('monthly_performance', response.data)
+        self.assertIn('google_analytics', response.data)
+        self.assertEqual(response.data["google_analytics"]['20251001']['users'], "100")
 
     def test_generate_report_pdf_view(self):
-        url = reverse(\'generatereportpdf-detail\', kwargs={\'pk\': self.report.id})
+        url = reverse('generatereportpdf-detail', kwargs={'pk': self.report.id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response[\'Content-Type\'], \'application/pdf\')
-        self.assertTrue(f\'attachment; filename=\"Report_{self.report.title.replace(\' \', \'_\')}.pdf\"\' in response[\'Content-Disposition\'])
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(f'attachment; filename="Report_{self.report.title.replace(" ", "_")}.pdf"' in response['Content-Disposition'])
 
 
 class ReportIntegrationTestCase(APITestCase):
     """مجموعة اختبارات التكامل لنظام التقارير"""
 
     def setUp(self):
-        self.user = User.objects.create_user(username=\'testuser\', password=\'password\')
+        self.user = User.objects.create_user(username='testuser', password='password')
         self.client.force_authenticate(user=self.user)
 
         self.template = ReportTemplate.objects.create(
-            name=\'Integration Test Template\',
+            name='Integration Test Template',
             report_type=ReportType.PROJECT_PERFORMANCE,
-            html_template=\'<div>Integration Report Content</div>\',
+            html_template='<div>Integration Report Content</div>',
             created_by=self.user
         )
 
     def test_report_creation_with_template_details(self):
-        url = reverse(\'report-list\')
+        url = reverse('report-list')
         new_report_data = {
-            \"title\": \"Integration Report\",
-            \"template\": self.template.id,
-            \"start_date\": date.today().isoformat(),
-            \"end_date\": date.today().isoformat(),
-            \"generated_by\": self.user.id,
-            \"status\": ReportStatus.COMPLETED
+            "title": "Integration Report",
+            "template": self.template.id,
+            "start_date": date.today().isoformat(),
+            "end_date": date.today().isoformat(),
+            "generated_by": self.user.id,
+            "status": ReportStatus.COMPLETED
         }
-        response = self.client.post(url, new_report_data, format=\'json\')
+        response = self.client.post(url, new_report_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        report_id = response.data[\"id\"]
+        report_id = response.data["id"]
 
-        retrieve_url = reverse(\'report-detail\', kwargs={\'pk\': report_id})
+        retrieve_url = reverse('report-detail', kwargs={'pk': report_id})
         retrieve_response = self.client.get(retrieve_url)
         self.assertEqual(retrieve_response.status_code, status.HTTP_200_OK)
-        self.assertIn(\'template_details\', retrieve_response.data)
-        self.assertEqual(retrieve_response.data[\"template_details\"][\'name\'], \"Integration Test Template\")
+        self.assertIn('template_details', retrieve_response.data)
+        self.assertEqual(retrieve_response.data["template_details"]['name'], "Integration Test Template")
 
     def test_scheduled_report_next_run_logic(self):
         scheduled_report = ScheduledReport.objects.create(
-            name=\'Daily Scheduled Integration Report\',
+            name='Daily Scheduled Integration Report',
             template=self.template,
             schedule_type=ReportFrequency.DAILY,
             created_by=self.user
@@ -264,10 +263,500 @@ class ReportIntegrationTestCase(APITestCase):
 
         scheduled_report.calculate_next_run()
         self.assertIsNotNone(scheduled_report.next_run_at)
-        # Check if it\'s approximately one day from now (allowing for slight time differences)
+        # Check if it's approximately one day from now (allowing for slight time differences)
         self.assertLessEqual(scheduled_report.next_run_at - timezone.now(), timedelta(days=1, seconds=1))
         self.assertGreaterEqual(scheduled_report.next_run_at - timezone.now(), timedelta(days=1, seconds=-1))
 
 
 
 
+
+
+
+from decimal import Decimal
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+
+from idea_platform.billing.models import Invoice, InvoiceItem, Payment
+from idea_platform.crm.models import Client
+from idea_platform.projects.models import Project
+from .metrics import AnalyticsBucket, AnalyticsDirtyDay, BucketGranularity, dashboard_metrics, refresh_dirty_periods
+
+
+@override_settings(BILLING_PDF_PRERENDER=False)
+class AnalyticsMetricsTestCase(TestCase):
+    """مجموعة اختبارات مخزن مؤشرات لوحة التحليلات"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_obj = Client.objects.create(name='Metrics Client', email='metrics@example.com', created_by=self.user)
+            Project.objects.create(name='Metrics Project', client=self.client_obj, created_by=self.user)
+            self.invoice = Invoice.objects.create(
+                invoice_number='INV-MET-001',
+                client=self.client_obj,
+                created_by=self.user,
+                title='Metrics Invoice',
+                issue_date=timezone.localdate(),
+                due_date=timezone.localdate() + timedelta(days=30)
+            )
+            InvoiceItem.objects.create(
+                invoice=self.invoice,
+                description='Service',
+                quantity=Decimal('2'),
+                unit_price=Decimal('50.00')
+            )
+            Payment.objects.create(invoice=self.invoice, amount=Decimal('40.00'), created_by=self.user)
+
+    def test_refresh_only_dirty_periods(self):
+        self.assertTrue(AnalyticsDirtyDay.objects.exists())
+        self.assertEqual(refresh_dirty_periods(), 1)
+        self.assertFalse(AnalyticsDirtyDay.objects.exists())
+        self.assertEqual(refresh_dirty_periods(), 0)
+
+        month = AnalyticsBucket.objects.get(
+            granularity=BucketGranularity.MONTH, period_start=timezone.localdate().replace(day=1)
+        )
+        self.assertEqual(month.revenue, Decimal('40.00'))
+        self.assertEqual(month.invoices_count, 1)
+        self.assertEqual(month.projects_count, 1)
+        self.assertEqual(month.clients_count, 1)
+
+    def test_moved_issue_date_refreshes_both_days(self):
+        refresh_dirty_periods()
+        old_day = self.invoice.issue_date
+        new_day = old_day - timedelta(days=40)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice.issue_date = new_day
+            self.invoice.save()
+
+        self.assertEqual(set(AnalyticsDirtyDay.objects.values_list('day', flat=True)), {old_day, new_day})
+        refresh_dirty_periods()
+        day = AnalyticsBucket.objects.get(granularity=BucketGranularity.DAY, period_start=old_day)
+        self.assertEqual(day.invoices_count, 0)
+        self.assertEqual(day.invoiced_amount, Decimal('0.00'))
+
+    def test_item_change_marks_issue_day(self):
+        refresh_dirty_periods()
+        with self.captureOnCommitCallbacks(execute=True):
+            InvoiceItem.objects.create(
+                invoice=self.invoice, description='Extra', quantity=Decimal('1'), unit_price=Decimal('10.00')
+            )
+        self.assertEqual(
+            list(AnalyticsDirtyDay.objects.values_list('day', flat=True)), [self.invoice.issue_date]
+        )
+
+    def test_marks_wait_for_commit(self):
+        refresh_dirty_periods()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Payment.objects.create(invoice=self.invoice, amount=Decimal('5.00'), created_by=self.user)
+        self.assertFalse(AnalyticsDirtyDay.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(AnalyticsDirtyDay.objects.count(), 1)
+
+    def test_failed_refresh_keeps_days(self):
+        with patch('idea_platform.reports.metrics.refresh_months', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                refresh_dirty_periods()
+        self.assertEqual(AnalyticsDirtyDay.objects.count(), 1)
+
+    def test_dashboard_reads_precomputed_rows(self):
+        refresh_dirty_periods()
+
+        with CaptureQueriesContext(connection) as context:
+            data = dashboard_metrics()
+
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertEqual(data['overview']['current_month']['revenue'], Decimal('40.00'))
+        self.assertEqual(data['monthly_performance'][-1]['month'], timezone.localdate().strftime('%Y-%m'))
+        self.assertEqual(data['daily_performance'][-1]['date'], timezone.localdate().isoformat())
+
+
+
+import threading
+from datetime import datetime
+
+from django.core.cache import cache
+
+from .ga_cache import DEFAULT_DIMENSIONS, DEFAULT_METRICS, AnalyticsCache, parse_daily_rows
+from .testing import FakeAnalyticsBackend
+
+
+class InlineExecutor:
+    """تنفيذ التحديث في الخلفية مباشرة لتسهيل الاختبار"""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class AnalyticsCacheTestCase(TestCase):
+    """مجموعة اختبارات ذاكرة ردود Google Analytics"""
+
+    def setUp(self):
+        cache.clear()
+        self.backend = FakeAnalyticsBackend()
+        self.ga = AnalyticsCache(backend=self.backend, ttl=60, stale_ttl=600)
+        self.args = ('12345', date(2025, 10, 1), date(2025, 10, 31))
+
+    def test_fresh_response_is_served_from_cache(self):
+        first = self.ga.get(*self.args)
+        second = self.ga.get(*self.args)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.backend.calls, 1)
+        self.assertEqual(parse_daily_rows(first)['20251001']['users'], '100')
+
+    def test_key_includes_metrics_and_range(self):
+        self.ga.get(*self.args)
+        self.ga.get(*self.args, metrics=('ga:users',))
+        self.ga.get('12345', date(2025, 9, 1), date(2025, 9, 30))
+
+        self.assertEqual(self.backend.calls, 3)
+
+    def test_stale_response_is_served_while_revalidating(self):
+        self.ga.get(*self.args)
+        self.ga._executor = InlineExecutor()
+        self.backend.rows = {'20251001': ('150', '250', '350')}
+        with patch('idea_platform.reports.ga_cache.time.time', return_value=datetime.now().timestamp() + 120):
+            stale = self.ga.get(*self.args)
+
+        self.assertEqual(parse_daily_rows(stale)['20251001']['users'], '100')
+        self.assertEqual(self.backend.calls, 2)
+        self.assertEqual(parse_daily_rows(self.ga.get(*self.args))['20251001']['users'], '150')
+
+    def test_failed_revalidation_keeps_stale_response(self):
+        self.ga.get(*self.args)
+        self.ga._executor = InlineExecutor()
+        self.backend.error = RuntimeError('GA unavailable')
+        with patch('idea_platform.reports.ga_cache.time.time', return_value=datetime.now().timestamp() + 120):
+            self.ga.get(*self.args)
+            stale = self.ga.get(*self.args)
+
+        self.assertEqual(parse_daily_rows(stale)['20251001']['users'], '100')
+
+    def test_concurrent_requests_share_one_fetch(self):
+        self.backend.hold()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.ga.get(*self.args)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        self.backend.release()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.backend.calls, 1)
+
+    def test_wait_timeout_keeps_other_process_lock(self):
+        key = self.ga.make_key(*self.args, DEFAULT_METRICS, DEFAULT_DIMENSIONS)
+        cache.set(f'{key}:lock', 1, 60)
+        with patch.object(self.ga, '_wait_for', return_value=None):
+            self.ga.get(*self.args)
+
+        self.assertEqual(self.backend.calls, 1)
+        self.assertEqual(cache.get(f'{key}:lock'), 1)
+
+
+import random
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+from .streaming import (
+    RunningStats, build_streaming_report, generate_project_performance_report, iter_report_rows,
+    report_spill_path,
+)
+
+
+class StreamingReportTestCase(TestCase):
+    """مجموعة اختبارات محرك التقارير المتدفق"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.template = ReportTemplate.objects.create(
+            name='Streaming Template',
+            report_type=ReportType.PROJECT_PERFORMANCE,
+            html_template='<h1>Report</h1>',
+            created_by=self.user
+        )
+        self.report = Report.objects.create(
+            title='Streaming Report',
+            template=self.template,
+            start_date=date.today() - timedelta(days=30),
+            end_date=date.today(),
+            generated_by=self.user
+        )
+        self.storage = FileSystemStorage(location=tempfile.mkdtemp())
+
+    def test_running_stats_quantiles(self):
+        stats = RunningStats(quantiles=(0.5, 0.9))
+        values = list(range(1, 10001))
+        random.Random(1).shuffle(values)
+        for value in values:
+            stats.add(value)
+
+        result = stats.as_dict()
+        self.assertEqual(result['count'], 10000)
+        self.assertEqual(result['sum'], 50005000)
+        self.assertEqual(result['min'], 1)
+        self.assertEqual(result['max'], 10000)
+        self.assertAlmostEqual(result['quantiles']['p50'], 5000, delta=100)
+        self.assertAlmostEqual(result['quantiles']['p90'], 9000, delta=100)
+
+    def test_decimal_sum_is_exact(self):
+        stats = RunningStats()
+        for _ in range(100000):
+            stats.add(Decimal('0.10'))
+
+        result = stats.as_dict()
+        self.assertEqual(result['sum'], '10000.00')
+        self.assertEqual(result['mean'], '0.1000')
+        self.assertEqual(result['min'], '0.10')
+
+    def test_rows_are_spilled_to_columnar_file(self):
+        chunks = (
+            [{'id': i, 'amount': Decimal(i), 'status': 'active' if i % 2 else 'done'} for i in range(start, start + 100)]
+            for start in range(0, 1000, 100)
+        )
+        summary = build_streaming_report(
+            self.report, chunks, ('id', 'amount', 'status'),
+            numeric_fields=('amount',), category_fields=('status',), storage=self.storage
+        )
+
+        self.report.refresh_from_db()
+        self.assertEqual(summary['row_count'], 1000)
+        self.assertEqual(Decimal(summary['numeric']['amount']['sum']), Decimal('499500'))
+        self.assertEqual(summary['categories']['status'], {'done': 500, 'active': 500})
+        self.assertEqual(self.report.raw_data['storage'], 'columnar')
+        self.assertNotIn('rows', self.report.raw_data)
+
+        chunks = list(iter_report_rows(self.report, columns=['id'], storage=self.storage))
+        self.assertEqual(len(chunks), 10)
+        self.assertEqual(chunks[-1][-1], {'id': 999})
+
+    def test_legacy_raw_data_is_still_readable(self):
+        self.report.raw_data = {'rows': [{'id': 1}]}
+        self.assertEqual(list(iter_report_rows(self.report)), [[{'id': 1}]])
+
+    def test_project_performance_report(self):
+        client = Client.objects.create(name='Stream Client', email='stream@example.com', created_by=self.user)
+        for i in range(3):
+            Project.objects.create(name=f'Project {i}', client=client, created_by=self.user)
+
+        with patch('idea_platform.reports.streaming.default_storage', self.storage):
+            summary = generate_project_performance_report(self.report, chunk_size=2)
+            rows = [row for chunk in iter_report_rows(self.report) for row in chunk]
+
+        self.report.refresh_from_db()
+        self.assertEqual(summary['row_count'], 3)
+        self.assertEqual(self.report.status, ReportStatus.COMPLETED)
+        self.assertIsNotNone(self.report.generation_duration)
+        self.assertEqual({row['client__name'] for row in rows}, {'Stream Client'})
+
+
+from .scheduler import (
+    ReportRun, ReportRunState, claim_due_schedules, dispatch_pending_runs, execute_report_run,
+)
+
+
+class ScheduledReportExecutorTestCase(TestCase):
+    """مجموعة اختبارات تنفيذ التقارير المجدولة"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.template = ReportTemplate.objects.create(
+            name='Scheduled Template',
+            report_type=ReportType.PROJECT_PERFORMANCE,
+            html_template='<h1>Report</h1>',
+            created_by=self.user
+        )
+        self.now = timezone.now()
+
+    def schedule(self, **kwargs):
+        kwargs.setdefault('schedule_type', ReportFrequency.DAILY)
+        kwargs.setdefault('next_run_at', self.now - timedelta(hours=1))
+        return ScheduledReport.objects.create(
+            name='Daily', template=self.template, created_by=self.user, **kwargs
+        )
+
+    def test_missed_runs_are_caught_up(self):
+        schedule = self.schedule(next_run_at=self.now - timedelta(days=2, hours=1))
+
+        self.assertEqual(claim_due_schedules(now=self.now), 3)
+
+        schedule.refresh_from_db()
+        self.assertGreater(schedule.next_run_at, self.now)
+        self.assertEqual(claim_due_schedules(now=self.now), 0)
+
+    @override_settings(REPORTS_SCHEDULE_MAX_CATCHUP=2)
+    def test_catch_up_is_bounded(self):
+        self.schedule(next_run_at=self.now - timedelta(days=10))
+        self.assertEqual(claim_due_schedules(now=self.now), 2)
+
+    def test_identical_runs_are_deduplicated(self):
+        self.schedule()
+        self.schedule()
+
+        self.assertEqual(claim_due_schedules(now=self.now), 1)
+        self.assertEqual(ReportRun.objects.count(), 1)
+
+    @override_settings(REPORTS_MAX_CONCURRENT_PER_TEMPLATE=1)
+    def test_dispatch_respects_template_concurrency(self):
+        self.schedule(next_run_at=self.now - timedelta(days=2, hours=1))
+        claim_due_schedules(now=self.now)
+
+        with patch('idea_platform.reports.tasks.execute_report_run_task.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatched = dispatch_pending_runs(now=self.now)
+            self.assertEqual(len(dispatched), 1)
+            delay.assert_called_once_with(dispatched[0])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(dispatch_pending_runs(now=self.now), [])
+
+        self.assertEqual(ReportRun.objects.filter(state=ReportRunState.PENDING).count(), 2)
+
+    @override_settings(REPORTS_RUN_TIMEOUT=60, REPORTS_RUN_MAX_ATTEMPTS=2)
+    def test_stuck_run_fails_after_max_attempts(self):
+        self.schedule()
+        claim_due_schedules(now=self.now)
+        run = ReportRun.objects.get()
+
+        with patch('idea_platform.reports.tasks.execute_report_run_task.delay'):
+            for minutes in (0, 2):
+                dispatch_pending_runs(now=self.now + timedelta(minutes=minutes))
+                run.refresh_from_db()
+                self.assertEqual(run.state, ReportRunState.RUNNING)
+            self.assertEqual(dispatch_pending_runs(now=self.now + timedelta(minutes=4)), [])
+
+        run.refresh_from_db()
+        self.assertEqual(run.state, ReportRunState.FAILED)
+        self.assertEqual(run.attempts, 2)
+        self.assertTrue(run.error)
+
+    def test_execute_run_records_generation_times(self):
+        self.schedule()
+        claim_due_schedules(now=self.now)
+        with patch('idea_platform.reports.tasks.execute_report_run_task.delay'):
+            run_id = dispatch_pending_runs(now=self.now)[0]
+
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        with patch('idea_platform.reports.streaming.default_storage', storage):
+            self.assertEqual(execute_report_run(run_id), ReportRunState.COMPLETED)
+
+        run = ReportRun.objects.select_related('report').get(pk=run_id)
+        self.assertIsNotNone(run.report.generation_started_at)
+        self.assertIsNotNone(run.report.generation_duration)
+        self.assertEqual(run.report.status, ReportStatus.COMPLETED)
+
+    def dispatch_one(self):
+        self.schedule()
+        claim_due_schedules(now=self.now)
+        with patch('idea_platform.reports.tasks.execute_report_run_task.delay'):
+            return dispatch_pending_runs(now=self.now)[0]
+
+    def test_failed_run_fails_report(self):
+        run_id = self.dispatch_one()
+        with patch('idea_platform.reports.scheduler.generate_report', side_effect=RuntimeError('boom')):
+            self.assertEqual(execute_report_run(run_id), ReportRunState.FAILED)
+
+        report = ReportRun.objects.select_related('report').get(pk=run_id).report
+        self.assertEqual(report.status, ReportStatus.FAILED)
+        self.assertEqual(report.summary_stats, {'error': 'boom'})
+        self.assertIsNotNone(report.generation_completed_at)
+
+    def test_superseded_attempt_does_not_write_result(self):
+        run_id = self.dispatch_one()
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+
+        def redispatch(*args, **kwargs):
+            # أُعيد التشغيل لعامل آخر أثناء التنفيذ
+            ReportRun.objects.filter(pk=run_id).update(attempts=F('attempts') + 1)
+            return iter([])
+
+        with patch('idea_platform.reports.streaming.default_storage', storage), \
+                patch('idea_platform.reports.streaming.project_performance_chunks', side_effect=redispatch):
+            self.assertEqual(execute_report_run(run_id), ReportRunState.RUNNING)
+
+        run = ReportRun.objects.select_related('report').get(pk=run_id)
+        self.assertEqual(run.state, ReportRunState.RUNNING)
+        self.assertFalse(run.report.raw_data)
+        self.assertFalse(storage.exists(report_spill_path(run.report)))
+
+
+from .result_cache import generate_with_cache, reset_result_cache_stats, result_cache_stats
+
+
+@override_settings(REPORTS_RESULT_CACHE_ALIAS='default')
+class ReportResultCacheTestCase(TestCase):
+    """مجموعة اختبارات ذاكرة نتائج التقارير"""
+
+    def setUp(self):
+        cache.clear()
+        reset_result_cache_stats()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.template = ReportTemplate.objects.create(
+            name='Cached Template',
+            report_type=ReportType.PROJECT_PERFORMANCE,
+            html_template='<h1>Report</h1>',
+            created_by=self.user
+        )
+        self.calls = 0
+
+    def new_report(self):
+        return Report.objects.create(
+            title='Cached Report',
+            template=self.template,
+            start_date=date(2025, 10, 1),
+            end_date=date(2025, 10, 31),
+            generated_by=self.user
+        )
+
+    def generator(self, report):
+        self.calls += 1
+        report.raw_data = {'rows': [{'id': self.calls}]}
+        report.summary_stats = {'row_count': 1}
+        report.status = ReportStatus.COMPLETED
+        report.save()
+        return report.summary_stats
+
+    def test_identical_report_reuses_result(self):
+        generate_with_cache(self.new_report(), self.generator)
+        second = self.new_report()
+        generate_with_cache(second, self.generator)
+
+        second.refresh_from_db()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second.raw_data, {'rows': [{'id': 1}]})
+        self.assertEqual(second.status, ReportStatus.COMPLETED)
+        self.assertEqual(result_cache_stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    @override_settings(REPORTS_RESULT_CACHE_ALIAS=None, SHARED_CACHE_ALIAS=None)
+    def test_no_reuse_without_shared_cache(self):
+        generate_with_cache(self.new_report(), self.generator)
+        generate_with_cache(self.new_report(), self.generator)
+
+        self.assertEqual(self.calls, 2)
+
+    def test_source_change_invalidates_result(self):
+        generate_with_cache(self.new_report(), self.generator)
+        with self.captureOnCommitCallbacks(execute=True):
+            Client.objects.create(name='New Client', email='new@example.com', created_by=self.user)
+        generate_with_cache(self.new_report(), self.generator)
+
+        self.assertEqual(self.calls, 2)
+
+    def test_template_change_invalidates_result(self):
+        generate_with_cache(self.new_report(), self.generator)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.template.html_template = '<h1>Changed</h1>'
+            self.template.save()
+        generate_with_cache(self.new_report(), self.generator)
+
+        self.assertEqual(self.calls, 2)
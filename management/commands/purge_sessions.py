@@ -0,0 +1,31 @@
+"""
+أمر تطبيق سياسة الاحتفاظ بجلسات المستخدمين
+"""
+
+from django.core.management.base import BaseCommand
+
+from ...session_retention import apply_session_retention
+
+
+class Command(BaseCommand):
+    help = 'إنهاء الجلسات الخاملة وأرشفة المنتهية وحذف المؤرشفة القديمة على دفعات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-days', type=int, help='إنهاء الجلسات الخاملة منذ هذا العدد من الأيام')
+        parser.add_argument('--archive-days', type=int, help='أرشفة الجلسات المنتهية منذ هذا العدد من الأيام')
+        parser.add_argument('--purge-days', type=int, help='حذف الجلسات المؤرشفة الأقدم من هذا العدد من الأيام')
+        parser.add_argument('--batch-size', type=int, default=1000, help='عدد الصفوف في كل دفعة')
+        parser.add_argument('--pause', type=float, default=0, help='ثوانٍ للانتظار بين الدفعات')
+        parser.add_argument('--dry-run', action='store_true', help='عرض الأعداد دون تعديل')
+
+    def handle(self, *args, **options):
+        result = apply_session_retention(
+            idle_days=options['idle_days'],
+            archive_days=options['archive_days'],
+            purge_days=options['purge_days'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        for stage, count in result.items():
+            self.stdout.write(self.style.SUCCESS(f'{stage}: {count}'))
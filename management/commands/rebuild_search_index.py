@@ -0,0 +1,28 @@
+"""
+أمر إعادة بناء نصوص البحث للمستخدمين والأدوار
+"""
+
+from django.core.management.base import BaseCommand
+
+from ...models import CustomUser, Role
+from ...search import ensure_search_indexes, rebuild_search_documents
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء نصوص البحث المطبّعة وفهارس البحث للمستخدمين والأدوار'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='عدد السجلات المحدثة في كل دفعة'
+        )
+
+    def handle(self, *args, **options):
+        ensure_search_indexes()
+        for model in (CustomUser, Role):
+            updated = rebuild_search_documents(model, batch_size=options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(f'{model._meta.verbose_name_plural}: {updated}')
+            )
@@ -9,12 +9,46 @@
 
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import RegexValidator
 import uuid
 
+from .permission_cache import get_role_permission_names, get_role_permissions
+from .search import build_search_document
 
-class Role(models.Model):
+
+class SearchableModel(models.Model):
+    """
+    نموذج مجرد يحتفظ بنص بحث مطبّع (search_document) محدث عند كل حفظ
+    
+    تحدد النماذج الوارثة الحقول الداخلة في البحث عبر search_fields.
+    """
+    
+    search_fields = ()
+    
+    search_document = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name=_('نص البحث')
+    )
+    
+    class Meta:
+        abstract = True
+    
+    def save(self, *args, **kwargs):
+        """تحديث نص البحث قبل الحفظ"""
+        self.search_document = build_search_document(self, self.search_fields)
+        
+        # عند الحفظ الجزئي نضيف نص البحث إذا تغير أحد حقوله
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.search_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_document'}
+        
+        super().save(*args, **kwargs)
+
+
+class Role(SearchableModel):
     """
     نموذج الأدوار في النظام
     يحدد الأدوار المختلفة للمستخدمين مثل: مدير عام، مدير مشاريع، مصمم، إلخ
@@ -33,6 +67,8 @@ class Role(models.Model):
         ('client', 'عميل'),
     ]
     
+    search_fields = ('name', 'display_name', 'description')
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(
         max_length=50,
@@ -76,15 +112,23 @@ class Role(models.Model):
     
     def get_permissions_list(self):
         """إرجاع قائمة بأسماء الصلاحيات"""
+        # استخدام الصلاحيات المحملة مسبقاً عبر prefetch_related إن وُجدت
+        if 'permissions' in getattr(self, '_prefetched_objects_cache', {}):
+            return [permission.codename for permission in self.permissions.all()]
         return list(self.permissions.values_list('codename', flat=True))
 
 
-class CustomUser(AbstractUser):
+class CustomUser(SearchableModel, AbstractUser):
     """
     نموذج المستخدم المخصص لمنصة أيديا
     يوسع نموذج المستخدم الافتراضي في Django
     """
     
+    search_fields = (
+        'username', 'email', 'arabic_first_name', 'arabic_last_name',
+        'first_name', 'last_name'
+    )
+    
     # معرف فريد للمستخدم
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     
@@ -189,14 +233,28 @@ class CustomUser(AbstractUser):
         return f"{self.first_name} {self.last_name}".strip()
     
     def get_role_permissions(self):
-        """الحصول على صلاحيات الدور"""
-        if self.role:
-            return self.role.get_permissions_list()
-        return []
-    
-    def has_role_permission(self, permission_codename):
-        """التحقق من وجود صلاحية معينة"""
-        return permission_codename in self.get_role_permissions()
+        """
+        الحصول على صلاحيات الدور
+        
+        تُحفظ النتيجة على كائن المستخدم طوال الطلب، وتُقرأ من ذاكرة
+        صلاحيات الأدوار المؤقتة دون الحاجة لتحميل الدور نفسه.
+        """
+        cached = self.__dict__.get('_role_permissions_cache')
+        if cached is None or cached[0] != self.role_id:
+            cached = (self.role_id, get_role_permissions(self.role_id))
+            self._role_permissions_cache = cached
+        return cached[1]
+    
+    def has_role_permission(self, permission):
+        """
+        التحقق من وجود صلاحية معينة
+        
+        تُقبل الصلاحية باسمها (codename) أو باسمها الكامل (app_label.codename)،
+        والاسم الكامل لا يطابق صلاحية بالاسم نفسه في تطبيق آخر.
+        """
+        if '.' in permission:
+            return permission in get_role_permission_names(self.role_id)
+        return permission in self.get_role_permissions()
 
 
 class UserProfile(models.Model):
@@ -307,8 +365,9 @@ class UserSession(models.Model):
         auto_now_add=True,
         verbose_name=_('تاريخ بداية الجلسة')
     )
+    # يُحدث عبر session_activity (كتابة مؤجلة) وليس مع كل حفظ للصف
     last_activity = models.DateTimeField(
-        auto_now=True,
+        default=timezone.now,
         verbose_name=_('آخر نشاط')
     )
     is_active = models.BooleanField(
@@ -320,6 +379,70 @@ class UserSession(models.Model):
         verbose_name = _('جلسة مستخدم')
         verbose_name_plural = _('جلسات المستخدمين')
         ordering = ['-last_activity']
+        indexes = [
+            # جلسات المستخدم النشطة مرتبة بآخر نشاط (UserSessionsView)
+            models.Index(
+                fields=['user', 'is_active', '-last_activity'],
+                name='users_session_user_active_idx'
+            ),
+            # مسح الجلسات المنتهية للأرشفة (session_retention)
+            models.Index(
+                fields=['is_active', 'last_activity'],
+                name='users_session_retention_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"جلسة {self.user.full_name_arabic} - {self.created_at}"
+
+
+class UserSessionArchive(models.Model):
+    """
+    أرشيف الجلسات المنتهية
+
+    تُنقل الجلسات غير النشطة إلى هذا الجدول بعد SESSION_RETENTION_ARCHIVE_DAYS
+    يوماً (انظر session_retention.py) فيبقى جدول الجلسات صغيراً، وتُحذف من
+    الأرشيف بعد SESSION_RETENTION_PURGE_DAYS يوماً.
+    """
+    
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='archived_sessions',
+        verbose_name=_('المستخدم')
+    )
+    session_key = models.CharField(
+        max_length=40,
+        verbose_name=_('مفتاح الجلسة')
+    )
+    ip_address = models.GenericIPAddressField(
+        verbose_name=_('عنوان IP')
+    )
+    user_agent = models.TextField(
+        verbose_name=_('معلومات المتصفح')
+    )
+    created_at = models.DateTimeField(
+        verbose_name=_('تاريخ بداية الجلسة')
+    )
+    last_activity = models.DateTimeField(
+        verbose_name=_('آخر نشاط')
+    )
+    archived_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name=_('تاريخ الأرشفة')
+    )
+    
+    class Meta:
+        verbose_name = _('جلسة مؤرشفة')
+        verbose_name_plural = _('الجلسات المؤرشفة')
+        ordering = ['-last_activity']
+        indexes = [
+            models.Index(
+                fields=['user', '-last_activity'],
+                name='users_archive_user_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"جلسة مؤرشفة {self.user_id} - {self.created_at}"
@@ -0,0 +1,195 @@
+"""
+أنظمة ترقيم الصفحات (Pagination) لواجهات API
+
+- KeysetCursorPagination: ترقيم بالمؤشر (keyset) دون COUNT أو OFFSET،
+  مناسب للتمرير اللانهائي في لوحات التحكم.
+- OptInCursorPagination: الترقيم الافتراضي بالصفحات، مع إمكانية اختيار
+  الترقيم بالمؤشر لكل طلب عبر ?pagination=cursor أو ?cursor=...
+"""
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    ترقيم بالمؤشر يعتمد على (حقل الترتيب، المفتاح الأساسي)
+
+    يُحدد حقل الترتيب من الخاصية cursor_ordering في الـ View، أو من ترتيب
+    الـ queryset، ويُستخدم المفتاح الأساسي (UUID غالباً) لفض التعادل بحيث
+    يبقى الترتيب ثابتاً حتى مع تكرار قيم حقل الترتيب.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    default_ordering = '-pk'
+    invalid_cursor_message = _('المؤشر غير صالح')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering_field, self.descending = self.get_ordering(queryset, view)
+
+        direction = '-' if self.descending else ''
+        queryset = queryset.order_by(
+            f'{direction}{self.ordering_field}', f'{direction}pk'
+        )
+
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(*cursor))
+
+        # جلب عنصر إضافي لمعرفة وجود صفحة تالية دون COUNT
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        self.next_cursor = None
+        if self.has_next and results:
+            last = results[-1]
+            self.next_cursor = self.encode_cursor(
+                getattr(last, self.ordering_field), last.pk
+            )
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('next_cursor', self.next_cursor),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        """حجم الصفحة مع احترام الحد الأقصى"""
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, queryset, view):
+        """
+        تحديد حقل الترتيب واتجاهه
+
+        Returns:
+            tuple: (اسم الحقل، هل الترتيب تنازلي)
+        """
+        ordering = getattr(view, 'cursor_ordering', None)
+        if not ordering:
+            candidates = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+            ordering = candidates[0] if candidates else self.default_ordering
+
+        if not isinstance(ordering, str):
+            ordering = self.default_ordering
+
+        descending = ordering.startswith('-')
+        field_name = ordering.lstrip('-')
+        if field_name == 'pk' or '__' in field_name:
+            return 'pk', descending
+        try:
+            queryset.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return 'pk', descending
+        return field_name, descending
+
+    def get_cursor_filter(self, value, pk):
+        """شرط الانتقال إلى ما بعد المؤشر"""
+        lookup = 'lt' if self.descending else 'gt'
+        if self.ordering_field == 'pk':
+            return Q(**{f'pk__{lookup}': pk})
+        return (
+            Q(**{f'{self.ordering_field}__{lookup}': value}) |
+            Q(**{self.ordering_field: value, f'pk__{lookup}': pk})
+        )
+
+    def encode_cursor(self, value, pk):
+        """ترميز المؤشر كنص آمن للاستخدام في الرابط"""
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        payload = json.dumps({'v': value, 'pk': str(pk)}, default=str)
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        """فك ترميز المؤشر وتحويل قيمه لأنواع الحقول"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            pk = model._meta.pk.to_python(payload['pk'])
+            if self.ordering_field == 'pk':
+                return None, pk
+            field = model._meta.get_field(self.ordering_field)
+            return field.to_python(payload['v']), pk
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """
+    ترقيم بالصفحات افتراضياً، مع اختيار الترقيم بالمؤشر لكل طلب
+
+    يكفي أن يرسل العميل ?pagination=cursor (أو ?cursor=...) للحصول على
+    صفحات بالمؤشر بدل أرقام الصفحات.
+    """
+    mode_query_param = 'pagination'
+    cursor_pagination_class = KeysetCursorPagination
+
+    def use_cursor(self, request):
+        """هل طلب العميل الترقيم بالمؤشر؟"""
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor' or
+            self.cursor_pagination_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_next_link()
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.cursor_paginator is not None:
+            return None
+        return super().get_previous_link()
@@ -0,0 +1,161 @@
+"""
+ذاكرة مؤقتة لصلاحيات الأدوار
+
+تمر قراءة صلاحيات الدور بالطبقات التالية قبل الوصول لقاعدة البيانات:
+- ذاكرة لكل طلب محفوظة على كائن المستخدم (انظر CustomUser.get_role_permissions)
+- ذاكرة LRU محلية داخل العملية
+- طبقة مشتركة اختيارية (مثل Redis) تُحدد عبر PERMISSION_CACHE_ALIAS
+
+جميع المفاتيح مرتبطة برقم إصدار الدور، ويُرفع الإصدار عند تغيير صلاحياته
+(إشارة m2m_changed) فتُهمل القيم القديمة في جميع الطبقات.
+
+بدون طبقة مشتركة يبقى الإصدار محلياً في كل عملية ولا يصل رفعه إلى العمليات
+الأخرى، لذا تنتهي عناصر الذاكرة المحلية بعد PERMISSION_CACHE_LOCAL_TTL ثانية
+فلا تستمر الصلاحيات الملغاة أكثر من ذلك.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+
+from .caching import bump_cache_version, get_cache_version
+
+
+ROLE_PERMISSIONS_NAMESPACE = 'role_permissions'
+
+
+class LRUCache:
+    """
+    ذاكرة LRU بسيطة وآمنة للاستخدام من عدة خيوط
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return None
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_prefix(self, prefix):
+        """حذف جميع المفاتيح التي تبدأ بالبادئة المحددة"""
+        with self._lock:
+            for key in [key for key in self._data if key.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LRUCache(
+    getattr(settings, 'PERMISSION_CACHE_LOCAL_SIZE', 1024),
+    getattr(settings, 'PERMISSION_CACHE_LOCAL_TTL', 30),
+)
+
+
+def _shared_cache():
+    """الطبقة المشتركة إن كانت مفعلة"""
+    alias = getattr(settings, 'PERMISSION_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _namespace(role_id):
+    return f'{ROLE_PERMISSIONS_NAMESPACE}:{role_id}'
+
+
+def _key_prefix(role_id):
+    return f'idea:role-permission-names:{role_id}:'
+
+
+def get_role_version(role_id):
+    """رقم الإصدار الحالي لصلاحيات الدور"""
+    return get_cache_version(_namespace(role_id), _shared_cache())
+
+
+def _load_role_permissions(role_id):
+    """
+    صلاحيات الدور من الطبقات المختلفة
+
+    Returns:
+        tuple: (أسماء الصلاحيات codename، الأسماء الكاملة app_label.codename)
+    """
+    shared = _shared_cache()
+    version = get_cache_version(_namespace(role_id), shared)
+    key = f'{_key_prefix(role_id)}{version}'
+
+    permissions = local_cache.get(key)
+    if permissions is not None:
+        return permissions
+
+    pairs = shared.get(key) if shared is not None else None
+    if pairs is None:
+        pairs = list(
+            Permission.objects.filter(role=role_id)
+            .values_list('content_type__app_label', 'codename')
+        )
+        if shared is not None:
+            shared.set(
+                key,
+                pairs,
+                timeout=getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 60 * 60)
+            )
+
+    permissions = (
+        frozenset(codename for _, codename in pairs),
+        frozenset(f'{app_label}.{codename}' for app_label, codename in pairs),
+    )
+    local_cache.set(key, permissions)
+    return permissions
+
+
+def get_role_permissions(role_id):
+    """
+    الحصول على أسماء صلاحيات الدور (codename)
+
+    Returns:
+        frozenset: مجموعة أسماء الصلاحيات
+    """
+    if role_id is None:
+        return frozenset()
+    return _load_role_permissions(role_id)[0]
+
+
+def get_role_permission_names(role_id):
+    """
+    الحصول على الأسماء الكاملة لصلاحيات الدور (app_label.codename)
+
+    Returns:
+        frozenset: مجموعة الأسماء بصيغة user.has_perm
+    """
+    if role_id is None:
+        return frozenset()
+    return _load_role_permissions(role_id)[1]
+
+
+def invalidate_role_permissions(role_id):
+    """إبطال صلاحيات الدور المخزنة في جميع الطبقات"""
+    bump_cache_version(_namespace(role_id), _shared_cache())
+    local_cache.discard_prefix(_key_prefix(role_id))
@@ -32,6 +32,12 @@ class HasPermission(BasePermission):
         if hasattr(view, 'get_required_permission'):
             required_permission = view.get_required_permission()
         
+        # التحقق من صلاحيات الدور أولاً بالاسم الكامل app_label.codename
+        # (من الذاكرة المؤقتة)، وعند عدم وجودها يُرجع إلى صلاحيات Django
+        if '.' in required_permission and hasattr(request.user, 'has_role_permission') and \
+                request.user.has_role_permission(required_permission):
+            return True
+        
         # التحقق من وجود الصلاحية
         return request.user.has_perm(required_permission)
     
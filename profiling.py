@@ -0,0 +1,270 @@
+"""
+قياس أداء الطلبات (Request Profiling)
+
+يسجل RequestProfilingMiddleware لكل طلب:
+
+- عدد استعلامات SQL ومجموع زمنها (عبر connection.execute_wrapper)
+- الاستعلامات المتكررة: يُعرّف كل استعلام ببصمة (نص SQL بعد توحيد قوائم
+  IN)، وتُعتبر البصمة المتكررة REQUEST_PROFILING_DUPLICATE_THRESHOLD مرة
+  فأكثر مؤشراً على مشكلة N+1
+- زمن الـ Serializers (للـ Serializers التي تستخدم ProfiledSerializerMixin)
+- الزمن الكلي للطلب
+
+وتُعرض النتائج بثلاث طرق:
+
+- سطر JSON لكل طلب في السجل users.profiling (انظر JsonFormatter)
+- ترويسة Server-Timing للمشرفين (أو للجميع عند DEBUG)
+- مدرج تكراري (histogram) للزمن لكل مسار في ذاكرة العملية، يُقرأ عبر
+  ProfilingHistogramView
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# حدود فئات المدرج التكراري بالمللي ثانية (الأخيرة لما يتجاوز كل الحدود)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_current_profile = contextvars.ContextVar('request_profile', default=None)
+
+
+def fingerprint_sql(sql):
+    """بصمة الاستعلام: نصه مع توحيد قوائم IN بأي طول"""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class RequestProfile:
+    """بيانات أداء طلب واحد"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_ms = None
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.fingerprints = Counter()
+        self.sections = defaultdict(float)
+        self._section_depth = Counter()
+
+    def record_query(self, sql, duration_ms):
+        self.sql_count += 1
+        self.sql_ms += duration_ms
+        self.fingerprints[fingerprint_sql(sql)] += 1
+
+    def duplicates(self, threshold=None):
+        """
+        الاستعلامات المتكررة بعدد مرات لا يقل عن الحد
+
+        Returns:
+            list: [{'fingerprint', 'sql', 'count'}] مرتبة تنازلياً حسب العدد
+        """
+        if threshold is None:
+            threshold = getattr(settings, 'REQUEST_PROFILING_DUPLICATE_THRESHOLD', 3)
+        return [
+            {
+                'fingerprint': hashlib.sha1(sql.encode('utf-8')).hexdigest()[:12],
+                'sql': sql[:300],
+                'count': count,
+            }
+            for sql, count in self.fingerprints.most_common()
+            if count >= threshold
+        ]
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        return self
+
+    def server_timing(self):
+        """قيمة ترويسة Server-Timing"""
+        metrics = [f'sql;desc="{self.sql_count} queries";dur={self.sql_ms:.1f}']
+        metrics.extend(f'{name};dur={duration:.1f}' for name, duration in self.sections.items())
+        metrics.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(metrics)
+
+
+def current_profile():
+    """بيانات أداء الطلب الجاري (None خارج طلب مقاس)"""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_section(name):
+    """
+    قياس زمن جزء من الطلب تحت اسم معين
+
+    الأجزاء المتداخلة بالاسم نفسه تُحسب مرة واحدة (الخارجية فقط).
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    profile._section_depth[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile._section_depth[name] -= 1
+        if not profile._section_depth[name]:
+            profile.sections[name] += (time.perf_counter() - started) * 1000
+
+
+class ProfiledSerializerMixin:
+    """Mixin للـ Serializers يضيف زمن تحويل البيانات إلى قسم serializer"""
+
+    def to_representation(self, instance):
+        with profile_section('serializer'):
+            return super().to_representation(instance)
+
+
+class LatencyHistogram:
+    """مدرج تكراري لزمن الطلبات لكل مسار (في ذاكرة العملية الحالية)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, profile, duplicates=()):
+        index = next(i for i, bound in enumerate(self.buckets) if profile.total_ms <= bound)
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'sql_count': 0,
+                    'sql_ms': 0.0,
+                    'n_plus_one': 0,
+                    'buckets': [0] * len(self.buckets),
+                }
+            stats['count'] += 1
+            stats['total_ms'] += profile.total_ms
+            stats['max_ms'] = max(stats['max_ms'], profile.total_ms)
+            stats['sql_count'] += profile.sql_count
+            stats['sql_ms'] += profile.sql_ms
+            stats['n_plus_one'] += bool(duplicates)
+            stats['buckets'][index] += 1
+
+    def snapshot(self):
+        """نسخة من المدرج مع المتوسطات"""
+        labels = ['+Inf' if bound == float('inf') else str(bound) for bound in self.buckets]
+        with self._lock:
+            routes = {route: dict(stats) for route, stats in self._routes.items()}
+        return {
+            route: {
+                'count': stats['count'],
+                'avg_ms': round(stats['total_ms'] / stats['count'], 2),
+                'max_ms': round(stats['max_ms'], 2),
+                'avg_sql_count': round(stats['sql_count'] / stats['count'], 2),
+                'avg_sql_ms': round(stats['sql_ms'] / stats['count'], 2),
+                'n_plus_one_requests': stats['n_plus_one'],
+                'buckets': dict(zip(labels, stats['buckets'])),
+            }
+            for route, stats in sorted(routes.items())
+        }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+histogram = LatencyHistogram()
+
+
+def _route_label(request):
+    match = getattr(request, 'resolver_match', None)
+    route = match.route if match is not None else 'unmatched'
+    return f'{request.method} /{route}'
+
+
+class RequestProfilingMiddleware:
+    """
+    وسيط قياس أداء الطلبات (يُوضع أولاً في MIDDLEWARE ليشمل الطلب كاملاً)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'REQUEST_PROFILING_ENABLED', True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self._record_query))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+
+        profile.finish()
+        route = _route_label(request)
+        duplicates = profile.duplicates()
+        histogram.observe(route, profile, duplicates)
+        self._log(request, response, route, profile, duplicates)
+
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['Server-Timing'] = profile.server_timing()
+        return response
+
+    @staticmethod
+    def _record_query(execute, sql, params, many, context):
+        profile = _current_profile.get()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if profile is not None:
+                profile.record_query(sql, (time.perf_counter() - started) * 1000)
+
+    @staticmethod
+    def _log(request, response, route, profile, duplicates):
+        slow = profile.total_ms >= getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 500)
+        logger.log(
+            logging.WARNING if duplicates or slow else logging.INFO,
+            'request profiled',
+            extra={'profile': {
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': response.status_code,
+                'total_ms': round(profile.total_ms, 2),
+                'sql_count': profile.sql_count,
+                'sql_ms': round(profile.sql_ms, 2),
+                'sections_ms': {name: round(value, 2) for name, value in profile.sections.items()},
+                'duplicates': duplicates,
+            }},
+        )
+
+
+class JsonFormatter(logging.Formatter):
+    """تنسيق سجلات JSON (سطر لكل سجل) مع حقل profile إن وُجد"""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        profile = getattr(record, 'profile', None)
+        if profile is not None:
+            payload.update(profile)
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
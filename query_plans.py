@@ -0,0 +1,78 @@
+"""
+خطط الاستعلام (Query Plans) للـ Serializers
+
+يعلن كل Serializer عن العلاقات التي يحتاجها (select_related / prefetch_related)
+عبر الخاصية query_plan، وتطبقها الـ Views تلقائياً على الـ queryset لتجنب
+مشكلة الاستعلامات المتكررة (N+1).
+"""
+
+
+def _merge(first, second):
+    """دمج قائمتين مع إزالة التكرار والحفاظ على الترتيب"""
+    return tuple(dict.fromkeys((*first, *second)))
+
+
+class QueryPlan:
+    """
+    وصف للعلاقات التي يجب تحميلها مسبقاً لـ Serializer معين
+    """
+
+    def __init__(self, select_related=(), prefetch_related=()):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+
+    def __add__(self, other):
+        """دمج خطتين في خطة واحدة"""
+        return QueryPlan(
+            select_related=_merge(self.select_related, other.select_related),
+            prefetch_related=_merge(self.prefetch_related, other.prefetch_related),
+        )
+
+    def __repr__(self):
+        return (
+            f'QueryPlan(select_related={self.select_related!r}, '
+            f'prefetch_related={self.prefetch_related!r})'
+        )
+
+    def prefixed(self, prefix):
+        """
+        إعادة الخطة نفسها منسوبة إلى علاقة أخرى
+
+        تُستخدم للـ Serializers المتداخلة، مثلاً خطة RoleSerializer
+        تحت العلاقة role تصبح role__permissions.
+        """
+        return QueryPlan(
+            select_related=[f'{prefix}__{field}' for field in self.select_related],
+            prefetch_related=[f'{prefix}__{field}' for field in self.prefetch_related],
+        )
+
+    def apply(self, queryset):
+        """تطبيق الخطة على queryset"""
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+
+EMPTY_QUERY_PLAN = QueryPlan()
+
+
+def get_query_plan(serializer_class):
+    """الحصول على خطة الاستعلام المعلنة في الـ Serializer"""
+    return getattr(serializer_class, 'query_plan', None) or EMPTY_QUERY_PLAN
+
+
+def apply_query_plan(queryset, serializer_class):
+    """تطبيق خطة الاستعلام الخاصة بالـ Serializer على queryset"""
+    return get_query_plan(serializer_class).apply(queryset)
+
+
+class QueryPlanMixin:
+    """
+    Mixin للـ Views العامة يطبق خطة استعلام الـ Serializer المستخدم تلقائياً
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return apply_query_plan(queryset, self.get_serializer_class())
@@ -0,0 +1,208 @@
+"""
+نظام البحث في المستخدمين والأدوار
+
+يحتفظ كل سجل قابل للبحث بنص بحث مطبّع (search_document) يجمع حقوله
+النصية بعد توحيد أشكال الحروف العربية وإزالة التشكيل. على PostgreSQL
+يُفهرس هذا النص بفهرسي GIN (pg_trgm و tsvector) ويُرتب الناتج حسب
+الصلة، وعلى قواعد البيانات الأخرى (مثل SQLite في الاختبارات) يُستخدم
+بحث نصي بسيط على النص نفسه.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import (
+    BooleanField, Case, F, FloatField, Func, IntegerField, Q, Value, When
+)
+
+
+# التشكيل وعلامات القرآن والتطويل
+ARABIC_DIACRITICS_RE = re.compile('[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+
+# توحيد أشكال الألف والياء والتاء المربوطة
+ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ى': 'ي',
+    'ی': 'ي',
+    'ة': 'ه',
+})
+
+SEARCH_TOKEN_RE = re.compile(r'\w+')
+
+# إعداد النص المستخدم في tsvector (بدون تجذيع لأن النص مختلط عربي/إنجليزي)
+SEARCH_CONFIG = 'simple'
+
+
+def normalize_arabic(text):
+    """
+    تطبيع النص للبحث
+
+    - إزالة التشكيل والتطويل
+    - توحيد أشكال الألف (أ إ آ ٱ ← ا) والياء (ى ← ي) والتاء المربوطة (ة ← ه)
+    - تحويل الحروف اللاتينية إلى صغيرة وضغط المسافات
+    """
+    if not text:
+        return ''
+    text = ARABIC_DIACRITICS_RE.sub('', str(text))
+    text = text.translate(ARABIC_LETTER_MAP)
+    return ' '.join(text.lower().split())
+
+
+def build_search_document(instance, fields):
+    """
+    بناء نص البحث المطبّع من حقول السجل
+
+    تُضاف كلمات القيم التي تحتوي على رموز (مثل البريد الإلكتروني أو
+    ahmed.ali) منفصلة بعد القيمة نفسها، لأن محلل tsvector يحفظ القيمة كاملة
+    كلفظ واحد بينما تُقسم عبارة البحث إلى كلمات.
+    """
+    parts = []
+    for field in fields:
+        value = normalize_arabic(getattr(instance, field, ''))
+        if not value:
+            continue
+        parts.append(value)
+        words = ' '.join(SEARCH_TOKEN_RE.findall(value))
+        if words and words != value:
+            parts.append(words)
+    return ' '.join(parts)
+
+
+def search_tokens(term):
+    """تقسيم عبارة البحث المطبّعة إلى كلمات"""
+    return SEARCH_TOKEN_RE.findall(normalize_arabic(term))
+
+
+class ToTSVector(Func):
+    """
+    to_tsvector('simple', search_document)
+
+    تُكتب بهذه الصيغة بالضبط لتطابق تعبير الفهرس المنشأ في ensure_search_indexes.
+    """
+    function = 'to_tsvector'
+
+
+class ToTSQuery(Func):
+    """to_tsquery('simple', ...)"""
+    function = 'to_tsquery'
+
+
+class TSMatch(Func):
+    """مطابقة tsvector @@ tsquery"""
+    template = '(%(expressions)s)'
+    arg_joiner = ' @@ '
+
+
+def search_queryset(queryset, term):
+    """
+    تصفية وترتيب queryset حسب عبارة البحث
+
+    يجب أن يحتوي النموذج على الحقل search_document. تضاف القيمة
+    search_rank للنتائج دائماً (صفر إذا لم تحتوِ العبارة على كلمات)
+    ويُرتب الناتج تنازلياً حسبها.
+    """
+    tokens = search_tokens(term)
+    if not tokens:
+        # عبارة من رموز فقط (مثل @): LIKE على النص المطبّع بحالة الأحرف نفسها
+        # (وليس icontains الذي يضيف UPPER) فيخدمها فهرس pg_trgm
+        term = normalize_arabic(term)
+        if term:
+            queryset = queryset.filter(search_document__contains=term)
+        return queryset.annotate(search_rank=Value(0, output_field=FloatField()))
+
+    if connections[queryset.db].vendor == 'postgresql':
+        return _postgres_search(queryset, tokens)
+    return _fallback_search(queryset, tokens)
+
+
+def _postgres_search(queryset, tokens):
+    """البحث باستخدام tsvector (مع مطابقة البادئة) و pg_trgm"""
+    from django.contrib.postgres.search import (
+        SearchQueryField, SearchVectorField, TrigramSimilarity
+    )
+
+    phrase = ' '.join(tokens)
+    vector = ToTSVector(Value(SEARCH_CONFIG), F('search_document'), output_field=SearchVectorField())
+    query = ToTSQuery(
+        Value(SEARCH_CONFIG),
+        Value(' & '.join(f'{token}:*' for token in tokens)),
+        output_field=SearchQueryField()
+    )
+
+    # المطابقة بفهرس <الجدول>_search_fts وحده، إذ تغطي مطابقة البادئة في
+    # tsquery أي عبارة تحتويها الكلمات. يُستخدم pg_trgm للترتيب فقط.
+    return queryset.annotate(
+        search_match=TSMatch(vector, query, output_field=BooleanField()),
+        search_rank=Func(vector, query, function='ts_rank', output_field=FloatField()) +
+        TrigramSimilarity('search_document', phrase),
+    ).filter(search_match=True).order_by('-search_rank')
+
+
+def _fallback_search(queryset, tokens):
+    """بحث بسيط لقواعد البيانات الأخرى: جميع الكلمات مع تفضيل البادئة"""
+    condition = Q()
+    for token in tokens:
+        condition &= Q(search_document__icontains=token)
+
+    phrase = ' '.join(tokens)
+    return queryset.filter(condition).annotate(
+        search_rank=Case(
+            When(search_document__startswith=phrase, then=Value(3)),
+            When(search_document__icontains=f' {phrase}', then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('-search_rank')
+
+
+def ensure_search_indexes(sender=None, using='default', **kwargs):
+    """
+    إنشاء فهارس البحث على PostgreSQL (يُستدعى بعد migrate)
+
+    تُنشأ الفهارس بـ SQL مباشر لأنها خاصة بـ PostgreSQL ولا يجب أن تمنع
+    تشغيل الترحيلات على قواعد البيانات الأخرى.
+    """
+    from .models import CustomUser, Role
+
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for model in (CustomUser, Role):
+            table = model._meta.db_table
+            quoted = connection.ops.quote_name(table)
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_search_trgm '
+                f'ON {quoted} USING gin (search_document gin_trgm_ops)'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_search_fts '
+                f"ON {quoted} USING gin (to_tsvector('{SEARCH_CONFIG}', search_document))"
+            )
+
+
+def rebuild_search_documents(model, batch_size=1000):
+    """
+    إعادة بناء نصوص البحث لجميع سجلات النموذج
+
+    Returns:
+        int: عدد السجلات المحدثة
+    """
+    updated = 0
+    batch = []
+    for instance in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+        instance.search_document = build_search_document(instance, model.search_fields)
+        batch.append(instance)
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, ['search_document'])
+            updated += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['search_document'])
+        updated += len(batch)
+    return updated
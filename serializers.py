@@ -3,17 +3,24 @@ Serializers لنظام المستخدمين والأدوار
 """
 
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.utils.translation import gettext_lazy as _
+from .authentication import ClaimsRefreshToken, user_claims
 from .models import CustomUser, Role, UserProfile, UserSession
+from .profiling import ProfiledSerializerMixin
+from .query_plans import QueryPlan
 
 
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """
     Serializer للأدوار
     """
     permissions_list = serializers.SerializerMethodField()
+    query_plan = QueryPlan(prefetch_related=['permissions'])
     
     class Meta:
         model = Role
@@ -29,7 +36,7 @@ class RoleSerializer(serializers.ModelSerializer):
         return obj.get_permissions_list()
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """
     Serializer للملف الشخصي للمستخدم
     """
@@ -45,7 +52,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """
     Serializer للمستخدمين - للقراءة فقط
     """
@@ -53,6 +60,10 @@ class UserSerializer(serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
     full_name_arabic = serializers.ReadOnlyField()
     full_name_english = serializers.ReadOnlyField()
+    query_plan = (
+        QueryPlan(select_related=['role', 'profile']) +
+        RoleSerializer.query_plan.prefixed('role')
+    )
     
     class Meta:
         model = CustomUser
@@ -120,6 +131,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
     Serializer لتحديث بيانات المستخدم
     """
     profile = UserProfileSerializer(required=False)
+    query_plan = QueryPlan(select_related=['profile'])
     
     class Meta:
         model = CustomUser
@@ -173,6 +185,21 @@ class ChangePasswordSerializer(serializers.Serializer):
         return value
 
 
+class BulkSessionTerminationSerializer(serializers.Serializer):
+    """
+    Serializer لتحديد المستخدمين المطلوب إنهاء جلساتهم
+    """
+    users = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+    roles = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+    departments = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    
+    def validate(self, attrs):
+        """يجب تحديد مستخدم أو دور أو قسم واحد على الأقل"""
+        if not (attrs['users'] or attrs['roles'] or attrs['departments']):
+            raise serializers.ValidationError(_("يجب تحديد المستخدمين أو الأدوار أو الأقسام"))
+        return attrs
+
+
 class LoginSerializer(serializers.Serializer):
     """
     Serializer لتسجيل الدخول
@@ -204,11 +231,53 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError(_("يجب إدخال اسم المستخدم وكلمة المرور"))
 
 
-class UserSessionSerializer(serializers.ModelSerializer):
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    تجديد الرمز مع تحديث بيانات المستخدم فيه
+
+    يُعيد كتابة user_claims في رمز الوصول الجديد (وفي رمز التحديث عند
+    تدويره)، فلا تبقى أرقام الإصدار القديمة في الرموز المجددة ويعود
+    ClaimsJWTAuthentication للمصادقة دون استعلام بعد أول تجديد.
+    """
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = CustomUser.objects.select_related('role').filter(
+            pk=refresh[api_settings.USER_ID_CLAIM], is_active=True
+        ).first()
+        if user is None:
+            raise AuthenticationFailed(_("هذا الحساب غير نشط"))
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # تطبيق القائمة السوداء غير مثبت
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+
+        for claim, value in user_claims(user).items():
+            refresh[claim] = value
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            data['refresh'] = str(refresh)
+        return data
+
+
+class UserSessionSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """
     Serializer لجلسات المستخدمين
     """
     user_details = UserSerializer(source='user', read_only=True)
+    query_plan = (
+        QueryPlan(select_related=['user']) +
+        UserSerializer.query_plan.prefixed('user')
+    )
     
     class Meta:
         model = UserSession
@@ -222,12 +291,13 @@ class UserSessionSerializer(serializers.ModelSerializer):
         ]
 
 
-class UserListSerializer(serializers.ModelSerializer):
+class UserListSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """
     Serializer مبسط لقائمة المستخدمين
     """
     role_name = serializers.CharField(source='role.display_name', read_only=True)
     full_name_arabic = serializers.ReadOnlyField()
+    query_plan = QueryPlan(select_related=['role'])
     
     class Meta:
         model = CustomUser
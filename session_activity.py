@@ -0,0 +1,205 @@
+"""
+تتبع نشاط الجلسات بالكتابة المؤجلة (Write-behind)
+
+بدل تحديث صف UserSession مع كل طلب، يُسجل النشاط (آخر ظهور، عنوان IP،
+معلومات المتصفح) في ذاكرة التخزين المؤقت ثم يُكتب إلى قاعدة البيانات
+دفعة واحدة (bulk UPDATE) مرة كل SESSION_ACTIVITY_FLUSH_INTERVAL ثانية.
+
+- لا يُسجل للجلسة الواحدة أكثر من نشاط واحد كل SESSION_ACTIVITY_THROTTLE
+  ثانية.
+- يُقسم الزمن إلى نوافذ بطول فترة الكتابة، ولكل نافذة خانات مرقمة عبر
+  عداد ذري (cache.incr)، فتكتب العمليات المتزامنة دون تعارض.
+- تُكتب النوافذ المنتهية إما من أول طلب بعد انتهائها أو من المهمة الدورية
+  flush_session_activity_task، وقفل لكل نافذة يمنع كتابتها مرتين.
+
+تتطلب الكتابة المؤجلة ذاكرة مشتركة (SESSION_ACTIVITY_CACHE_ALIAS = 'shared')
+حتى تصل المهمة الدورية إلى النشاط المعلق من جميع العمليات ويبقى بعد إعادة
+تشغيلها. بدونها يُكتب النشاط مباشرة (UPDATE واحد) مع بقاء حد التكرار.
+"""
+
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+
+FLUSHED_KEY = 'session-activity:flushed'
+# مهلة بعد انتهاء النافذة قبل كتابتها (لإتمام الكتابات الجارية)
+FLUSH_GRACE = 5
+
+_last_flush_window = None
+
+
+def _shared_cache():
+    alias = getattr(settings, 'SESSION_ACTIVITY_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _cache():
+    return _shared_cache() or caches['default']
+
+
+def _interval():
+    return getattr(settings, 'SESSION_ACTIVITY_FLUSH_INTERVAL', 60)
+
+
+def _window(timestamp):
+    return int(timestamp // _interval())
+
+
+def _count_key(window):
+    return f'session-activity:{window}:count'
+
+
+def _slot_key(window, slot):
+    return f'session-activity:{window}:{slot}'
+
+
+def get_client_ip(request):
+    """الحصول على عنوان IP للعميل"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def touch_session(session_key, ip_address, user_agent, now=None):
+    """
+    تسجيل نشاط جلسة في الذاكرة المؤقتة
+
+    Returns:
+        bool: True إذا سُجل النشاط، False إذا تجاهله حد التكرار
+    """
+    now = time.time() if now is None else now
+    cache = _cache()
+    throttle = getattr(settings, 'SESSION_ACTIVITY_THROTTLE', 60)
+    if not cache.add(f'session-activity:throttle:{session_key}', 1, throttle):
+        return False
+
+    entry = {
+        'session_key': session_key,
+        'timestamp': now,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+    }
+    if _shared_cache() is None:
+        # الذاكرة المحلية لا تراها المهمة الدورية ولا العمليات الأخرى
+        _write_directly(entry)
+        return True
+
+    window = _window(now)
+    count_key = _count_key(window)
+    # تبقى بيانات النافذة حتى تُكتب (أو حتى عشر نوافذ إن تعذرت الكتابة)
+    timeout = _interval() * 10
+    cache.add(count_key, 0, timeout)
+    slot = cache.incr(count_key)
+    cache.set(_slot_key(window, slot), entry, timeout)
+
+    _maybe_flush(now)
+    return True
+
+
+def _maybe_flush(now):
+    """كتابة النوافذ المنتهية من أول طلب بعد انتهائها في هذه العملية"""
+    global _last_flush_window
+    ready = _window(now - FLUSH_GRACE)
+    if _last_flush_window is None or ready > _last_flush_window:
+        _last_flush_window = ready
+        flush_session_activity(now)
+
+
+def flush_session_activity(now=None, max_windows=60):
+    """
+    كتابة نشاط النوافذ المنتهية إلى UserSession
+
+    Returns:
+        int: عدد الجلسات المحدثة
+    """
+    cache = _shared_cache()
+    if cache is None:
+        # بدون ذاكرة مشتركة يُكتب النشاط مباشرة ولا يوجد ما يُكتب هنا
+        return 0
+    now = time.time() if now is None else now
+    ready = _window(now - FLUSH_GRACE)
+    flushed = cache.get(FLUSHED_KEY)
+    start = ready - max_windows if flushed is None else max(flushed + 1, ready - max_windows)
+
+    updated = 0
+    for window in range(start, ready):
+        if not cache.add(f'session-activity:{window}:lock', 1, _interval() * 10):
+            # عملية أخرى كتبت هذه النافذة أو تكتبها الآن
+            continue
+        count = cache.get(_count_key(window)) or 0
+        if count:
+            keys = [_slot_key(window, slot) for slot in range(1, count + 1)]
+            updated += write_session_activity(cache.get_many(keys).values())
+            cache.delete_many(keys + [_count_key(window)])
+        cache.set(FLUSHED_KEY, window, None)
+    return updated
+
+
+def _write_directly(entry):
+    """تحديث جلسة واحدة باستعلام UPDATE واحد (بدون ذاكرة مشتركة)"""
+    from .models import UserSession
+
+    fields = {'last_activity': datetime.fromtimestamp(entry['timestamp'], tz=dt_timezone.utc)}
+    if entry['ip_address']:
+        fields['ip_address'] = entry['ip_address']
+    if entry['user_agent']:
+        fields['user_agent'] = entry['user_agent']
+    UserSession.objects.filter(session_key=entry['session_key']).update(**fields)
+
+
+def write_session_activity(entries, batch_size=500):
+    """
+    تحديث جلسات متعددة باستعلام UPDATE واحد لكل دفعة
+
+    إذا تكرر نشاط الجلسة نفسها يُعتمد الأحدث.
+    """
+    from .models import UserSession
+
+    latest = {}
+    for entry in entries:
+        current = latest.get(entry['session_key'])
+        if current is None or entry['timestamp'] > current['timestamp']:
+            latest[entry['session_key']] = entry
+    if not latest:
+        return 0
+
+    sessions = list(
+        UserSession.objects.filter(session_key__in=latest).only(
+            'pk', 'session_key', 'ip_address', 'user_agent'
+        )
+    )
+    for session in sessions:
+        entry = latest[session.session_key]
+        session.last_activity = datetime.fromtimestamp(entry['timestamp'], tz=dt_timezone.utc)
+        if entry['ip_address']:
+            session.ip_address = entry['ip_address']
+        session.user_agent = entry['user_agent'] or session.user_agent
+    UserSession.objects.bulk_update(
+        sessions, ['last_activity', 'ip_address', 'user_agent'], batch_size=batch_size
+    )
+    return len(sessions)
+
+
+class SessionActivityMiddleware:
+    """
+    تسجيل نشاط جلسة المستخدم المسجل بعد كل طلب (يُوضع بعد AuthenticationMiddleware)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        user = getattr(request, 'user', None)
+        if session is not None and session.session_key and user is not None and user.is_authenticated:
+            touch_session(
+                session.session_key,
+                get_client_ip(request),
+                request.META.get('HTTP_USER_AGENT', ''),
+            )
+        return response
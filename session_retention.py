@@ -0,0 +1,150 @@
+"""
+الاحتفاظ بجلسات المستخدمين (Retention)
+
+دورة حياة الجلسة:
+
+1. الجلسة النشطة التي لم يُسجل لها نشاط منذ SESSION_IDLE_DAYS يوماً تُعتبر
+   منتهية (is_active=False).
+2. الجلسة غير النشطة منذ أكثر من SESSION_RETENTION_ARCHIVE_DAYS يوماً تُنقل
+   إلى UserSessionArchive وتُحذف من UserSession.
+3. الجلسات المؤرشفة الأقدم من SESSION_RETENTION_PURGE_DAYS يوماً تُحذف.
+
+كل مرحلة تعمل على دفعات محدودة، وكل دفعة في معاملة قصيرة تحجز صفوفها
+بـ SELECT ... FOR UPDATE SKIP LOCKED، فلا تُقفل الجداول لفترة طويلة ولا
+تنتظر الصفوف التي تعدلها طلبات جارية.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import UserSession, UserSessionArchive
+
+ARCHIVE_FIELDS = ('user_id', 'session_key', 'ip_address', 'user_agent', 'created_at', 'last_activity')
+
+
+def _process_in_batches(queryset, process, batch_size, pause):
+    """
+    تنفيذ process على صفوف queryset دفعة دفعة حتى لا يبقى منها شيء
+
+    يجب أن تُخرج process الصفوف من نطاق queryset (بالحذف أو التعديل).
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.select_for_update(skip_locked=True).order_by()[:batch_size])
+            if rows:
+                total += process(rows)
+        if len(rows) < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
+def _cutoff(days, now=None):
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def idle_sessions(days, now=None):
+    """الجلسات النشطة التي لم يُسجل لها نشاط منذ days يوماً"""
+    return UserSession.objects.filter(is_active=True, last_activity__lt=_cutoff(days, now))
+
+
+def archivable_sessions(days, now=None):
+    """الجلسات غير النشطة منذ أكثر من days يوماً"""
+    return UserSession.objects.filter(is_active=False, last_activity__lt=_cutoff(days, now))
+
+
+def purgeable_archive(days, now=None):
+    """الجلسات المؤرشفة التي تجاوزت مدة الاحتفاظ"""
+    return UserSessionArchive.objects.filter(last_activity__lt=_cutoff(days, now))
+
+
+def deactivate_idle_sessions(days, batch_size=1000, pause=0, now=None):
+    """إنهاء الجلسات الخاملة على دفعات"""
+    return _process_in_batches(
+        idle_sessions(days, now).values_list('pk', flat=True),
+        lambda pks: UserSession.objects.filter(pk__in=pks).update(is_active=False),
+        batch_size,
+        pause,
+    )
+
+
+def _archive(rows):
+    UserSessionArchive.objects.bulk_create([
+        UserSessionArchive(**{field: row[field] for field in ARCHIVE_FIELDS}) for row in rows
+    ])
+    UserSession.objects.filter(pk__in=[row['pk'] for row in rows]).delete()
+    return len(rows)
+
+
+def archive_inactive_sessions(days, batch_size=1000, pause=0, now=None):
+    """نقل الجلسات المنتهية إلى الأرشيف على دفعات"""
+    return _process_in_batches(
+        archivable_sessions(days, now).values('pk', *ARCHIVE_FIELDS),
+        _archive,
+        batch_size,
+        pause,
+    )
+
+
+def purge_archived_sessions(days, batch_size=1000, pause=0, now=None):
+    """حذف الجلسات المؤرشفة القديمة على دفعات"""
+    return _process_in_batches(
+        purgeable_archive(days, now).values_list('pk', flat=True),
+        lambda pks: UserSessionArchive.objects.filter(pk__in=pks).delete()[0],
+        batch_size,
+        pause,
+    )
+
+
+def _days(value, setting, default):
+    # القيمة 0 صالحة (كل الجلسات)، لذا يُستخدم الإعداد فقط عند عدم تمرير قيمة
+    return getattr(settings, setting, default) if value is None else value
+
+
+def sessions_to_archive(idle_days, archive_days, now=None):
+    """
+    الجلسات التي ستُؤرشف في تشغيل واحد
+
+    تشمل الجلسات الخاملة التي ستُنهى في المرحلة الأولى من التشغيل نفسه.
+    """
+    return UserSession.objects.filter(
+        Q(is_active=False) | Q(last_activity__lt=_cutoff(idle_days, now)),
+        last_activity__lt=_cutoff(archive_days, now),
+    )
+
+
+def apply_session_retention(idle_days=None, archive_days=None, purge_days=None,
+                            batch_size=1000, pause=0, dry_run=False, now=None):
+    """
+    تطبيق جميع مراحل الاحتفاظ
+
+    Returns:
+        dict: عدد الصفوف في كل مرحلة (المتأثرة فعلاً، أو المرشحة عند dry_run)
+    """
+    idle_days = _days(idle_days, 'SESSION_IDLE_DAYS', 30)
+    archive_days = _days(archive_days, 'SESSION_RETENTION_ARCHIVE_DAYS', 30)
+    purge_days = _days(purge_days, 'SESSION_RETENTION_PURGE_DAYS', 365)
+    now = now or timezone.now()
+
+    if dry_run:
+        # الأعداد كما سيُنتجها التشغيل الفعلي، إذ تعمل كل مرحلة على نتيجة سابقتها
+        to_archive = sessions_to_archive(idle_days, archive_days, now)
+        return {
+            'deactivated': idle_sessions(idle_days, now).count(),
+            'archived': to_archive.count(),
+            'purged': (
+                purgeable_archive(purge_days, now).count()
+                + to_archive.filter(last_activity__lt=_cutoff(purge_days, now)).count()
+            ),
+        }
+    return {
+        'deactivated': deactivate_idle_sessions(idle_days, batch_size, pause, now),
+        'archived': archive_inactive_sessions(archive_days, batch_size, pause, now),
+        'purged': purge_archived_sessions(purge_days, batch_size, pause, now),
+    }
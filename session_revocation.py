@@ -0,0 +1,77 @@
+"""
+إنهاء الجلسات جماعياً ("تسجيل الخروج من كل الأجهزة")
+
+ينهي terminate_user_sessions جميع جلسات مجموعة مستخدمين (محددين بالمعرف
+أو الدور أو القسم) بعدد ثابت من الاستعلامات مهما كان عدد الجلسات:
+
+- حذف جلسات Django المرتبطة (DELETE واحد) فتتوقف مصادقة الجلسة فوراً
+- إلغاء تفعيل سجلات UserSession (UPDATE واحد)
+- إضافة رموز التحديث (refresh tokens) السارية إلى القائمة السوداء
+  (INSERT لكل دفعة)، فلا يمكن تجديد رموز الوصول
+
+رموز الوصول (access tokens) الصادرة مسبقاً تبقى صالحة حتى انتهاء مدتها
+القصيرة (ACCESS_TOKEN_LIFETIME).
+"""
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .models import CustomUser, UserSession
+
+
+def target_users(users=(), roles=(), departments=()):
+    """المستخدمون المطابقون لأي من المعرفات أو الأدوار أو الأقسام"""
+    condition = Q(pk__in=list(users)) | Q(role__in=list(roles)) | Q(department__in=list(departments))
+    return CustomUser.objects.filter(condition)
+
+
+def _delete_django_sessions(session_keys):
+    """حذف جلسات Django (استعلام واحد لمحركات قاعدة البيانات)"""
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if hasattr(store, 'get_model_class'):
+        store.get_model_class().objects.filter(session_key__in=session_keys).delete()
+    else:
+        for session_key in session_keys:
+            store(session_key).delete()
+
+
+def terminate_user_sessions(users, batch_size=1000):
+    """
+    إنهاء جميع جلسات المستخدمين وإبطال رموز التحديث الخاصة بهم
+
+    Args:
+        users: queryset للمستخدمين المستهدفين
+
+    Returns:
+        dict: {'users': عدد المستخدمين، 'sessions': الجلسات المنتهية،
+               'tokens': رموز التحديث المضافة للقائمة السوداء}
+    """
+    user_ids = users.values('pk')
+    with transaction.atomic():
+        active_sessions = UserSession.objects.filter(user__in=user_ids, is_active=True)
+        _delete_django_sessions(active_sessions.values_list('session_key', flat=True))
+        sessions = active_sessions.update(is_active=False)
+
+        token_ids = list(
+            OutstandingToken.objects.filter(
+                user__in=user_ids,
+                expires_at__gt=timezone.now(),
+                blacklistedtoken__isnull=True,
+            ).values_list('pk', flat=True)
+        )
+        BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(token_id=token_id) for token_id in token_ids],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+    return {
+        'users': users.count(),
+        'sessions': sessions,
+        'tokens': len(token_ids),
+    }
@@ -26,11 +26,14 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
+    # مطلوب لـ BLACKLIST_AFTER_ROTATION ولإلغاء رموز التحديث عند إنهاء الجلسات
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'django_filters',
 ]
@@ -50,12 +53,15 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 # إعدادات الوسطاء (Middleware)
 MIDDLEWARE = [
+    # قياس أداء الطلبات (أولاً ليشمل زمن بقية الوسطاء)
+    'users.profiling.RequestProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.session_activity.SessionActivityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -138,7 +144,8 @@ AUTH_USER_MODEL = 'users.CustomUser'
 # إعدادات Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # مصادقة JWT تبني المستخدم من بيانات الرمز دون استعلام ما دامت حديثة
+        'users.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -147,7 +154,7 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'users.pagination.OptInCursorPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'rest_framework.filters.SearchFilter',
@@ -171,8 +178,47 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    # يُعيد كتابة بيانات المستخدم (وأرقام الإصدار) في الرموز المجددة
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.ClaimsTokenRefreshSerializer',
 }
 
+# إعدادات التخزين المؤقت
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'idea-platform',
+    },
+}
+
+# طبقة تخزين مؤقت مشتركة بين العمليات (Redis) - اختيارية
+REDIS_CACHE_URL = config('REDIS_CACHE_URL', default='')
+if REDIS_CACHE_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_CACHE_URL,
+    }
+
+# الذاكرة المشتركة للبيانات التي تُبطل بين جميع العمليات (None بدون Redis)
+SHARED_CACHE_ALIAS = 'shared' if REDIS_CACHE_URL else None
+
+# ذاكرة صلاحيات الأدوار المؤقتة
+PERMISSION_CACHE_ALIAS = 'shared' if REDIS_CACHE_URL else None
+PERMISSION_CACHE_LOCAL_SIZE = 1024
+# مدة بقاء الصلاحيات في ذاكرة العملية (ثوانٍ): أقصى مدة لصلاحية ملغاة بدون Redis
+PERMISSION_CACHE_LOCAL_TTL = 30
+PERMISSION_CACHE_TIMEOUT = 60 * 60
+
+# تتبع نشاط الجلسات بالكتابة المؤجلة: نشاط واحد لكل جلسة كل THROTTLE ثانية،
+# ويُكتب المعلق إلى قاعدة البيانات كل FLUSH_INTERVAL ثانية (بدون Redis يُكتب مباشرة)
+SESSION_ACTIVITY_CACHE_ALIAS = 'shared' if REDIS_CACHE_URL else None
+SESSION_ACTIVITY_THROTTLE = config('SESSION_ACTIVITY_THROTTLE', default=60, cast=int)
+SESSION_ACTIVITY_FLUSH_INTERVAL = config('SESSION_ACTIVITY_FLUSH_INTERVAL', default=60, cast=int)
+
+# الاحتفاظ بالجلسات: إنهاء الخاملة، ثم أرشفة المنتهية، ثم حذف المؤرشفة (بالأيام)
+SESSION_IDLE_DAYS = config('SESSION_IDLE_DAYS', default=30, cast=int)
+SESSION_RETENTION_ARCHIVE_DAYS = config('SESSION_RETENTION_ARCHIVE_DAYS', default=30, cast=int)
+SESSION_RETENTION_PURGE_DAYS = config('SESSION_RETENTION_PURGE_DAYS', default=365, cast=int)
+
 # إعدادات CORS
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
@@ -201,6 +247,47 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# إعدادات ملفات PDF للفواتير
+BILLING_PDF_CACHE_ROOT = 'billing/pdf'
+# مسار nginx الداخلي لتقديم الملفات عبر X-Accel-Redirect (فارغ = FileResponse)
+BILLING_PDF_X_ACCEL_REDIRECT_PREFIX = config('BILLING_PDF_X_ACCEL_REDIRECT_PREFIX', default='')
+# توليد ملف PDF في الخلفية (Celery) بعد كل تعديل على الفاتورة أو بنودها، حتى
+# لا يُولّد الملف داخل طلب التحميل إلا إذا سبق التحميل انتهاء المهمة
+BILLING_PDF_PRERENDER = config('BILLING_PDF_PRERENDER', default=True, cast=bool)
+# عدد عمليات توليد PDF المتوازية (0 = عدد الأنوية)
+BILLING_PDF_RENDER_WORKERS = config('BILLING_PDF_RENDER_WORKERS', default=0, cast=int)
+# عدد ملفات PDF قيد التوليد في وقت واحد أثناء التصدير الجماعي (يحدد استهلاك الذاكرة)
+BILLING_PDF_EXPORT_WINDOW = config('BILLING_PDF_EXPORT_WINDOW', default=8, cast=int)
+
+# Google Analytics: مدة صلاحية الردود المخزنة ثم مدة تقديمها قديمة أثناء التحديث
+GA_VIEW_ID = config('GA_VIEW_ID', default='')
+GA_ANALYTICS_BACKEND = 'idea_platform.reports.ga_cache.ReportingApiBackend'
+GA_CACHE_TTL = config('GA_CACHE_TTL', default=900, cast=int)
+GA_CACHE_STALE_TTL = config('GA_CACHE_STALE_TTL', default=86400, cast=int)
+# ذاكرة ردود Google Analytics وقفل الجلب: مشتركة بين العمليات (محلية بدون Redis)
+GA_CACHE_ALIAS = SHARED_CACHE_ALIAS
+
+# التقارير المجدولة: الحد الأقصى للتشغيلات الجارية لكل قالب
+REPORTS_MAX_CONCURRENT_PER_TEMPLATE = config('REPORTS_MAX_CONCURRENT_PER_TEMPLATE', default=2, cast=int)
+# أقصى عدد من المواعيد الفائتة يُنفذ بعد توقف الخدمة (تُتجاوز الأقدم)
+REPORTS_SCHEDULE_MAX_CATCHUP = config('REPORTS_SCHEDULE_MAX_CATCHUP', default=12, cast=int)
+# مدة (بالثواني) دون نبضة من العامل يُعتبر بعدها التشغيل الجاري عالقاً ويُعاد إلى الانتظار
+REPORTS_RUN_TIMEOUT = config('REPORTS_RUN_TIMEOUT', default=3600, cast=int)
+# أقصى عدد من محاولات التشغيل العالق قبل اعتباره فاشلاً
+REPORTS_RUN_MAX_ATTEMPTS = config('REPORTS_RUN_MAX_ATTEMPTS', default=3, cast=int)
+# أقل فاصل (بالثواني) بين نبضات العامل المنفذ للتشغيل
+REPORTS_RUN_HEARTBEAT = config('REPORTS_RUN_HEARTBEAT', default=60, cast=int)
+# ذاكرة نتائج التقارير: مشتركة بين عمليات الويب و Celery (معطلة بدون Redis)
+REPORTS_RESULT_CACHE_ALIAS = SHARED_CACHE_ALIAS
+# مدة الاحتفاظ بمفاتيح ذاكرة نتائج التقارير (بالثواني)
+REPORTS_RESULT_CACHE_TTL = config('REPORTS_RESULT_CACHE_TTL', default=7 * 86400, cast=int)
+
+# قياس أداء الطلبات: عدد تكرار الاستعلام نفسه الذي يُعتبر N+1، والزمن الذي
+# يُسجل بعده الطلب كتحذير (بالمللي ثانية)
+REQUEST_PROFILING_ENABLED = config('REQUEST_PROFILING_ENABLED', default=True, cast=bool)
+REQUEST_PROFILING_DUPLICATE_THRESHOLD = config('REQUEST_PROFILING_DUPLICATE_THRESHOLD', default=3, cast=int)
+REQUEST_PROFILING_SLOW_MS = config('REQUEST_PROFILING_SLOW_MS', default=500, cast=int)
+
 # إعدادات البريد الإلكتروني
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -210,6 +297,11 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@ideateeam.com')
 
+# إرسال الفواتير على دفعات: عدد الرسائل في الدفعة والحد الأقصى للرسائل في الثانية
+BILLING_EMAIL_BATCH_SIZE = config('BILLING_EMAIL_BATCH_SIZE', default=50, cast=int)
+BILLING_EMAIL_RATE_LIMIT = config('BILLING_EMAIL_RATE_LIMIT', default=5, cast=float)
+BILLING_EMAIL_TASK_RATE_LIMIT = config('BILLING_EMAIL_TASK_RATE_LIMIT', default='60/m')
+
 # إعدادات الأمان الإضافية
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
@@ -234,6 +326,9 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'users.profiling.JsonFormatter',
+        },
     },
     'handlers': {
         'file': {
@@ -247,6 +342,12 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'profiling_file': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'logs' / 'profiling.log',
+            'formatter': 'json',
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -263,6 +364,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'users.profiling': {
+            'handlers': ['profiling_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -294,6 +400,22 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'social_media.tasks.collect_post_analytics',
         'schedule': 21600.0,  # كل 6 ساعات
     },
+    'refresh-analytics-metrics': {
+        'task': 'idea_platform.reports.tasks.refresh_analytics_task',
+        'schedule': 300.0,  # كل 5 دقائق
+    },
+    'flush-session-activity': {
+        'task': 'users.tasks.flush_session_activity_task',
+        'schedule': 60.0,  # كل دقيقة
+    },
+    'apply-session-retention': {
+        'task': 'users.tasks.apply_session_retention_task',
+        'schedule': 86400.0,  # يومياً
+    },
+    'dispatch-scheduled-reports': {
+        'task': 'idea_platform.reports.tasks.dispatch_scheduled_reports_task',
+        'schedule': 60.0,  # كل دقيقة
+    },
 }
 
 # مفتاح التشفير لرموز الوصول
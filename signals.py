@@ -0,0 +1,76 @@
+"""
+إشارات نظام المستخدمين والأدوار
+
+تُستخدم لإبطال البيانات المخزنة مؤقتاً عند تغيّر المستخدمين أو الأدوار.
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_claims
+from .caching import (
+    USER_STATS_NAMESPACE, bump_cache_version, current_user_namespace, shared_cache
+)
+from .models import CustomUser, Role, UserProfile
+from .permission_cache import invalidate_role_permissions
+
+
+def _is_login_update(update_fields):
+    """حفظ last_login وحده عند تسجيل الدخول لا يغير البيانات المخزنة"""
+    return update_fields is not None and set(update_fields) == {'last_login'}
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_user_stats(sender, update_fields=None, **kwargs):
+    """إبطال لقطة إحصائيات المستخدمين عند أي تغيير"""
+    if sender is CustomUser and _is_login_update(update_fields):
+        return
+    bump_cache_version(USER_STATS_NAMESPACE, shared_cache())
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_current_user(sender, instance, **kwargs):
+    """إبطال بيانات "المستخدم الحالي" المخزنة عند تعديل المستخدم أو ملفه الشخصي"""
+    user_id = instance.user_id if sender is UserProfile else instance.pk
+    bump_cache_version(current_user_namespace(user_id), shared_cache())
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_user_token_claims(sender, instance, update_fields=None, **kwargs):
+    """إبطال بيانات المستخدم المحمولة في رموز JWT (تسجيل الدخول وحده لا يغيرها)"""
+    if _is_login_update(update_fields):
+        return
+    invalidate_user_claims(instance.pk)
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def invalidate_role_permissions_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """إبطال صلاحيات الأدوار المخزنة عند تعديل علاقة الدور بالصلاحيات"""
+    if not reverse:
+        # تعديل من جهة الدور: role.permissions.add(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_role_permissions(instance.pk)
+        return
+    
+    # تعديل من جهة الصلاحية: permission.role_set.add(...)
+    if action == 'pre_clear':
+        # بعد المسح لا يمكن معرفة الأدوار المتأثرة، لذا نحفظها مسبقاً
+        instance._cleared_role_ids = list(instance.role_set.values_list('pk', flat=True))
+        return
+    
+    if action == 'post_clear':
+        role_ids = getattr(instance, '_cleared_role_ids', [])
+    elif action in ('post_add', 'post_remove'):
+        role_ids = pk_set or []
+    else:
+        return
+    
+    for role_id in role_ids:
+        invalidate_role_permissions(role_id)
+
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_changed_role_permissions(sender, instance, **kwargs):
+    """إبطال صلاحيات الدور المحذوف أو المعدل (يحمل رمز JWT اسم الدور)"""
+    invalidate_role_permissions(instance.pk)
@@ -0,0 +1,30 @@
+"""
+المهام الخلفية (Celery) لنظام المستخدمين
+"""
+from celery import shared_task
+
+
+@shared_task
+def flush_session_activity_task():
+    """
+    كتابة نشاط الجلسات المعلق في الذاكرة المؤقتة إلى قاعدة البيانات (مهمة مجدولة)
+
+    Returns:
+        int: عدد الجلسات المحدثة
+    """
+    from .session_activity import flush_session_activity
+
+    return flush_session_activity()
+
+
+@shared_task
+def apply_session_retention_task():
+    """
+    تطبيق سياسة الاحتفاظ بالجلسات (مهمة يومية)
+
+    Returns:
+        dict: عدد الجلسات المنتهية والمؤرشفة والمحذوفة
+    """
+    from .session_retention import apply_session_retention
+
+    return apply_session_retention()
@@ -0,0 +1,71 @@
+"""
+أدوات مساعدة للاختبارات
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+# ذاكرة مشتركة (LocMem) تحاكي Redis في الاختبارات
+SHARED_CACHE_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'idea-platform-tests',
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'idea-platform-tests-shared',
+        },
+    },
+    'SHARED_CACHE_ALIAS': 'shared',
+    'PERMISSION_CACHE_ALIAS': 'shared',
+    'SESSION_ACTIVITY_CACHE_ALIAS': 'shared',
+}
+
+# مُزخرف لحالات الاختبار التي تعتمد على الذاكرة المشتركة
+use_shared_cache = override_settings(**SHARED_CACHE_SETTINGS)
+
+
+def clear_caches():
+    """مسح جميع ذاكرات التخزين المؤقت المهيأة"""
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+class QueryCountAssertionsMixin:
+    """
+    Mixin لحالات الاختبار للتحقق من ثبات عدد الاستعلامات مع نمو البيانات
+    """
+    query_count_sizes = (20, 2000)
+
+    def assertQueryCountStable(self, func, populate, sizes=None, expected=None):
+        """
+        التحقق من أن func تنفذ العدد نفسه من الاستعلامات لكل حجم بيانات
+
+        Args:
+            func: الدالة المراد قياسها (مثلاً تسلسل queryset كامل)
+            populate: دالة تستقبل الحجم المطلوب وتجهز البيانات حتى تبلغه
+            sizes: أحجام البيانات المراد اختبارها
+            expected: العدد المتوقع للاستعلامات (اختياري)
+
+        Returns:
+            int: عدد الاستعلامات الثابت
+        """
+        counts = {}
+        for size in sizes or self.query_count_sizes:
+            populate(size)
+            with CaptureQueriesContext(connection) as context:
+                func()
+            counts[size] = len(context.captured_queries)
+
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            f'عدد الاستعلامات يتغير مع حجم البيانات: {counts}'
+        )
+        count = next(iter(counts.values()))
+        if expected is not None:
+            self.assertEqual(count, expected)
+        return count
@@ -4,24 +4,45 @@
 تتضمن اختبارات الوحدات والتكامل للوظائف الحيوية
 '''
 
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
+import unittest
 import uuid
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import Permission
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 # استيراد النماذج
-from idea_platform.accounts.models import CustomUser, Role, UserProfile
+from idea_platform.accounts.authentication import ClaimsJWTAuthentication, ClaimsRefreshToken
+from idea_platform.accounts.models import CustomUser, Role, UserProfile, UserSession, UserSessionArchive
+from idea_platform.accounts.caching import current_user_namespace, get_cache_version
+from idea_platform.accounts.permission_cache import LRUCache, get_role_version, local_cache as local_permission_cache
+from idea_platform.accounts.profiling import RequestProfile, histogram as profiling_histogram
+from idea_platform.accounts.query_plans import apply_query_plan
+from idea_platform.accounts.search import ensure_search_indexes, normalize_arabic, search_queryset
+from idea_platform.accounts.session_retention import apply_session_retention
+from idea_platform.accounts import session_activity
+from idea_platform.accounts.serializers import (
+    UserListSerializer, UserSerializer, UserSessionSerializer
+)
+from idea_platform.accounts.testing import QueryCountAssertionsMixin, clear_caches, use_shared_cache
 from idea_platform.crm.models import Client as ClientModel
+from idea_platform.crm.rollups import ClientRollup, reconcile_client_rollups
+from idea_platform.crm.views import ClientRollupSerializer
 from idea_platform.projects.models import Project
-from idea_platform.billing.models import Invoice, InvoiceItem
+from idea_platform.billing.models import Invoice, InvoiceItem, Payment
+from idea_platform.billing.utils import calculate_invoice_totals
 from idea_platform.reports.models import ReportTemplate, Report
 
 User = get_user_model()
@@ -522,3 +543,785 @@ class SecurityTests(TestCase):
         # لا ينبغي أن يكون لدى المستخدم العميل إذن لعرض جميع العملاء
         self.assertFalse(self.client_user.has_role_permission('view_all_clients'))
 
+
+
+@use_shared_cache
+class UserStatsTests(APITestCase):
+    '''اختبارات إحصائيات المستخدمين'''
+    def setUp(self):
+        '''إعداد البيانات للاختبارات'''
+        clear_caches()
+        self.user = CustomUser.objects.create_user(
+            username='statsuser',
+            email='stats@test.com',
+            password='statspass123'
+        )
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(user=self.user)
+        self.url = reverse('users:user_stats')
+        self.role = Role.objects.create(name='designer', display_name='مصمم')
+
+    def _create_users(self, count, prefix):
+        for i in range(count):
+            CustomUser.objects.create_user(
+                username=f'{prefix}{i}',
+                role=self.role,
+                department=f'{prefix}-قسم-{i}'
+            )
+
+    def test_user_stats_constant_queries(self):
+        '''اختبار ثبات عدد الاستعلامات مع زيادة الأقسام'''
+        self._create_users(3, 'small')
+        with self.assertNumQueries(3):
+            response = self.client_api.get(self.url)
+        self.assertEqual(response.data['users_by_role']['مصمم'], 3)
+        self.assertEqual(len(response.data['users_by_department']), 3)
+
+        self._create_users(30, 'large')
+        with self.assertNumQueries(3):
+            response = self.client_api.get(self.url)
+        self.assertEqual(response.data['total_users'], 34)
+        self.assertEqual(len(response.data['users_by_department']), 33)
+
+    def test_user_stats_cached_with_etag(self):
+        '''اختبار التخزين المؤقت وإرجاع 304 للنسخة الحالية'''
+        response = self.client_api.get(self.url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            cached = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # أي تعديل على المستخدمين يُبطل اللقطة
+        CustomUser.objects.create_user(username='newcomer')
+        response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['total_users'], 2)
+
+    def test_login_keeps_snapshot(self):
+        '''اختبار أن تحديث last_login عند الدخول لا يُبطل اللقطة'''
+        etag = self.client_api.get(self.url)['ETag']
+        self.user.last_login = datetime.now(timezone.utc)
+        self.user.save(update_fields=['last_login'])
+
+        response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(SHARED_CACHE_ALIAS=None)
+    def test_without_shared_cache(self):
+        '''اختبار حساب اللقطة في كل طلب بدون ذاكرة مشتركة'''
+        etag = self.client_api.get(self.url)['ETag']
+        with self.assertNumQueries(3):
+            response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        CustomUser.objects.create_user(username='newcomer')
+        response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_users'], 2)
+
+
+class UserQueryPlanTests(QueryCountAssertionsMixin, TestCase):
+    '''اختبارات خطط الاستعلام للـ Serializers'''
+    def setUp(self):
+        '''إعداد دور بعدة صلاحيات'''
+        self.role = Role.objects.create(name='developer', display_name='مطور')
+        self.role.permissions.add(*Permission.objects.all()[:3])
+        self.created = 0
+
+    def _populate(self, total):
+        '''إنشاء مستخدمين (مع ملفات شخصية وجلسات) حتى يبلغ العدد total'''
+        users = [
+            CustomUser(
+                username=f'plan{i}',
+                arabic_first_name='مستخدم',
+                arabic_last_name=str(i),
+                role=self.role
+            )
+            for i in range(self.created, total)
+        ]
+        CustomUser.objects.bulk_create(users)
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+        UserSession.objects.bulk_create([
+            UserSession(
+                user=user,
+                session_key=f'plan-session-{user.username}',
+                ip_address='127.0.0.1',
+                user_agent='tests'
+            )
+            for user in users
+        ])
+        self.created = total
+
+    def _serialize(self, queryset, serializer_class):
+        queryset = apply_query_plan(queryset, serializer_class)
+        return lambda: serializer_class(queryset, many=True).data
+
+    def test_user_list_serializer_queries(self):
+        '''اختبار قائمة المستخدمين المبسطة'''
+        self.assertQueryCountStable(
+            self._serialize(CustomUser.objects.all(), UserListSerializer),
+            self._populate,
+            expected=1
+        )
+
+    def test_user_serializer_queries(self):
+        '''اختبار تفاصيل المستخدم مع الدور والصلاحيات والملف الشخصي'''
+        self.assertQueryCountStable(
+            self._serialize(CustomUser.objects.all(), UserSerializer),
+            self._populate,
+            expected=2
+        )
+
+    def test_user_session_serializer_queries(self):
+        '''اختبار الجلسات مع تفاصيل المستخدم المتداخلة'''
+        self.assertQueryCountStable(
+            self._serialize(UserSession.objects.all(), UserSessionSerializer),
+            self._populate,
+            expected=2
+        )
+
+
+class RolePermissionCacheTests(TestCase):
+    '''اختبارات الذاكرة المؤقتة لصلاحيات الأدوار'''
+    def setUp(self):
+        '''إعداد دور بصلاحية واحدة'''
+        cache.clear()
+        local_permission_cache.clear()
+        content_type = ContentType.objects.get_for_model(ClientModel)
+        self.view_permission = Permission.objects.get(content_type=content_type, codename='view_client')
+        self.change_permission = Permission.objects.get(content_type=content_type, codename='change_client')
+        self.role = Role.objects.create(name='account_manager', display_name='مدير حسابات')
+        self.role.permissions.add(self.view_permission)
+        self.user = CustomUser.objects.create_user(username='cacheduser', role=self.role)
+
+    def test_role_permissions_cached(self):
+        '''اختبار عدم تنفيذ استعلامات بعد تحميل الصلاحيات'''
+        self.assertTrue(self.user.has_role_permission('view_client'))
+
+        # كائن مستخدم جديد (طلب جديد) يقرأ من الذاكرة المحلية
+        user = CustomUser.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_role_permission('view_client'))
+            self.assertFalse(user.has_role_permission('change_client'))
+
+    def test_role_permissions_invalidated_on_m2m_change(self):
+        '''اختبار إبطال الذاكرة عند تعديل صلاحيات الدور'''
+        self.assertFalse(self.user.has_role_permission('change_client'))
+
+        self.role.permissions.add(self.change_permission)
+        user = CustomUser.objects.get(pk=self.user.pk)
+        self.assertTrue(user.has_role_permission('change_client'))
+
+        self.change_permission.role_set.clear()
+        user = CustomUser.objects.get(pk=self.user.pk)
+        self.assertFalse(user.has_role_permission('change_client'))
+
+    def test_full_permission_name_keeps_app_label(self):
+        '''اختبار مطابقة الاسم الكامل للصلاحية مع اسم التطبيق'''
+        self.assertTrue(self.user.has_role_permission('crm.view_client'))
+        self.assertFalse(self.user.has_role_permission('billing.view_client'))
+
+    def test_local_entries_expire(self):
+        '''اختبار انتهاء عناصر الذاكرة المحلية بعد مدتها'''
+        lru = LRUCache(maxsize=4, ttl=0)
+        lru.set('role', frozenset({'view_client'}))
+        self.assertIsNone(lru.get('role'))
+
+
+class CursorPaginationTests(APITestCase):
+    '''اختبارات الترقيم بالمؤشر'''
+    def setUp(self):
+        '''إنشاء مستخدمين بنفس تاريخ الإنشاء لاختبار فض التعادل'''
+        self.user = CustomUser.objects.create_user(username='pager', password='pagerpass123')
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(user=self.user)
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'cursor{i}') for i in range(24)
+        ])
+        CustomUser.objects.update(created_at=datetime(2025, 1, 1, tzinfo=timezone.utc))
+        self.url = reverse('users:user_list_create')
+
+    def test_cursor_pages_are_stable(self):
+        '''اختبار تغطية جميع السجلات دون تكرار ودون استعلام COUNT'''
+        seen = []
+        params = {'pagination': 'cursor', 'page_size': 10}
+        while True:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client_api.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+            seen.extend(row['id'] for row in response.data['results'])
+            if not response.data['next_cursor']:
+                break
+            params['cursor'] = response.data['next_cursor']
+
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_page_number_is_default(self):
+        '''اختبار بقاء الترقيم بالصفحات افتراضياً'''
+        response = self.client_api.get(self.url)
+        self.assertEqual(response.data['count'], 25)
+
+    def test_invalid_cursor(self):
+        '''اختبار رفض المؤشر غير الصالح'''
+        response = self.client_api.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SearchTests(APITestCase):
+    '''اختبارات البحث في المستخدمين والأدوار'''
+    def setUp(self):
+        '''إعداد مستخدمين بأسماء عربية وإنجليزية'''
+        self.user = CustomUser.objects.create_user(username='searcher', password='searchpass123')
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(user=self.user)
+        self.ahmed = CustomUser.objects.create_user(
+            username='ahmed.ali',
+            arabic_first_name='أحمد',
+            arabic_last_name='علي',
+            first_name='Ahmed'
+        )
+        self.fatima = CustomUser.objects.create_user(
+            username='f.hassan',
+            arabic_first_name='فاطِمَة',
+            arabic_last_name='حسن'
+        )
+        self.mustafa = CustomUser.objects.create_user(
+            username='mustafa',
+            arabic_first_name='مصطفى',
+            email='mustafa@idea.com'
+        )
+
+    def _search(self, term):
+        response = self.client_api.get(reverse('users:user_list_create'), {'search': term})
+        return [row['username'] for row in response.data['results']]
+
+    def test_normalize_arabic(self):
+        '''اختبار تطبيع النص العربي'''
+        self.assertEqual(normalize_arabic('أحمَد'), 'احمد')
+        self.assertEqual(normalize_arabic('إيمان آمنة'), 'ايمان امنه')
+        self.assertEqual(normalize_arabic('مصطفى'), 'مصطفي')
+        self.assertEqual(normalize_arabic('  Ahmed   ALI '), 'ahmed ali')
+
+    def test_search_matches_letter_variants(self):
+        '''اختبار البحث مع اختلاف أشكال الحروف والتشكيل'''
+        self.assertEqual(self._search('احمد'), ['ahmed.ali'])
+        self.assertEqual(self._search('فاطمه'), ['f.hassan'])
+        self.assertEqual(self._search('مصطفي'), ['mustafa'])
+
+    def test_search_prefix_and_ranking(self):
+        '''اختبار مطابقة البادئة وتقديم النتائج الأقرب'''
+        self.assertEqual(self._search('ahm'), ['ahmed.ali'])
+        self.assertEqual(self._search('must')[0], 'mustafa')
+
+    def test_search_document_follows_updates(self):
+        '''اختبار تحديث نص البحث عند تعديل الحقول'''
+        self.ahmed.arabic_first_name = 'خالد'
+        self.ahmed.save(update_fields=['arabic_first_name'])
+        self.assertEqual(self._search('خالد'), ['ahmed.ali'])
+
+    def test_search_by_email(self):
+        '''اختبار البحث بالبريد الإلكتروني كاملاً'''
+        self.assertEqual(self._search('mustafa@idea.com'), ['mustafa'])
+
+    def test_search_document_splits_symbols(self):
+        '''اختبار إضافة كلمات البريد الإلكتروني منفصلة إلى نص البحث'''
+        self.mustafa.refresh_from_db()
+        self.assertIn('mustafa@idea.com mustafa idea com', self.mustafa.search_document)
+        self.assertEqual(self._search('idea.com'), ['mustafa'])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'يتطلب PostgreSQL')
+    def test_search_uses_document_index(self):
+        '''اختبار أن البحث يستخدم فهرس tsvector ولا يقرأ الجدول كاملاً'''
+        ensure_search_indexes(using=connection.alias)
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = search_queryset(CustomUser.objects.all(), 'mustafa@idea.com').explain()
+        self.assertIn('_search_fts', plan)
+        self.assertNotIn('Seq Scan', plan)
+
+    def test_search_without_words(self):
+        '''اختبار عبارة بحث بدون كلمات (رموز فقط)'''
+        response = self.client_api.get(reverse('users:user_list_create'), {'search': '@'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['username'] for row in response.data['results']], ['mustafa'])
+
+    def test_role_search(self):
+        '''اختبار البحث في الأدوار'''
+        Role.objects.create(name='financial_manager', display_name='مدير مالي', description='إدارة الفواتير')
+        response = self.client_api.get(reverse('users:role_list_create'), {'search': 'الفواتير'})
+        self.assertEqual(response.data['results'][0]['name'], 'financial_manager')
+
+
+@override_settings(BILLING_PDF_PRERENDER=False)
+class ClientRollupTests(TestCase):
+    '''اختبارات ملخصات العملاء المالية'''
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='rollupuser',
+            email='rollup@test.com',
+            password='testpass123'
+        )
+        self.client_model = ClientModel.objects.create(
+            name='عميل الملخص',
+            email='rollup@client.com',
+            phone_number='0501234567',
+            address='الرياض، السعودية',
+            city='الرياض'
+        )
+
+    def create_invoice(self, number):
+        invoice = Invoice.objects.create(
+            invoice_number=number,
+            client=self.client_model,
+            issue_date=datetime.now().date(),
+            due_date=datetime.now().date() + timedelta(days=30),
+            created_by=self.user,
+            tax_rate=Decimal('15.00'),
+            status='sent'
+        )
+        InvoiceItem.objects.create(
+            invoice=invoice,
+            description='بند فاتورة',
+            quantity=Decimal('1.00'),
+            unit_price=Decimal('1000.00')
+        )
+        return invoice
+
+    def test_rollup_updates_from_signals(self):
+        '''تحديث الملخص بعد تعديل الفواتير والمدفوعات والمشاريع'''
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(2):
+                Project.objects.create(
+                    name=f'مشروع {i+1}',
+                    client=self.client_model,
+                    project_type='consulting',
+                    start_date=datetime.now().date(),
+                    budget=Decimal('1000.00'),
+                    status='completed' if i == 0 else 'in_progress'
+                )
+            invoice = self.create_invoice('ROL-001')
+            self.create_invoice('ROL-002')
+            Payment.objects.create(invoice=invoice, amount=Decimal('150.00'), created_by=self.user)
+
+        rollup = ClientRollup.objects.get(client=self.client_model)
+        self.assertEqual(rollup.invoiced_amount, Decimal('2300.00'))
+        self.assertEqual(rollup.paid_amount, Decimal('150.00'))
+        self.assertEqual(rollup.outstanding_amount, Decimal('2150.00'))
+        self.assertEqual(rollup.projects_total, 2)
+        self.assertEqual(rollup.projects_by_status, {'completed': 1, 'in_progress': 1})
+        self.assertIsNotNone(rollup.last_activity_at)
+
+    def test_rollup_follows_sql_total_updates(self):
+        '''تحديث الملخص بعد إعادة حساب المجاميع باستعلام UPDATE'''
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = self.create_invoice('ROL-004')
+        InvoiceItem.objects.filter(invoice=invoice).update(unit_price=Decimal('2000.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            calculate_invoice_totals(invoice)
+
+        self.assertEqual(
+            ClientRollup.objects.get(client=self.client_model).invoiced_amount,
+            Decimal('2300.00')
+        )
+
+    def test_client_serializer_reads_rollup(self):
+        '''عرض إجماليات العميل من الملخص دون تجميع لكل عميل'''
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_invoice('ROL-005')
+        ClientRollup.objects.filter(client=self.client_model).update(
+            invoiced_amount=Decimal('7.00'), projects_total=4
+        )
+
+        client = ClientModel.objects.select_related('rollup').get(pk=self.client_model.pk)
+        data = ClientRollupSerializer(client).data
+        self.assertEqual(Decimal(data['total_invoiced_amount']), Decimal('7.00'))
+        self.assertEqual(data['total_projects'], 4)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        '''أمر المطابقة يكتشف الفروقات ويصلحها'''
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_invoice('ROL-003')
+        ClientRollup.objects.filter(client=self.client_model).update(invoiced_amount=Decimal('1.00'))
+
+        report = reconcile_client_rollups(dry_run=True)
+        self.assertEqual(report['drifted'], [str(self.client_model.pk)])
+
+        reconcile_client_rollups()
+        self.assertEqual(
+            ClientRollup.objects.get(client=self.client_model).invoiced_amount,
+            Decimal('1150.00')
+        )
+        self.assertEqual(reconcile_client_rollups()['drifted'], [])
+
+
+class RequestProfilingTests(APITestCase):
+    '''اختبارات قياس أداء الطلبات'''
+    def setUp(self):
+        '''إعداد مشرف وعدة مستخدمين'''
+        profiling_histogram.reset()
+        self.admin = CustomUser.objects.create_user(
+            username='profiler', password='profilerpass123', is_staff=True
+        )
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(user=self.admin)
+
+    def test_server_timing_header(self):
+        '''اختبار ترويسة Server-Timing للمشرفين'''
+        response = self.client_api.get(reverse('users:user_list_create'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('sql;desc=', response['Server-Timing'])
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_duplicate_queries_are_fingerprinted(self):
+        '''اختبار اكتشاف الاستعلامات المتكررة (N+1)'''
+        profile = RequestProfile()
+        for ids in ([1], [1, 2], [1, 2, 3]):
+            placeholders = ', '.join(['%s'] * len(ids))
+            profile.record_query(f'SELECT * FROM "t" WHERE "id" IN ({placeholders})', 1.0)
+        profile.record_query('SELECT 1', 1.0)
+
+        duplicates = profile.duplicates(threshold=3)
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0]['count'], 3)
+        self.assertEqual(profile.sql_count, 4)
+
+    def test_histogram_endpoint(self):
+        '''اختبار المدرج التكراري للمشرفين فقط'''
+        self.client_api.get(reverse('users:user_list_create'))
+        response = self.client_api.get(reverse('users:profiling_histogram'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        route = next(key for key in response.data if key.startswith('GET '))
+        self.assertEqual(response.data[route]['count'], 1)
+        self.assertEqual(sum(response.data[route]['buckets'].values()), 1)
+
+        user = CustomUser.objects.create_user(username='regular', password='regularpass123')
+        self.client_api.force_authenticate(user=user)
+        response = self.client_api.get(reverse('users:profiling_histogram'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@use_shared_cache
+class SessionActivityTests(TestCase):
+    '''اختبارات تتبع نشاط الجلسات بالكتابة المؤجلة'''
+    def setUp(self):
+        '''إعداد جلستين'''
+        clear_caches()
+        session_activity._last_flush_window = None
+        self.user = CustomUser.objects.create_user(username='sessionuser', password='sessionpass123')
+        self.sessions = UserSession.objects.bulk_create([
+            UserSession(user=self.user, session_key=f'activity-{i}', ip_address='127.0.0.1', user_agent='old')
+            for i in range(2)
+        ])
+        # بداية نافذة كتابة
+        self.now = 60 * 30_000_000 + 10
+
+    def test_activity_is_throttled_and_flushed_in_bulk(self):
+        '''اختبار حد التكرار والكتابة المجمعة بعد انتهاء النافذة'''
+        self.assertTrue(session_activity.touch_session('activity-0', '10.0.0.1', 'agent', now=self.now))
+        self.assertFalse(session_activity.touch_session('activity-0', '10.0.0.2', 'agent', now=self.now + 10))
+        self.assertTrue(session_activity.touch_session('activity-1', '10.0.0.3', 'agent', now=self.now + 20))
+
+        # النافذة الحالية لم تنته بعد
+        self.assertEqual(session_activity.flush_session_activity(now=self.now + 30), 0)
+        self.assertEqual(UserSession.objects.get(session_key='activity-0').user_agent, 'old')
+
+        with self.assertNumQueries(2):
+            updated = session_activity.flush_session_activity(now=self.now + 60)
+        self.assertEqual(updated, 2)
+
+        session = UserSession.objects.get(session_key='activity-0')
+        self.assertEqual(session.ip_address, '10.0.0.1')
+        self.assertEqual(session.user_agent, 'agent')
+        self.assertEqual(session.last_activity.timestamp(), self.now)
+
+        # لا تُكتب النافذة مرتين
+        self.assertEqual(session_activity.flush_session_activity(now=self.now + 60), 0)
+
+    def test_pending_activity_survives_process_restart(self):
+        '''اختبار كتابة النشاط المعلق من عملية أخرى (مثل المهمة الدورية بعد إعادة التشغيل)'''
+        session_activity.touch_session('activity-1', '10.0.0.9', 'agent', now=self.now)
+        session_activity._last_flush_window = None
+
+        self.assertEqual(session_activity.flush_session_activity(now=self.now + 120), 1)
+        self.assertEqual(UserSession.objects.get(session_key='activity-1').ip_address, '10.0.0.9')
+
+    @override_settings(SESSION_ACTIVITY_CACHE_ALIAS=None)
+    def test_direct_update_without_shared_cache(self):
+        '''اختبار الكتابة المباشرة مع حد التكرار بدون ذاكرة مشتركة'''
+        with self.assertNumQueries(1):
+            self.assertTrue(session_activity.touch_session('activity-0', '10.0.0.4', 'agent', now=self.now))
+        with self.assertNumQueries(0):
+            self.assertFalse(session_activity.touch_session('activity-0', '10.0.0.5', 'agent', now=self.now + 1))
+
+        session = UserSession.objects.get(session_key='activity-0')
+        self.assertEqual(session.ip_address, '10.0.0.4')
+        self.assertEqual(session.last_activity.timestamp(), self.now)
+        self.assertEqual(session_activity.flush_session_activity(now=self.now + 120), 0)
+
+
+class SessionRetentionTests(TestCase):
+    '''اختبارات الاحتفاظ بالجلسات وأرشفتها'''
+    def setUp(self):
+        '''إعداد جلسات بأعمار مختلفة'''
+        self.user = CustomUser.objects.create_user(username='retentionuser', password='retentionpass123')
+        now = datetime.now(timezone.utc)
+
+        def session(key, days, active):
+            return UserSession(
+                user=self.user, session_key=key, ip_address='127.0.0.1', user_agent='tests',
+                is_active=active, last_activity=now - timedelta(days=days)
+            )
+
+        UserSession.objects.bulk_create([
+            session('recent', 1, True),
+            session('idle', 40, True),
+            session('ended', 40, False),
+            *[session(f'old-{i}', 400, False) for i in range(5)],
+        ])
+
+    def test_dry_run_only_counts(self):
+        '''اختبار العرض دون تعديل'''
+        result = apply_session_retention(dry_run=True)
+        self.assertEqual(result, {'deactivated': 1, 'archived': 7, 'purged': 5})
+        self.assertEqual(UserSession.objects.count(), 8)
+        self.assertEqual(apply_session_retention(), result)
+
+    def test_zero_days_is_not_replaced_by_default(self):
+        '''اختبار أن القيمة 0 لا تُستبدل بالإعداد الافتراضي'''
+        result = apply_session_retention(idle_days=0, archive_days=1000, purge_days=1000, dry_run=True)
+        self.assertEqual(result['deactivated'], 2)
+
+    def test_sessions_are_archived_and_purged_in_batches(self):
+        '''اختبار الأرشفة والحذف على دفعات صغيرة'''
+        result = apply_session_retention(
+            idle_days=30, archive_days=30, purge_days=365, batch_size=2
+        )
+        self.assertEqual(result, {'deactivated': 1, 'archived': 7, 'purged': 5})
+        self.assertEqual(list(UserSession.objects.values_list('session_key', flat=True)), ['recent'])
+        self.assertEqual(
+            set(UserSessionArchive.objects.values_list('session_key', flat=True)), {'idle', 'ended'}
+        )
+
+
+class BulkSessionTerminationTests(APITestCase):
+    '''اختبارات إنهاء الجلسات جماعياً'''
+    def setUp(self):
+        '''إعداد مستخدمين بجلسات ورموز تحديث'''
+        self.role = Role.objects.create(name='support', display_name='دعم')
+        self.admin = CustomUser.objects.create_user(username='sessionadmin', password='adminpass123', is_staff=True)
+        self.members = [
+            CustomUser.objects.create_user(username=f'member{i}', role=self.role, department='الدعم')
+            for i in range(3)
+        ]
+        self.other = CustomUser.objects.create_user(username='outsider', department='المبيعات')
+        for user in [*self.members, self.other]:
+            for device in range(2):
+                RefreshToken.for_user(user)
+                UserSession.objects.create(
+                    user=user, session_key=f'{user.username}-{device}',
+                    ip_address='127.0.0.1', user_agent='tests'
+                )
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(user=self.admin)
+        self.url = reverse('users:bulk_terminate_sessions')
+
+    def test_terminate_by_role(self):
+        '''اختبار إنهاء جلسات دور كامل وإلغاء رموزه'''
+        response = self.client_api.post(self.url, {'roles': [str(self.role.pk)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'users': 3, 'sessions': 6, 'tokens': 6})
+        self.assertEqual(UserSession.objects.filter(is_active=True).count(), 2)
+        self.assertFalse(
+            BlacklistedToken.objects.filter(token__user=self.other).exists()
+        )
+
+        # لا يتكرر الإلغاء
+        response = self.client_api.post(self.url, {'departments': ['الدعم']}, format='json')
+        self.assertEqual(response.data, {'users': 3, 'sessions': 0, 'tokens': 0})
+
+    def test_selector_required(self):
+        '''اختبار رفض الطلب دون تحديد المستخدمين'''
+        response = self.client_api.post(self.url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only(self):
+        '''اختبار منع غير المشرفين'''
+        self.client_api.force_authenticate(user=self.other)
+        response = self.client_api.post(self.url, {'users': [str(self.other.pk)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_logout_everywhere(self):
+        '''اختبار تسجيل الخروج من جميع الأجهزة'''
+        self.client_api.force_authenticate(user=self.other)
+        response = self.client_api.post(reverse('users:logout_all'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['sessions'], 2)
+        self.assertEqual(response.data['tokens'], 2)
+        self.assertFalse(UserSession.objects.filter(user=self.other, is_active=True).exists())
+
+
+@use_shared_cache
+class ClaimsJWTAuthenticationTests(APITestCase):
+    '''اختبارات مصادقة JWT من بيانات الرمز'''
+    def setUp(self):
+        '''إعداد مستخدم بدور وصلاحية ورمز وصول'''
+        clear_caches()
+        local_permission_cache.clear()
+        content_type = ContentType.objects.get_for_model(ClientModel)
+        self.change_permission = Permission.objects.get(content_type=content_type, codename='change_client')
+        self.role = Role.objects.create(name='analyst', display_name='محلل')
+        self.user = CustomUser.objects.create_user(username='tokenuser', role=self.role, is_staff=True)
+        self.token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.client_api = APIClient()
+        self.client_api.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.url = reverse('users:user_stats')
+
+    def test_token_carries_claims(self):
+        '''اختبار وجود بيانات المستخدم في رمز الوصول'''
+        self.assertEqual(self.token['username'], 'tokenuser')
+        self.assertEqual(self.token['role'], 'analyst')
+        self.assertEqual(self.token['role_id'], str(self.role.pk))
+        self.assertTrue(self.token['is_staff'])
+        self.assertIn('perm_version', self.token)
+        self.assertIn('user_version', self.token)
+
+    def test_authentication_without_queries(self):
+        '''اختبار المصادقة دون استعلامات ما دامت البيانات حديثة'''
+        etag = self.client_api.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # تغيير صلاحيات الدور يعيد تحميل المستخدم من قاعدة البيانات
+        self.role.permissions.add(self.change_permission)
+        with self.assertNumQueries(1):
+            response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_other_fields_loaded_once(self):
+        '''اختبار تحميل صف المستخدم مرة واحدة عند قراءة حقول خارج الرمز'''
+        user = ClaimsJWTAuthentication().get_user(self.token)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.username, 'tokenuser')
+            self.assertEqual(user.role.name, 'analyst')
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, '')
+            self.assertEqual(user.department, '')
+            self.assertIsNone(user.hire_date)
+
+    @override_settings(PERMISSION_CACHE_ALIAS=None)
+    def test_requires_shared_cache(self):
+        '''اختبار تحميل المستخدم من قاعدة البيانات بدون ذاكرة مشتركة'''
+        etag = self.client_api.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_deactivated_user_rejected(self):
+        '''اختبار رفض رمز المستخدم بعد إيقاف حسابه'''
+        self.user.is_active = False
+        self.user.save()
+        response = self.client_api.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_restamps_claims(self):
+        '''اختبار تحديث بيانات المستخدم في الرموز المجددة'''
+        refresh = ClaimsRefreshToken.for_user(self.user)
+        self.role.permissions.add(self.change_permission)
+        self.user.first_name = 'Token'
+        self.user.save()
+
+        response = APIClient().post(
+            reverse('users:token_refresh'), {'refresh': str(refresh)}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        access = AccessToken(response.data['access'])
+        self.assertNotEqual(access['user_version'], refresh['user_version'])
+        self.assertNotEqual(access['perm_version'], refresh['perm_version'])
+        self.assertEqual(RefreshToken(response.data['refresh'])['user_version'], access['user_version'])
+
+        self.client_api.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        etag = self.client_api.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@use_shared_cache
+class CurrentUserCacheTests(APITestCase):
+    '''اختبارات التخزين المؤقت لبيانات المستخدم الحالي'''
+    def setUp(self):
+        '''إعداد مستخدم بدور وملف شخصي'''
+        clear_caches()
+        local_permission_cache.clear()
+        content_type = ContentType.objects.get_for_model(ClientModel)
+        self.view_permission = Permission.objects.get(content_type=content_type, codename='view_client')
+        self.role = Role.objects.create(name='reviewer', display_name='مراجع')
+        self.user = CustomUser.objects.create_user(username='meuser', role=self.role)
+        self.profile = UserProfile.objects.create(user=self.user, bio='نبذة')
+        self.client_api = APIClient()
+        self.client_api.force_authenticate(user=self.user)
+        self.url = reverse('users:current_user')
+
+    def test_payload_cached(self):
+        '''اختبار عدم تنفيذ استعلامات بعد التخزين'''
+        response = self.client_api.get(self.url)
+        self.assertEqual(response.data['username'], 'meuser')
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            cached = self.client_api.get(self.url)
+        self.assertEqual(cached.data, response.data)
+
+    def test_conditional_get(self):
+        '''اختبار إرجاع 304 عبر ETag و Last-Modified'''
+        response = self.client_api.get(self.url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            cached = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        cached = self.client_api.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_invalidated_on_changes(self):
+        '''اختبار الإبطال عند تعديل المستخدم أو ملفه أو دوره'''
+        etags = {self.client_api.get(self.url)['ETag']}
+
+        self.profile.bio = 'نبذة جديدة'
+        self.profile.save()
+        response = self.client_api.get(self.url)
+        self.assertEqual(response.data['profile']['bio'], 'نبذة جديدة')
+        etags.add(response['ETag'])
+
+        self.role.permissions.add(self.view_permission)
+        response = self.client_api.get(self.url)
+        self.assertEqual(len(response.data['role_details']['permissions']), 1)
+        etags.add(response['ETag'])
+
+        self.user.department = 'الجودة'
+        self.user.save()
+        response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['department'], 'الجودة')
+        etags.add(response['ETag'])
+        self.assertEqual(len(etags), 4)
+
+    def test_conditional_get_skips_cold_payload(self):
+        '''اختبار إرجاع 304 دون بناء البيانات عند فقدانها من الذاكرة'''
+        etag = self.client_api.get(self.url)['ETag']
+        self.assertIn(str(self.user.pk), etag)
+        shared = caches['shared']
+        version = get_cache_version(current_user_namespace(self.user.pk), shared)
+        shared.delete(f'users:me:{self.user.pk}:{version}:{get_role_version(self.role.pk)}')
+
+        with self.assertNumQueries(0):
+            response = self.client_api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -11,7 +11,9 @@ app_name = 'users'
 urlpatterns = [
     # مسارات المصادقة
     path('auth/login/', views.LoginView.as_view(), name='login'),
+    path('auth/token/refresh/', views.ClaimsTokenRefreshView.as_view(), name='token_refresh'),
     path('auth/logout/', views.LogoutView.as_view(), name='logout'),
+    path('auth/logout-all/', views.LogoutEverywhereView.as_view(), name='logout_all'),
     path('auth/me/', views.CurrentUserView.as_view(), name='current_user'),
     path('auth/change-password/', views.ChangePasswordView.as_view(), name='change_password'),
     
@@ -30,5 +32,9 @@ urlpatterns = [
     # مسارات الجلسات
     path('sessions/', views.UserSessionsView.as_view(), name='user_sessions'),
     path('sessions/<int:session_id>/terminate/', views.terminate_session, name='terminate_session'),
+    path('sessions/terminate/', views.BulkSessionTerminationView.as_view(), name='bulk_terminate_sessions'),
+
+    # مسارات قياس الأداء
+    path('profiling/', views.ProfilingHistogramView.as_view(), name='profiling_histogram'),
 ]
 
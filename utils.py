@@ -1,13 +1,9 @@
 """
 أدوات مساعدة لنظام الفواتير
 """
-import os
-from django.conf import settings
+import io
 from django.template.loader import render_to_string
-from django.http import HttpResponse
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
-import tempfile
+from django.http import FileResponse
 from decimal import Decimal
 from datetime import datetime
 
@@ -15,16 +11,44 @@ def generate_invoice_pdf(invoice, template=None, context_data=None):
     """
     إنشاء ملف PDF للفاتورة
     
+    يُقدم الملف من ذاكرة ملفات PDF إن كان محتوى الفاتورة والقالب لم يتغير،
+    وإلا يُنشأ ويُخزن ليُعاد استخدامه في الطلبات التالية.
+    
     Args:
         invoice: كائن الفاتورة
         template: قالب الفاتورة (اختياري)
         context_data: بيانات إضافية للقالب (اختياري)
     
     Returns:
-        HttpResponse: ملف PDF
+        FileResponse: ملف PDF يُبث على دفعات
     """
+    from .pdf_cache import ensure_invoice_pdf, pdf_file_response
+    
+    filename = f"invoice_{invoice.invoice_number}.pdf"
     
-    # إعداد البيانات للقالب
+    # البيانات الإضافية تجعل الناتج خاصاً بهذا الطلب فلا يُخزن
+    if context_data:
+        buffer = io.BytesIO()
+        render_invoice_pdf(invoice, template, context_data, target=buffer)
+        return pdf_stream_response(buffer, filename)
+    
+    path = ensure_invoice_pdf(invoice, template)
+    return pdf_file_response(path, filename)
+
+def pdf_stream_response(buffer, filename):
+    """
+    بث ملف PDF من ذاكرة مؤقتة (BytesIO) على دفعات دون نسخه داخل الاستجابة
+    """
+    buffer.seek(0)
+    return FileResponse(
+        buffer,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/pdf'
+    )
+
+def get_invoice_context(invoice, context_data=None):
+    """بيانات قالب الفاتورة"""
     context = {
         'invoice': invoice,
         'items': invoice.items.all().order_by('order'),
@@ -36,7 +60,8 @@ def generate_invoice_pdf(invoice, template=None, context_data=None):
             'website': 'www.idea-consulting.com',
             'tax_number': 'XXX-XXX-XXX-XXX',
         },
-        'generated_at': datetime.now(),
+        # وقت آخر تعديل وليس وقت التوليد، فيبقى ثابتاً في الملفات المخزنة
+        'generated_at': getattr(invoice, 'updated_at', None) or datetime.now(),
         'currency': 'ريال سعودي',
         'currency_symbol': 'ر.س',
     }
@@ -45,43 +70,38 @@ def generate_invoice_pdf(invoice, template=None, context_data=None):
     if context_data:
         context.update(context_data)
     
-    # استخدام القالب المحدد أو القالب الافتراضي
-    if template and template.html_template:
-        html_content = template.html_template
-        css_content = template.css_styles or ""
-    else:
-        # القالب الافتراضي
-        html_content = get_default_invoice_template()
-        css_content = get_default_invoice_css()
-    
-    # معالجة القالب
-    from django.template import Template, Context
-    template_obj = Template(html_content)
-    rendered_html = template_obj.render(Context(context))
-    
-    # إعداد الخطوط العربية
-    font_config = FontConfiguration()
-    
-    # إنشاء PDF
-    html_doc = HTML(string=rendered_html, base_url=settings.STATIC_URL)
-    css_doc = CSS(string=css_content, font_config=font_config)
-    
-    # إنشاء ملف مؤقت
-    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-        html_doc.write_pdf(tmp_file.name, stylesheets=[css_doc], font_config=font_config)
-        
-        # قراءة المحتوى
-        with open(tmp_file.name, 'rb') as pdf_file:
-            pdf_content = pdf_file.read()
-        
-        # حذف الملف المؤقت
-        os.unlink(tmp_file.name)
+    return context
+
+def render_invoice_pdf(invoice, template=None, context_data=None, target=None):
+    """
+    توليد محتوى PDF للفاتورة في الذاكرة (دون ملفات مؤقتة)
+    
+    يستخدم المولد الدائم للعملية الحالية (الخطوط و CSS والقوالب المترجمة
+    محملة مسبقاً)، انظر pdf_renderer.
+    
+    Args:
+        invoice: كائن الفاتورة
+        template: قالب الفاتورة (اختياري)
+        context_data: بيانات إضافية للقالب (اختياري)
+        target: كائن ملف قابل للكتابة يُكتب فيه الناتج مباشرة (اختياري)
     
-    # إنشاء الاستجابة
-    response = HttpResponse(pdf_content, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.invoice_number}.pdf"'
+    Returns:
+        bytes: محتوى ملف PDF، أو None إذا حُدد target
+    """
+    from .pdf_renderer import get_renderer
     
-    return response
+    return get_renderer().render(invoice, template, context_data, target=target)
+
+def render_invoice_pdf_buffer(invoice, template=None, context_data=None):
+    """
+    توليد ملف PDF وإرجاعه كـ memoryview على ذاكرة التوليد نفسها (دون نسخ)
+    
+    Returns:
+        memoryview: محتوى ملف PDF
+    """
+    buffer = io.BytesIO()
+    render_invoice_pdf(invoice, template, context_data, target=buffer)
+    return buffer.getbuffer()
 
 def get_default_invoice_template():
     """الحصول على القالب الافتراضي للفاتورة"""
@@ -404,88 +424,186 @@ def get_default_invoice_css():
     }
     """
 
-def calculate_invoice_totals(invoice):
-    """حساب مجاميع الفاتورة"""
-    subtotal = sum(item.total_amount for item in invoice.items.all())
-    tax_amount = (subtotal * invoice.tax_rate) / 100
-    total_amount = subtotal + tax_amount - invoice.discount_amount
+def invoice_totals_expressions():
+    """
+    تعبيرات SQL لمجاميع الفاتورة تُستخدم في UPDATE واحد
+    
+    يُكرر تعبير المجموع الفرعي في كل عمود لأن UPDATE يقرأ القيم القديمة
+    للأعمدة لا القيم الجديدة.
+    """
+    from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+    from django.db.models.functions import Coalesce
+    from .models import InvoiceItem, Payment
+    
+    money = DecimalField(max_digits=12, decimal_places=2)
+    
+    def subtotal():
+        items_total = InvoiceItem.objects.filter(invoice=OuterRef('pk')).order_by().values(
+            'invoice'
+        ).annotate(
+            total=Sum(ExpressionWrapper(F('quantity') * F('unit_price'), output_field=money))
+        ).values('total')
+        return Coalesce(Subquery(items_total, output_field=money), Value(Decimal('0.00')), output_field=money)
     
-    invoice.subtotal = subtotal
-    invoice.tax_amount = tax_amount
-    invoice.total_amount = total_amount
-    invoice.save()
+    def tax_amount():
+        return ExpressionWrapper(subtotal() * F('tax_rate') / Value(Decimal('100')), output_field=money)
+    
+    paid_total = Payment.objects.filter(invoice=OuterRef('pk')).order_by().values(
+        'invoice'
+    ).annotate(total=Sum('amount')).values('total')
     
     return {
-        'subtotal': subtotal,
-        'tax_amount': tax_amount,
-        'total_amount': total_amount,
-        'remaining_amount': total_amount - invoice.paid_amount
+        'subtotal': subtotal(),
+        'tax_amount': tax_amount(),
+        'total_amount': ExpressionWrapper(
+            subtotal() + tax_amount() - F('discount_amount'), output_field=money
+        ),
+        'paid_amount': Coalesce(Subquery(paid_total, output_field=money), Value(Decimal('0.00')), output_field=money),
     }
 
-def generate_invoice_number():
-    """إنشاء رقم فاتورة تلقائي"""
+def calculate_invoice_totals(invoice):
+    """
+    حساب مجاميع الفاتورة في قاعدة البيانات (UPDATE واحد) وتحديث الكائن
+    
+    لا يرسل UPDATE إشارة post_save، لذا تُرسل invoice_totals_changed ليتبعها
+    ملخص العميل ومؤشرات التحليلات وذاكرة ملفات PDF.
+    """
     from .models import Invoice
-    from django.utils import timezone
-    
-    current_year = timezone.now().year
-    current_month = timezone.now().month
-    
-    # البحث عن آخر فاتورة في الشهر الحالي
-    last_invoice = Invoice.objects.filter(
-        created_at__year=current_year,
-        created_at__month=current_month
-    ).order_by('-created_at').first()
-    
-    if last_invoice:
-        # استخراج الرقم التسلسلي من آخر فاتورة
-        try:
-            last_number = int(last_invoice.invoice_number.split('-')[-1])
-            next_number = last_number + 1
-        except (ValueError, IndexError):
-            next_number = 1
-    else:
-        next_number = 1
-    
-    # تنسيق رقم الفاتورة: INV-YYYY-MM-XXXX
-    invoice_number = f"INV-{current_year}-{current_month:02d}-{next_number:04d}"
-    
-    return invoice_number
+    from .signals import invoice_totals_changed
+    
+    Invoice.objects.filter(pk=invoice.pk).update(**invoice_totals_expressions())
+    invoice_totals_changed.send(sender=Invoice, invoice_ids=[invoice.pk])
+    invoice.refresh_from_db(fields=['subtotal', 'tax_amount', 'total_amount', 'paid_amount'])
+    
+    return {
+        'subtotal': invoice.subtotal,
+        'tax_amount': invoice.tax_amount,
+        'total_amount': invoice.total_amount,
+        'remaining_amount': invoice.total_amount - invoice.paid_amount
+    }
 
-def send_invoice_email(invoice, recipients, subject=None, message=None):
-    """إرسال الفاتورة بالبريد الإلكتروني"""
-    from django.core.mail import EmailMessage
-    from django.template.loader import render_to_string
-    
-    if not subject:
-        subject = f"فاتورة رقم {invoice.invoice_number} - {invoice.client.name}"
-    
-    if not message:
-        message = render_to_string('billing/invoice_email.html', {
-            'invoice': invoice,
-            'client': invoice.client,
-        })
-    
-    # إنشاء PDF
-    pdf_response = generate_invoice_pdf(invoice)
-    pdf_content = pdf_response.content
-    
-    # إنشاء البريد الإلكتروني
-    email = EmailMessage(
-        subject=subject,
-        body=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=recipients,
-    )
+def changed_invoice_ids(invoice_ids, expressions=None):
+    """
+    معرفات الفواتير التي تختلف مجاميعها المخزنة عن المحسوبة (استعلام SELECT واحد)
+    """
+    from django.db.models import F, Q
+    from .models import Invoice
     
-    # إرفاق PDF
-    email.attach(
-        f"invoice_{invoice.invoice_number}.pdf",
-        pdf_content,
-        'application/pdf'
+    expressions = expressions or invoice_totals_expressions()
+    differs = Q()
+    for field in expressions:
+        differs |= ~Q(**{field: F(f'computed_{field}')})
+    return list(
+        Invoice.objects.filter(pk__in=invoice_ids).annotate(
+            **{f'computed_{field}': expression for field, expression in expressions.items()}
+        ).filter(differs).values_list('pk', flat=True)
     )
+
+def recompute_invoice_totals(queryset, batch_size=2000):
+    """
+    إعادة حساب مجاميع مجموعة فواتير على دفعات
+    
+    كل دفعة استعلام UPDATE واحد على نطاق من المعرفات، لذا يبقى العمل
+    محدوداً حتى مع عشرات الآلاف من الفواتير. تُحدث فقط الفواتير التي تختلف
+    مجاميعها فعلاً، وتُرسل invoice_totals_changed لها وحدها دون توليد ملفات
+    PDF مسبقاً (تُولّد عند طلبها لأن مسارها يتبع بصمة المحتوى).
+    
+    Returns:
+        int: عدد الفواتير المحدثة
+    """
+    from .models import Invoice
+    from .signals import invoice_totals_changed
+    
+    expressions = invoice_totals_expressions()
+    updated = 0
+    
+    def flush(batch):
+        changed = changed_invoice_ids(batch, expressions)
+        if not changed:
+            return 0
+        count = Invoice.objects.filter(pk__in=changed).update(**expressions)
+        invoice_totals_changed.send(sender=Invoice, invoice_ids=changed, prerender=False)
+        return count
+    
+    batch = []
+    for pk in queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size):
+        batch.append(pk)
+        if len(batch) >= batch_size:
+            updated += flush(batch)
+            batch = []
+    if batch:
+        updated += flush(batch)
+    return updated
+
+def write_invoice_items(invoice, items_data):
+    """
+    كتابة بنود الفاتورة دفعة واحدة بالمقارنة مع البنود الحالية
+    
+    - البند الذي يحمل id يُحدث (bulk_update)
+    - البند دون id يُنشأ (bulk_create)
+    - البنود الحالية غير الموجودة في البيانات تُحذف باستعلام واحد
+    
+    لا تُستدعى save() لكل بند، لذا يُحسب مجموع البند هنا ولا يُعاد حساب
+    مجاميع الفاتورة، ويجب على المستدعي حسابها مرة واحدة بعد الكتابة.
+    
+    Returns:
+        dict: أعداد البنود المنشأة والمحدثة والمحذوفة
+    """
+    from .models import InvoiceItem
+    
+    existing = {str(item.pk): item for item in invoice.items.all()}
+    to_create = []
+    to_update = []
+    update_fields = {'total_amount'}
+    
+    for item_data in items_data:
+        item_data = dict(item_data)
+        item_id = item_data.pop('id', None)
+        if item_id is None:
+            item = InvoiceItem(invoice=invoice, **item_data)
+            to_create.append(item)
+        else:
+            item = existing.pop(str(item_id))
+            for attr, value in item_data.items():
+                setattr(item, attr, value)
+            update_fields.update(item_data)
+            to_update.append(item)
+        item.total_amount = item.quantity * item.unit_price
+    
+    deleted = 0
+    if existing:
+        deleted, _ = InvoiceItem.objects.filter(pk__in=[item.pk for item in existing.values()]).delete()
+    if to_create:
+        InvoiceItem.objects.bulk_create(to_create, batch_size=500)
+    if to_update:
+        InvoiceItem.objects.bulk_update(to_update, sorted(update_fields), batch_size=500)
+    
+    return {'created': len(to_create), 'updated': len(to_update), 'deleted': deleted}
+
+def generate_invoice_number():
+    """
+    إنشاء رقم فاتورة تلقائي بالصيغة INV-YYYY-MM-XXXX
     
-    # إرسال البريد
+    يُحجز الرقم من عداد الشهر المقفل (انظر numbering)، لذا يجب استدعاؤها
+    داخل معاملة إنشاء الفاتورة حتى لا تتكرر الأرقام أو تنشأ فجوات.
+    """
+    from .numbering import next_invoice_number
+    
+    return next_invoice_number()
+
+def send_invoice_email(invoice, recipients, subject=None, message=None, pdf_content=None, connection=None):
+    """
+    إرسال الفاتورة بالبريد الإلكتروني
+    
+    يمكن تمرير pdf_content (bytes) إذا كان المستدعي قد ولّد الملف مسبقاً
+    ليُرفق كما هو دون توليد أو قراءة جديدة، و connection لإعادة استخدام
+    اتصال بريد مفتوح. للإرسال في الخلفية استخدم send_invoice_email_task.
+    """
+    from .mailing import build_invoice_email
+    
+    email = build_invoice_email(
+        invoice, recipients, subject, message, pdf_content=pdf_content, connection=connection
+    )
     email.send()
     
     return True
-
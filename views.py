@@ -2,24 +2,46 @@
 Views لنظام المستخدمين والأدوار
 """
 
+import time
+
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
 from django.contrib.auth import login, logout
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.http import http_date
+from .authentication import ClaimsRefreshToken
+from .caching import (
+    USER_STATS_NAMESPACE, content_digest, current_user_namespace, etag_matches,
+    get_cache_version, make_etag, not_modified_since, shared_cache
+)
 from .models import CustomUser, Role, UserProfile, UserSession
+from .permission_cache import get_role_version
+from .profiling import histogram
+from .query_plans import QueryPlanMixin, apply_query_plan
+from .search import search_queryset
+from .session_activity import get_client_ip
+from .session_revocation import target_users, terminate_user_sessions
 from .serializers import (
     UserSerializer, UserCreateSerializer, UserUpdateSerializer,
     UserListSerializer, ChangePasswordSerializer, LoginSerializer,
     RoleSerializer, UserProfileSerializer, UserProfileUpdateSerializer,
-    UserSessionSerializer
+    UserSessionSerializer, BulkSessionTerminationSerializer, ClaimsTokenRefreshSerializer
 )
 
 
-class RoleListCreateView(generics.ListCreateAPIView):
+# مدة صلاحية لقطة الإحصائيات (تُبطل مبكراً عبر الإشارات)
+USER_STATS_CACHE_TIMEOUT = 60 * 60
+
+# مدة صلاحية بيانات "المستخدم الحالي" (تُبطل مبكراً عبر الإشارات)
+CURRENT_USER_CACHE_TIMEOUT = 60 * 60
+
+
+class RoleListCreateView(QueryPlanMixin, generics.ListCreateAPIView):
     """
     عرض وإنشاء الأدوار
     """
@@ -31,18 +53,15 @@ class RoleListCreateView(generics.ListCreateAPIView):
         """تصفية الأدوار حسب الصلاحيات"""
         queryset = super().get_queryset()
         
-        # البحث
+        # البحث (مرتب حسب الصلة)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(display_name__icontains=search) |
-                Q(description__icontains=search)
-            )
+            return search_queryset(queryset, search)
         
         return queryset.order_by('display_name')
 
 
-class RoleDetailView(generics.RetrieveUpdateDestroyAPIView):
+class RoleDetailView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     عرض وتحديث وحذف دور محدد
     """
@@ -58,12 +77,13 @@ class RoleDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class UserListCreateView(generics.ListCreateAPIView):
+class UserListCreateView(QueryPlanMixin, generics.ListCreateAPIView):
     """
     عرض وإنشاء المستخدمين
     """
     queryset = CustomUser.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = '-created_at'
     
     def get_serializer_class(self):
         """اختيار Serializer حسب العملية"""
@@ -75,17 +95,10 @@ class UserListCreateView(generics.ListCreateAPIView):
         """تصفية المستخدمين"""
         queryset = super().get_queryset()
         
-        # البحث
+        # البحث (مرتب حسب الصلة)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(username__icontains=search) |
-                Q(email__icontains=search) |
-                Q(arabic_first_name__icontains=search) |
-                Q(arabic_last_name__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search)
-            )
+            queryset = search_queryset(queryset, search)
         
         # تصفية حسب الدور
         role = self.request.query_params.get('role', None)
@@ -102,10 +115,12 @@ class UserListCreateView(generics.ListCreateAPIView):
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
         
+        if search:
+            return queryset.order_by('-search_rank', '-created_at')
         return queryset.order_by('-created_at')
 
 
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
+class UserDetailView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     عرض وتحديث وحذف مستخدم محدد
     """
@@ -186,7 +201,7 @@ class LoginView(APIView):
             login(request, user)
             
             # إنشاء JWT tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
             access_token = refresh.access_token
             
             # تسجيل الجلسة
@@ -206,42 +221,35 @@ class LoginView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def _create_user_session(self, request, user):
-        """إنشاء جلسة مستخدم"""
+        """إنشاء جلسة مستخدم أو إعادة تفعيلها (استعلام upsert واحد)"""
         try:
-            # الحصول على معلومات الطلب
-            ip_address = self._get_client_ip(request)
-            user_agent = request.META.get('HTTP_USER_AGENT', '')
-            session_key = request.session.session_key
-            
-            # إنشاء أو تحديث الجلسة
-            session, created = UserSession.objects.get_or_create(
-                user=user,
-                session_key=session_key,
-                defaults={
-                    'ip_address': ip_address,
-                    'user_agent': user_agent,
-                    'is_active': True
-                }
+            UserSession.objects.bulk_create(
+                [UserSession(
+                    user=user,
+                    session_key=request.session.session_key,
+                    ip_address=self._get_client_ip(request),
+                    user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                    is_active=True,
+                    last_activity=timezone.now(),
+                )],
+                update_conflicts=True,
+                unique_fields=['session_key'],
+                update_fields=['user', 'ip_address', 'user_agent', 'is_active', 'last_activity'],
             )
-            
-            if not created:
-                session.ip_address = ip_address
-                session.user_agent = user_agent
-                session.is_active = True
-                session.save()
-                
         except Exception as e:
             # تسجيل الخطأ ولكن لا نوقف عملية تسجيل الدخول
             pass
     
     def _get_client_ip(self, request):
         """الحصول على عنوان IP للعميل"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+        return get_client_ip(request)
+
+
+class ClaimsTokenRefreshView(TokenRefreshView):
+    """
+    تجديد رمز الوصول مع تحديث بيانات المستخدم فيه
+    """
+    serializer_class = ClaimsTokenRefreshSerializer
 
 
 class LogoutView(APIView):
@@ -277,23 +285,68 @@ class LogoutView(APIView):
 class CurrentUserView(APIView):
     """
     عرض بيانات المستخدم الحالي
+    
+    تُخزن البيانات في الذاكرة المشتركة لكل مستخدم حسب إصدار بياناته (يُرفع
+    عند تعديل المستخدم أو ملفه الشخصي) وإصدار دوره، ويُعاد 304 إذا كان لدى
+    العميل النسخة الحالية (If-None-Match أو If-Modified-Since). يُقارن الوسم
+    قبل قراءة البيانات، فلا تُبنى البيانات لطلب ينتهي بـ 304. بدون ذاكرة
+    مشتركة تُبنى البيانات في كل طلب ويُشتق الوسم من محتواها.
     """
     permission_classes = [permissions.IsAuthenticated]
     
+    def _build(self, user):
+        instance = apply_query_plan(CustomUser.objects.all(), UserSerializer).get(pk=user.pk)
+        return UserSerializer(instance).data
+    
     def get(self, request):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+        user = request.user
+        backend = shared_cache()
+        if backend is None:
+            data = self._build(user)
+            etag = make_etag('me', user.pk, content_digest(data))
+            response = (
+                Response(status=status.HTTP_304_NOT_MODIFIED)
+                if etag_matches(request, etag) else Response(data)
+            )
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        version = get_cache_version(current_user_namespace(user.pk), backend)
+        role_version = get_role_version(user.role_id) if user.role_id else 0
+        etag = make_etag('me', user.pk, version, role_version)
+        
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache_key = f'users:me:{user.pk}:{version}:{role_version}'
+            cached = backend.get(cache_key)
+            if cached is None:
+                cached = {'data': self._build(user), 'modified': int(time.time())}
+                backend.set(cache_key, cached, timeout=CURRENT_USER_CACHE_TIMEOUT)
+            
+            if not_modified_since(request, cached['modified']):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response(cached['data'])
+            response['Last-Modified'] = http_date(cached['modified'])
+        
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 
-class UserSessionsView(generics.ListAPIView):
+class UserSessionsView(QueryPlanMixin, generics.ListAPIView):
     """
     عرض جلسات المستخدم الحالي
     """
+    queryset = UserSession.objects.all()
     serializer_class = UserSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = '-last_activity'
     
     def get_queryset(self):
-        return UserSession.objects.filter(
+        return super().get_queryset().filter(
             user=self.request.user
         ).order_by('-last_activity')
 
@@ -323,31 +376,111 @@ def terminate_session(request, session_id):
         )
 
 
+class LogoutEverywhereView(APIView):
+    """
+    تسجيل الخروج من جميع الأجهزة (إنهاء كل جلسات المستخدم الحالي)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        result = terminate_user_sessions(CustomUser.objects.filter(pk=request.user.pk))
+        logout(request)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class BulkSessionTerminationView(APIView):
+    """
+    إنهاء جلسات مستخدمين محددين أو أدوار أو أقسام كاملة (للمشرفين)
+    
+    يعيد عدد المستخدمين والجلسات المنتهية ورموز التحديث الملغاة.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def post(self, request):
+        serializer = BulkSessionTerminationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = terminate_user_sessions(target_users(**serializer.validated_data))
+        return Response(result, status=status.HTTP_200_OK)
+
+
+def _build_user_stats():
+    """
+    بناء إحصائيات المستخدمين بعدد ثابت من الاستعلامات
+
+    يُحسب كل جزء باستعلام تجميعي واحد بغض النظر عن عدد الأدوار أو الأقسام.
+    """
+    stats = CustomUser.objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(is_active=True)),
+        verified_users=Count('id', filter=Q(is_verified=True)),
+    )
+    
+    # إحصائيات حسب الدور
+    stats['users_by_role'] = dict(
+        Role.objects.filter(is_active=True)
+        .annotate(users_count=Count('customuser'))
+        .values_list('display_name', 'users_count')
+    )
+    
+    # إحصائيات حسب القسم
+    stats['users_by_department'] = dict(
+        CustomUser.objects.exclude(department='')
+        .values('department')
+        .annotate(users_count=Count('id'))
+        .order_by('department')
+        .values_list('department', 'users_count')
+    )
+    
+    return stats
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_stats(request):
     """
     إحصائيات المستخدمين
-    """
-    stats = {
-        'total_users': CustomUser.objects.count(),
-        'active_users': CustomUser.objects.filter(is_active=True).count(),
-        'verified_users': CustomUser.objects.filter(is_verified=True).count(),
-        'users_by_role': {},
-        'users_by_department': {},
-    }
     
-    # إحصائيات حسب الدور
-    roles = Role.objects.filter(is_active=True)
-    for role in roles:
-        count = CustomUser.objects.filter(role=role).count()
-        stats['users_by_role'][role.display_name] = count
+    تُخزن اللقطة في الذاكرة المشتركة حسب إصدارها، ويُعاد 304 إذا كان لدى
+    العميل النسخة الحالية. بدون ذاكرة مشتركة تُحسب اللقطة في كل طلب ويُشتق
+    الوسم من محتواها.
+    """
+    backend = shared_cache()
+    stats = None
+    if backend is None:
+        stats = _build_user_stats()
+        etag = make_etag('user-stats', content_digest(stats))
+    else:
+        version = get_cache_version(USER_STATS_NAMESPACE, backend)
+        etag = make_etag('user-stats', version)
     
-    # إحصائيات حسب القسم
-    departments = CustomUser.objects.values_list('department', flat=True).distinct()
-    for dept in departments:
-        if dept:
-            count = CustomUser.objects.filter(department=dept).count()
-            stats['users_by_department'][dept] = count
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        if stats is None:
+            cache_key = f'users:stats:{version}'
+            stats = backend.get(cache_key)
+            if stats is None:
+                stats = _build_user_stats()
+                backend.set(cache_key, stats, timeout=USER_STATS_CACHE_TIMEOUT)
+        response = Response(stats)
     
-    return Response(stats)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class ProfilingHistogramView(APIView):
+    """
+    المدرج التكراري لزمن الطلبات لكل مسار (للمشرفين)
+
+    البيانات خاصة بالعملية التي تخدم الطلب وتُصفّر عند إعادة تشغيلها.
+    DELETE يُصفّر المدرج.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(histogram.snapshot())
+
+    def delete(self, request):
+        histogram.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)